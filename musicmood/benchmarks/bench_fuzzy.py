@@ -0,0 +1,172 @@
+"""
+Benchmark silnika nastrój -> parametry utworów.
+
+Uruchomienie (z katalogu musicmood):
+
+    python -m benchmarks.bench_fuzzy --output wyniki.json
+
+Wynik to JSON z identyfikatorem commita, więc przebiegi z różnych wersji reguł
+lub silnika wnioskowania można porównywać bezpośrednio.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Wartości nastroju wysyłane przez home_view (mood_map).
+MOOD_MAP_VALUES = [1, 0.8, 0.733, 0, 0.2, 0.266, 0.666, 0.5, 0.333]
+
+SWEEP_MOODS = sorted(set(MOOD_MAP_VALUES + [i / 10 for i in range(11)]))
+SWEEP_TIMES = [hour + minute / 60 for hour in range(24) for minute in (0, 17, 41)]
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    percentiles = statistics.quantiles(samples, n=100, method='inclusive')
+    return {
+        'count': len(samples),
+        'mean_us': statistics.fmean(samples) * 1e6,
+        'p50_us': percentiles[49] * 1e6,
+        'p95_us': percentiles[94] * 1e6,
+        'p99_us': percentiles[98] * 1e6,
+        'max_us': samples[-1] * 1e6,
+    }
+
+
+def bench_import():
+    start = time.perf_counter()
+    from spotify_mood.classes import Fuzzy  # noqa: F401
+    return {'seconds': time.perf_counter() - start}
+
+
+def bench_construction(repeats):
+    from spotify_mood.classes.Fuzzy import Fuzzy
+
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        Fuzzy()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def sweep_points():
+    return [(mood_value, time_of_day) for mood_value in SWEEP_MOODS for time_of_day in SWEEP_TIMES]
+
+
+def bench_latency(engine, points):
+    samples = []
+    for mood_value, time_of_day in points:
+        start = time.perf_counter()
+        engine.compute_recommendation(mood_value, time_of_day)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def bench_batch(fuzzy, points):
+    import numpy as np
+
+    moods = np.array([mood_value for mood_value, _ in points])
+    times = np.array([time_of_day for _, time_of_day in points])
+
+    start = time.perf_counter()
+    fuzzy.compute_recommendations_batch(moods, times)
+    elapsed = time.perf_counter() - start
+    return {'count': len(points), 'seconds': elapsed, 'per_point_us': elapsed / len(points) * 1e6}
+
+
+def bench_throughput(engine, points, threads, duration):
+    deadline = time.perf_counter() + duration
+    counts = [0] * threads
+    barrier = threading.Barrier(threads)
+
+    def worker(index):
+        barrier.wait()
+        i = index
+        while time.perf_counter() < deadline:
+            engine.compute_recommendation(*points[i % len(points)])
+            counts[index] += 1
+            i += threads
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(threads)))
+    elapsed = time.perf_counter() - start
+
+    return {'threads': threads, 'calls': sum(counts), 'calls_per_second': sum(counts) / elapsed}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'import': bench_import(),
+    }
+
+    from spotify_mood.classes.Fuzzy import Fuzzy, FuzzyPool
+    from spotify_mood.classes.FuzzyAnalytic import AnalyticRuleBase
+    from spotify_mood.classes.FuzzySurface import FuzzySurface
+
+    results['construction'] = bench_construction(args.construction_repeats)
+
+    points = sweep_points()
+    pool = FuzzyPool()
+
+    start = time.perf_counter()
+    surface = FuzzySurface.build(pool, check_error=False)
+    results['surface_build'] = {'seconds': time.perf_counter() - start, 'shape': list(surface.table.shape)}
+
+    results['latency'] = {
+        # Świeży sterownik, bo scikit-fuzzy zapamiętuje wyniki dla powtórzonych wejść.
+        'simulation': bench_latency(Fuzzy(), points),
+        'compiled': bench_latency(pool.rule_base, points),
+        'analytic': bench_latency(AnalyticRuleBase(pool.rule_base), points),
+        'surface': bench_latency(surface, points),
+    }
+    results['batch'] = bench_batch(pool.rule_base, points)
+
+    results['throughput'] = {
+        'simulation': [bench_throughput(pool, points, threads, args.duration) for threads in args.threads],
+        'surface': [bench_throughput(surface, points, threads, args.duration) for threads in args.threads],
+    }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', help="plik JSON z wynikami (domyślnie stdout)")
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--duration', type=float, default=2.0, help="czas pomiaru przepustowości w sekundach")
+    parser.add_argument('--construction-repeats', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    # Komunikaty z modułów aplikacji nie mogą mieszać się z wynikiem JSON.
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(args)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -50,6 +50,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'spotify_mood.middleware.DegradedServiceMiddleware',
 ]
 
 ROOT_URLCONF = 'musicmood.urls'
@@ -126,6 +127,103 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'static'
 
 
+# Fuzzy recommendation engine
+
+FUZZY_RULES_PATH = BASE_DIR / 'spotify_mood' / 'classes' / 'fuzzy_rules.json'
+FUZZY_CACHE_DIR = BASE_DIR / 'spotify_mood' / 'classes' / 'fuzzy_cache'
+FUZZY_RULES_CHECK_INTERVAL = 2
+# surface | analytic | compiled | simulation
+FUZZY_ENGINE = 'surface'
+FUZZY_PLOTS_DIR = STATIC_ROOT / 'fuzzy_plots'
+
+
+# Outgoing HTTP (Spotify, TasteDive)
+
+# Spotify endpoints; for offline load tests start `python manage.py fake_spotify --port 8765`
+# and set these to http://127.0.0.1:8765/v1 and http://127.0.0.1:8765
+SPOTIFY_API_BASE_URL = os.environ.get('SPOTIFY_API_BASE_URL', 'https://api.spotify.com/v1')
+SPOTIFY_ACCOUNTS_URL = os.environ.get('SPOTIFY_ACCOUNTS_URL', 'https://accounts.spotify.com')
+
+HTTP_POOL_SIZE = 10
+HTTP_TIMEOUT = (3.05, 10)  # (connect, read) in seconds
+HTTP_RETRIES = 2
+HTTP_RETRY_BACKOFF = 0.3
+# Record every Spotify/TasteDive response (with timings) into a JSON lines cassette, or replay
+# a recorded one; HTTP_CASSETTE_LATENCY_SCALE = 0 replays without the recorded delays
+HTTP_CASSETTE = os.environ.get('HTTP_CASSETTE')
+HTTP_CASSETTE_MODE = os.environ.get('HTTP_CASSETTE_MODE', 'replay')  # record | replay
+HTTP_CASSETTE_LATENCY_SCALE = float(os.environ.get('HTTP_CASSETTE_LATENCY_SCALE', 1.0))
+# Per-endpoint circuit breakers: an endpoint whose calls fail (5xx or no response) at this rate
+# within the window is skipped for CIRCUIT_BREAKER_RESET_TIMEOUT seconds, then probed again
+CIRCUIT_BREAKER_FAILURE_RATE = 0.5
+CIRCUIT_BREAKER_MIN_CALLS = 10
+CIRCUIT_BREAKER_WINDOW = 30  # seconds
+CIRCUIT_BREAKER_RESET_TIMEOUT = 30  # seconds
+
+# Spotify rate limit shared by every worker through the cache configured below
+SPOTIFY_RATE_LIMIT = 10  # requests per second
+SPOTIFY_RATE_BURST = 20
+SPOTIFY_RATE_LIMIT_MAX_WAIT = 30  # seconds a request may wait in the queue
+SPOTIFY_RATE_LIMIT_RETRIES = 3
+
+# Access tokens are refreshed this many seconds before they expire
+SPOTIFY_TOKEN_REFRESH_MARGIN = 60
+# How long the /v1/me identity is cached for an access token
+SPOTIFY_IDENTITY_TTL = 3600
+# In-process cache of /v1/search results shared by all users
+SPOTIFY_SEARCH_CACHE_SIZE = 2048
+SPOTIFY_SEARCH_CACHE_TTL = 600
+# Artist name -> Spotify id resolutions (backed by the artist table) and names Spotify does not know
+SPOTIFY_ARTIST_ID_TTL = 30 * 24 * 3600
+SPOTIFY_ARTIST_MISS_TTL = 24 * 3600
+# In-process cache of each artist's top tracks
+SPOTIFY_TOP_TRACKS_CACHE_SIZE = 1024
+SPOTIFY_TOP_TRACKS_TTL = 6 * 3600
+# The user's playlist list is reused for this long, then revalidated with ETags
+SPOTIFY_PLAYLISTS_TTL = 60
+SPOTIFY_PLAYLISTS_STATE_TTL = 86400
+# Number of the user's most recently saved tracks considered as playlist seeds (read in pages of 50)
+SPOTIFY_RECENT_TRACKS = 50
+# Artist genres stored in the artist_genres table are refreshed after this many seconds
+ARTIST_GENRES_TTL = 7 * 24 * 3600
+
+# The rate limiter, tokens and playlist upload progress live in the default cache, which has to
+# be shared by all server processes: set REDIS_URL (requires the redis package). The local-memory
+# fallback only suits a single development process; when SHARED_CACHE_REQUIRED is on,
+# `manage.py check --deploy` reports a process-local cache as an error
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+SHARED_CACHE_REQUIRED = not DEBUG
+
+# Playlist generation runs in a per-process thread pool; job state is stored in the job table,
+# so every server process sees it. Jobs older than JOB_TTL seconds are deleted
+JOB_WORKERS = 2
+JOB_TTL = 3600
+
+# Maximum number of genres processed in parallel while generating a playlist
+SPOTIFY_MAX_CONCURRENCY = 4
+# Large playlists: candidates are requested in pages of 100 for at most this many rounds and
+# added in 100-track chunks whose progress is kept in the cache so a failed upload can resume
+MAX_PLAYLIST_TRACKS = 1000
+SPOTIFY_RECOMMENDATION_ROUNDS = 5
+PLAYLIST_PROGRESS_TTL = 3600
+# TasteDive playlists: similar artists are resolved in parallel; artists not done in time are skipped
+TASTEDIVE_MAX_CONCURRENCY = 10
+TASTEDIVE_ARTISTS_TIMEOUT = 8  # seconds
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
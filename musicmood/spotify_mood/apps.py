@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SpotifyMoodConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'spotify_mood'
+
+    def ready(self):
+        from . import checks  # noqa: F401
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from .classes.RateLimiter import PROCESS_LOCAL_CACHES
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Limit zapytań jest wspólny tylko wtedy, gdy wszystkie procesy serwera korzystają z jednego
+    cache. Sprawdzane przy ``manage.py check --deploy``, więc nie blokuje innych poleceń.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if not getattr(settings, 'SHARED_CACHE_REQUIRED', not settings.DEBUG) or backend not in PROCESS_LOCAL_CACHES:
+        return []
+
+    return [Error(
+        f"Cache {backend} jest lokalny dla procesu, więc każdy worker miałby osobny limit zapytań do Spotify.",
+        hint="Ustaw REDIS_URL albo skonfiguruj w CACHES współdzielony backend.",
+        id='spotify_mood.E001',
+    )]
@@ -0,0 +1,241 @@
+"""
+Nagrywanie i odtwarzanie zapytań HTTP wysyłanych przez HttpTransport.
+
+W trybie ``record`` każda para zapytanie/odpowiedź wraz z czasem trwania dopisywana jest jako
+jedna linia JSON do pliku kasety. W trybie ``replay`` odpowiedzi zwracane są z kasety, po
+odczekaniu nagranego czasu pomnożonego przez ``latency_scale``, więc ten sam przebieg
+generowania playlisty można powtórzyć na nowym kodzie i porównać czas oraz liczbę zapytań.
+
+Przed zapisem z kasety usuwane są tokeny, kody autoryzacji, klucze API z parametrów zapytań
+oraz dane osobowe z profilu użytkownika - pliki kaset można więc udostępniać.
+"""
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from django.conf import settings
+
+RECORDED_HEADERS = ('Content-Type', 'ETag', 'Retry-After', 'Location')
+
+REDACTED = 'REDACTED'
+# Parametry URL i formularzy (wymiana kodu na token, klucz TasteDive).
+SECRET_PARAMS = {'access_token', 'refresh_token', 'client_secret', 'code', 'code_verifier', 'k'}
+# Pola odpowiedzi JSON: tokeny z /api/token i dane osobowe z /me.
+SECRET_FIELDS = {'access_token', 'refresh_token', 'id_token', 'email', 'birthdate', 'display_name', 'country'}
+
+
+class CassetteMiss(requests.ConnectionError):
+    def __init__(self, method, url):
+        super().__init__(f"Brak nagranej odpowiedzi dla {method} {url}")
+
+
+def redact_query(query):
+    return urlencode([(name, REDACTED if name in SECRET_PARAMS else value)
+                      for name, value in parse_qsl(query, keep_blank_values=True)])
+
+
+def redact_url(url):
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    return urlunsplit(parts._replace(query=redact_query(parts.query)))
+
+
+def redact_json(data):
+    if isinstance(data, dict):
+        return {name: REDACTED if name in SECRET_FIELDS and value is not None else redact_json(value)
+                for name, value in data.items()}
+    if isinstance(data, list):
+        return [redact_json(value) for value in data]
+    return data
+
+
+def redact_text(text):
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return text
+    redacted = redact_json(data)
+    return text if redacted == data else json.dumps(redacted, ensure_ascii=False)
+
+
+def redact_body(body):
+    """
+    Treść zapytania bez sekretów - JSON albo formularz, jak przy wymianie kodu na token.
+    """
+    if isinstance(body, bytes):
+        try:
+            body = body.decode('utf-8')
+        except UnicodeDecodeError:
+            return body
+    if not body or body.lstrip()[:1] in ('{', '['):
+        return redact_text(body) if body else body
+    return redact_query(body) if '=' in body else body
+
+
+def request_key(method, url, body):
+    # Klucz liczony jest z zapytania bez sekretów, żeby nagranie i odtworzenie dawały ten sam wynik.
+    url = redact_url(url)
+    body = redact_body(body)
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hashlib.sha1(body).hexdigest()[:16] if body else ''
+    return f"{method} {url} {digest}"
+
+
+def route_key(method, url):
+    return f"{method} {urlsplit(url).path}"
+
+
+class Cassette:
+    def __init__(self, path, mode='replay', latency_scale=1.0):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Nieznany tryb kasety: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._exact = {}
+        self._routes = {}
+        self.interactions = 0
+        self.played = 0
+        self.approximate = 0
+        self.misses = 0
+        self.recorded_seconds = 0.0
+        self.replayed_seconds = 0.0
+
+        if mode == 'replay':
+            self._load()
+
+    def _load(self):
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._exact.setdefault(entry['key'], deque()).append(entry)
+                self._routes.setdefault(route_key(entry['method'], entry['url']), deque()).append(entry)
+                self.interactions += 1
+                self.recorded_seconds += entry['elapsed']
+
+    def record(self, prepared, response, elapsed):
+        content = response.content
+        try:
+            body = {'text': redact_text(content.decode('utf-8'))}
+        except UnicodeDecodeError:
+            body = {'base64': base64.b64encode(content).decode('ascii')}
+
+        headers = {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers}
+        if 'Location' in headers:
+            headers['Location'] = redact_url(headers['Location'])
+
+        entry = {
+            'key': request_key(prepared.method, prepared.url, prepared.body),
+            'method': prepared.method,
+            'url': redact_url(prepared.url),
+            'offset': round(time.monotonic() - self._started - elapsed, 6),
+            'elapsed': round(elapsed, 6),
+            'status': response.status_code,
+            'headers': headers,
+            **body,
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self.interactions += 1
+            self.recorded_seconds += elapsed
+
+    def play(self, prepared):
+        """
+        Zwraca kolejną nagraną odpowiedź na to samo zapytanie (metoda, pełny URL, treść).
+        Gdy takiej nie ma, bierze kolejną odpowiedź z tej samej ścieżki - parametry mogą się
+        różnić np. losowo wybranymi utworami startowymi.
+        """
+        with self._lock:
+            entry = self._pop(self._exact.get(request_key(prepared.method, prepared.url, prepared.body)))
+            if entry is None:
+                entry = self._pop(self._routes.get(route_key(prepared.method, prepared.url)))
+                if entry is not None:
+                    self.approximate += 1
+            if entry is None:
+                self.misses += 1
+                raise CassetteMiss(prepared.method, prepared.url)
+            self.played += 1
+
+        delay = entry['elapsed'] * self.latency_scale
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            self.replayed_seconds += delay
+        return build_response(prepared, entry)
+
+    @staticmethod
+    def _pop(entries):
+        # Wpis zużyty przez jedną kolejkę zostaje oznaczony, żeby druga go nie zwróciła.
+        while entries:
+            entry = entries.popleft()
+            if not entry.pop('_played', False):
+                entry['_played'] = True
+                return entry
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'path': str(self.path),
+                'mode': self.mode,
+                'latency_scale': self.latency_scale,
+                'interactions': self.interactions,
+                'played': self.played,
+                'approximate': self.approximate,
+                'misses': self.misses,
+                'recorded_seconds': round(self.recorded_seconds, 3),
+                'replayed_seconds': round(self.replayed_seconds, 3),
+            }
+
+
+def build_response(prepared, entry):
+    response = requests.Response()
+    response.status_code = entry['status']
+    response.headers.update(entry['headers'])
+    response.url = entry['url']
+    response.request = prepared
+    response.encoding = 'utf-8'
+    if 'base64' in entry:
+        response._content = base64.b64decode(entry['base64'])
+    else:
+        response._content = entry['text'].encode('utf-8')
+    return response
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette():
+    """
+    Kaseta wskazana w HTTP_CASSETTE, wspólna dla wszystkich transportów procesu
+    (Spotify i TasteDive trafiają do jednego pliku), albo None.
+    """
+    global _cassette
+
+    path = getattr(settings, 'HTTP_CASSETTE', None)
+    if not path:
+        return None
+
+    with _cassette_lock:
+        if _cassette is None or str(_cassette.path) != str(path):
+            mode = getattr(settings, 'HTTP_CASSETTE_MODE', 'replay')
+            if mode == 'record':
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            _cassette = Cassette(path, mode, getattr(settings, 'HTTP_CASSETTE_LATENCY_SCALE', 1.0))
+        return _cassette
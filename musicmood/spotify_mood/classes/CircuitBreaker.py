@@ -0,0 +1,190 @@
+import bisect
+import re
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+
+# Logiczne endpointy Spotify - pierwszy pasujący wzorzec ścieżki wyznacza wyłącznik.
+SPOTIFY_ENDPOINTS = [
+    (re.compile(r'/recommendations$'), 'recommendations'),
+    (re.compile(r'/search$'), 'search'),
+    (re.compile(r'/me/tracks$'), 'library'),
+    (re.compile(r'/playlists'), 'playlists'),
+    (re.compile(r'/(tracks|audio-features)(/|$)'), 'tracks'),
+    (re.compile(r'/artists'), 'artists'),
+    (re.compile(r'/me$'), 'me'),
+    (re.compile(r'/api/token$'), 'token'),
+]
+
+# Górne granice przedziałów histogramu w milisekundach.
+LATENCY_BUCKETS = (5, 10, 25, 50, 75, 100, 150, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000, 30000)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def endpoint_name(transport_name, url):
+    if transport_name != 'spotify':
+        return transport_name
+    path = urlsplit(url).path
+    for pattern, name in SPOTIFY_ENDPOINTS:
+        if pattern.search(path):
+            return name
+    return 'other'
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.total += 1
+        self.max = max(self.max, ms)
+
+    def percentile(self, q):
+        """
+        Przybliżony kwantyl - interpolacja liniowa wewnątrz przedziału, w którym leży.
+        """
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i else 0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return round(min(lower + (upper - lower) * (rank - seen) / count, self.max), 1)
+            seen += count
+        return round(self.max, 1)
+
+
+class CircuitBreaker:
+    """
+    Wyłącznik dla jednego endpointu. Gdy w oknie ``window`` sekund co najmniej ``min_calls``
+    zapytań zakończy się błędem w proporcji ``failure_rate`` (wyjątek albo status 5xx), wyłącznik
+    się otwiera i przez ``reset_timeout`` sekund zapytania są odrzucane bez wysyłania. Potem
+    przepuszczane jest jedno zapytanie próbne, którego wynik zamyka lub ponownie otwiera obwód.
+    Odpowiedzi 429 nie są błędem - obsługuje je RateLimiter.
+    """
+    def __init__(self, name, failure_rate=0.5, min_calls=10, window=30.0, reset_timeout=30.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._outcomes = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self.histogram = LatencyHistogram()
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+
+    def allow(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            if self._state == CLOSED:
+                return True
+            self.rejected += 1
+            return False
+
+    def reject_if_open(self):
+        # Szybkie odrzucenie przed kolejką RateLimitera - nie zajmuje miejsca zapytania próbnego.
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at < self.reset_timeout:
+                self.rejected += 1
+                return True
+            return False
+
+    def retry_after(self):
+        with self._lock:
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record(self, seconds, failed):
+        now = time.monotonic()
+        with self._lock:
+            self.histogram.add(seconds * 1000)
+            self.calls += 1
+            self.errors += failed
+
+            if self._state == HALF_OPEN:
+                self._probing = False
+                if failed:
+                    self._open(now)
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                return
+
+            self._outcomes.append((now, failed))
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                self._outcomes.popleft()
+            failures = sum(outcome for _, outcome in self._outcomes)
+            if (self._state == CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures >= self.failure_rate * len(self._outcomes)):
+                self._open(now)
+
+    def _open(self, now):
+        self._state = OPEN
+        self._opened_at = now
+        print(f"Wyłącznik {self.name} otwarty na {self.reset_timeout:g} s")
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def stats(self):
+        with self._lock:
+            window = len(self._outcomes)
+            return {
+                'state': self._state,
+                'calls': self.calls,
+                'errors': self.errors,
+                'rejected': self.rejected,
+                'error_rate': sum(outcome for _, outcome in self._outcomes) / window if window else 0.0,
+                'p50_ms': self.histogram.percentile(0.50),
+                'p95_ms': self.histogram.percentile(0.95),
+                'p99_ms': self.histogram.percentile(0.99),
+                'max_ms': round(self.histogram.max, 1),
+            }
+
+
+def make_breaker(name):
+    return CircuitBreaker(
+        name,
+        failure_rate=getattr(settings, 'CIRCUIT_BREAKER_FAILURE_RATE', 0.5),
+        min_calls=getattr(settings, 'CIRCUIT_BREAKER_MIN_CALLS', 10),
+        window=getattr(settings, 'CIRCUIT_BREAKER_WINDOW', 30.0),
+        reset_timeout=getattr(settings, 'CIRCUIT_BREAKER_RESET_TIMEOUT', 30.0),
+    )
+
+
+def circuit_open_response(method, url, endpoint, retry_after):
+    # Odpowiedź zastępcza, tak jak przy lokalnym limicie zapytań - wywołujący traktuje ją jak 503.
+    response = requests.Response()
+    response.status_code = 503
+    response.headers['Retry-After'] = str(int(retry_after) + 1)
+    response.headers['X-Circuit-Open'] = endpoint
+    response.url = url
+    response.request = requests.Request(method, url).prepare()
+    response._content = (b'{"error": {"status": 503, "message": "circuit open for '
+                         + endpoint.encode('utf-8') + b'"}}')
+    return response
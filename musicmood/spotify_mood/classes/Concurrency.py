@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections
+
+
+def _run_in_worker(func, item):
+    try:
+        return func(item)
+    finally:
+        # Wątek roboczy dostaje własne połączenie z bazą - trzeba je zamknąć, zanim wątek zniknie.
+        connections.close_all()
+
+
+def map_concurrently(func, items, max_workers=None):
+    """
+    Wywołuje ``func`` dla każdego elementu w osobnych wątkach (najwyżej ``max_workers`` naraz)
+    i zwraca wyniki w kolejności elementów wejściowych. Wyjątek z dowolnego wywołania jest
+    zgłaszany dalej po zakończeniu pozostałych.
+    """
+    items = list(items)
+    max_workers = min(max_workers or getattr(settings, 'SPOTIFY_MAX_CONCURRENCY', 4), len(items))
+    if max_workers <= 1:
+        return [func(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='musicmood') as executor:
+        futures = [executor.submit(_run_in_worker, func, item) for item in items]
+    return [future.result() for future in futures]
+
+
+def map_with_deadline(func, items, timeout, max_workers=None):
+    """
+    Jak ``map_concurrently``, ale czeka na wyniki najwyżej ``timeout`` sekund i nie przerywa
+    całości z powodu pojedynczego błędu. Zwraca listę wyników w kolejności elementów, z None
+    w miejscu wywołań, które zgłosiły wyjątek albo nie zdążyły przed upływem czasu.
+    """
+    items = list(items)
+    if not items:
+        return []
+    max_workers = min(max_workers or getattr(settings, 'SPOTIFY_MAX_CONCURRENCY', 4), len(items))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='musicmood')
+    start = time.monotonic()
+    futures = [executor.submit(_run_in_worker, func, item) for item in items]
+    done, not_done = wait(futures, timeout=timeout)
+    # Niedokończone wywołania kończą się w tle (ograniczone limitem czasu HTTP), nikt na nie nie czeka.
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    results = []
+    for item, future in zip(items, futures):
+        if future in not_done:
+            print(f"Przekroczono czas {timeout} s dla {item}")
+            results.append(None)
+        elif future.exception() is not None:
+            print(f"Błąd przetwarzania {item}: {future.exception()}")
+            results.append(None)
+        else:
+            results.append(future.result())
+    print(f"Przetworzono {len(items) - results.count(None)}/{len(items)} elementów w {time.monotonic() - start:.2f} s")
+    return results
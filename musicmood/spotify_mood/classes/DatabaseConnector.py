@@ -1,6 +1,11 @@
 from django.core.exceptions import MultipleObjectsReturned
+from django.db import connection, transaction
 from django.utils import timezone
 from ..models import Genre, SongsPlaylist, Playlist, SongArtists, Artist, Song, User, PlaylistGenre, LikedSongs
+from ..models import ArtistGenres, SeedIndex
+
+# Liczba ostatnich playlist gatunku, z których brane są utwory i wykorzystane już seedy.
+SEED_INDEX_PLAYLISTS = 5
 
 
 class DatabaseConnector:
@@ -45,6 +50,10 @@ class DatabaseConnector:
 
         return artist
 
+    def get_artist_id_by_name(self, artist_name):
+        return (Artist.objects.filter(artist__iexact=artist_name).order_by('id')
+                .values_list('spotify_artist_id', flat=True).first())
+
     def save_song_artist_relation(self, song, artist):
         relation, created = SongArtists.objects.get_or_create(
             song=song,
@@ -104,3 +113,109 @@ class DatabaseConnector:
             '-created_at')[:limit]
 
         return recent_playlists
+
+    def get_artist_genres(self, artist_ids, max_age):
+        fresh_after = timezone.now() - max_age
+        rows = ArtistGenres.objects.filter(spotify_artist_id__in=list(artist_ids), updated_at__gte=fresh_after)
+        return {row.spotify_artist_id: row.genres for row in rows}
+
+    def save_artist_genres(self, artist_genres):
+        now = timezone.now()
+        rows = [ArtistGenres(spotify_artist_id=artist_id, genres=genres, updated_at=now)
+                for artist_id, genres in artist_genres.items()]
+        if connection.features.supports_update_conflicts_with_target:
+            ArtistGenres.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['spotify_artist_id'], update_fields=['genres', 'updated_at']
+            )
+            return
+
+        # MySQL nie obsługuje ON CONFLICT(kolumna) - istniejące wiersze aktualizowane są osobno,
+        # a brakujące dodawane z pominięciem tych, które w międzyczasie zapisał inny proces.
+        with transaction.atomic():
+            existing = dict(ArtistGenres.objects.select_for_update().filter(
+                spotify_artist_id__in=list(artist_genres)).values_list('spotify_artist_id', 'id'))
+            for row in rows:
+                row.id = existing.get(row.spotify_artist_id)
+            ArtistGenres.objects.bulk_update([row for row in rows if row.id], ['genres', 'updated_at'])
+            ArtistGenres.objects.bulk_create([row for row in rows if not row.id], ignore_conflicts=True)
+
+    def get_seed_index(self, user, genre):
+        """
+        Zwraca indeks kandydatów na utwory startowe użytkownika dla gatunku: polubione utwory
+        gatunku oraz utwory i seedy ostatnich playlist z tym gatunkiem. Brakujący indeks
+        budowany jest z tabel źródłowych, a potem utrzymywany przyrostowo.
+        """
+        index = SeedIndex.objects.filter(user_id=user.id, genre=genre).first()
+        if index is None:
+            index = self.update_seed_index(user, genre, lambda index: False)
+        return index
+
+    def lock_seed_index(self, user, genre):
+        """
+        Blokuje wiersz indeksu do końca bieżącej transakcji. Brakujący wiersz jest tworzony
+        i budowany z tabel źródłowych pod tą samą blokadą, więc równoległe polubienie lub nowa
+        playlista czekają na zakończenie budowy i nie giną ani nie zostają nadpisane.
+        """
+        index, created = SeedIndex.objects.get_or_create(user_id=user.id, genre=genre)
+        index = SeedIndex.objects.select_for_update().get(pk=index.pk)
+        if created:
+            self.build_seed_index(index, user, genre)
+            index.save()
+        return index
+
+    def build_seed_index(self, index, user, genre):
+        recent_playlists = self.get_recent_playlists_by_genre(user, genre, limit=SEED_INDEX_PLAYLISTS)
+        liked = LikedSongs.objects.filter(user=user, song__genre__genre=genre).values_list('song__spotify_id', flat=True)
+        index.liked = list(liked)
+        index.recent_playlists = [self.seed_index_entry(playlist, self.get_playlist_songs(playlist), genre)
+                                  for playlist in recent_playlists]
+
+    def get_playlist_songs(self, playlist):
+        return list(SongsPlaylist.objects.filter(playlist=playlist).values_list('song__spotify_id', 'song__genre__genre'))
+
+    def seed_index_entry(self, playlist, songs, genre):
+        return {
+            'id': playlist.id,
+            'seed': playlist.seed,
+            'tracks': [spotify_id for spotify_id, _ in songs],
+            'genre_tracks': [spotify_id for spotify_id, song_genre in songs if song_genre == genre],
+        }
+
+    def update_seed_index(self, user, genre, update):
+        with transaction.atomic():
+            index = self.lock_seed_index(user, genre)
+            if update(index):
+                index.save()
+        return index
+
+    def add_liked_song_to_seed_index(self, user, song):
+        def update(index):
+            if song.spotify_id in index.liked:
+                return False
+            index.liked.append(song.spotify_id)
+            return True
+
+        if song.genre_id is not None:
+            self.update_seed_index(user, song.genre.genre, update)
+
+    def remove_liked_song_from_seed_index(self, user, song):
+        def update(index):
+            if song.spotify_id not in index.liked:
+                return False
+            index.liked.remove(song.spotify_id)
+            return True
+
+        if song.genre_id is not None:
+            self.update_seed_index(user, song.genre.genre, update)
+
+    def add_playlist_to_seed_index(self, user, playlist, genres):
+        songs = self.get_playlist_songs(playlist)
+        for genre in genres:
+            entry = self.seed_index_entry(playlist, songs, genre)
+
+            def update(index):
+                older = [item for item in index.recent_playlists if item['id'] != playlist.id]
+                index.recent_playlists = [entry] + older[:SEED_INDEX_PLAYLISTS - 1]
+                return True
+
+            self.update_seed_index(user, genre, update)
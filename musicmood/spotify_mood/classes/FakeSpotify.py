@@ -0,0 +1,363 @@
+"""
+Lokalny serwer udający Spotify Web API i endpointy kont Spotify.
+
+Obsługuje endpointy używane przez SpotifyAPI na syntetycznym katalogu, z konfigurowalnym
+opóźnieniem i losowymi odpowiedziami 429, dzięki czemu cały proces generowania playlisty
+można uruchomić i obciążyć bez dostępu do prawdziwego API. Uruchomienie:
+
+    python manage.py fake_spotify --port 8765 --latency 80 --rate-limit 0.05
+
+a w ustawieniach SPOTIFY_API_BASE_URL = 'http://127.0.0.1:8765/v1'
+i SPOTIFY_ACCOUNTS_URL = 'http://127.0.0.1:8765'.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+GENRES = ['pop', 'rock', 'hip-hop', 'jazz', 'classical', 'electronic', 'metal', 'indie', 'folk', 'r-n-b',
+          'country', 'blues', 'reggae', 'punk', 'soul', 'dance', 'techno', 'house', 'ambient', 'alternative']
+WORDS = ['Midnight', 'Echo', 'Velvet', 'Neon', 'Silent', 'Golden', 'Electric', 'Paper', 'Crystal', 'Wild',
+         'River', 'Ocean', 'Summer', 'Shadow', 'Fire', 'Glass', 'Storm', 'Moon', 'Stone', 'Dream']
+
+FAKE_USER_ID = 'fake-user'
+
+
+class Catalog:
+    """
+    Deterministyczny (dla danego ziarna) katalog artystów i utworów z cechami audio.
+    """
+    def __init__(self, artists=300, tracks=3000, saved_tracks=50, seed=0):
+        rng = random.Random(seed)
+
+        self.artists = {}
+        for i in range(artists):
+            artist_id = f"fakeartist{i:08d}"
+            self.artists[artist_id] = {
+                'id': artist_id,
+                'name': f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}",
+                'genres': rng.sample(GENRES, rng.randint(1, 3)),
+                'popularity': rng.randint(10, 100),
+                'type': 'artist',
+                'uri': f"spotify:artist:{artist_id}",
+            }
+
+        artist_ids = list(self.artists)
+        self.tracks = {}
+        self.features = {}
+        for i in range(tracks):
+            track_id = f"faketrack{i:08d}"
+            track_artists = rng.sample(artist_ids, rng.choice([1, 1, 1, 2]))
+            self.tracks[track_id] = {
+                'id': track_id,
+                'name': f"{rng.choice(WORDS)} {rng.choice(WORDS).lower()} {i}",
+                'artists': [{'id': artist_id, 'name': self.artists[artist_id]['name']}
+                            for artist_id in track_artists],
+                'album': {'name': f"{rng.choice(WORDS)} {i // 10}"},
+                'duration_ms': rng.randint(90, 420) * 1000,
+                'popularity': rng.randint(0, 100),
+                'type': 'track',
+                'uri': f"spotify:track:{track_id}",
+            }
+            self.features[track_id] = {
+                'id': track_id,
+                'energy': round(rng.random(), 3),
+                'valence': round(rng.random(), 3),
+                'tempo': round(rng.uniform(60, 200), 3),
+                'loudness': round(rng.uniform(-60, 0), 3),
+                'danceability': round(rng.random(), 3),
+            }
+
+        self.saved_tracks = rng.sample(list(self.tracks), min(saved_tracks, tracks))
+        self.tracks_by_artist = {}
+        for track in self.tracks.values():
+            for artist in track['artists']:
+                self.tracks_by_artist.setdefault(artist['id'], []).append(track['id'])
+
+    def track(self, track_id, base_url):
+        track = self.tracks.get(track_id)
+        if track is None:
+            return None
+        image = {'url': f"{base_url}/images/{track_id}.svg", 'width': 300, 'height': 300}
+        return dict(track, album=dict(track['album'], images=[image]))
+
+    def artist(self, artist_id, base_url):
+        artist = self.artists.get(artist_id)
+        if artist is None:
+            return None
+        return dict(artist, images=[{'url': f"{base_url}/images/{artist_id}.svg", 'width': 300, 'height': 300}])
+
+    def recommend(self, params, rng):
+        limit = int(params.get('limit', 20))
+        min_duration = int(params.get('min_duration_ms', 0))
+        max_duration = int(params.get('max_duration_ms', 10 ** 9))
+        min_popularity = int(params.get('min_popularity', 0))
+
+        genres = {genre for genre in params.get('seed_genres', '').split(',') if genre}
+        for track_id in filter(None, params.get('seed_tracks', '').split(',')):
+            for artist in self.tracks.get(track_id, {}).get('artists', []):
+                genres.update(self.artists[artist['id']]['genres'])
+
+        def score(track_id):
+            features = self.features[track_id]
+            distance = 0.0
+            for name, scale in (('energy', 1), ('valence', 1), ('danceability', 1), ('tempo', 140), ('loudness', 60)):
+                if f'target_{name}' in params:
+                    distance += ((features[name] - float(params[f'target_{name}'])) / scale) ** 2
+            # Jak prawdziwe API, kolejne zapytania z tymi samymi parametrami zwracają częściowo inne utwory.
+            return distance + rng.random() * 0.5
+
+        candidates = [
+            track_id for track_id, track in self.tracks.items()
+            if min_duration <= track['duration_ms'] <= max_duration and track['popularity'] >= min_popularity
+            and (not genres or any(genres & set(self.artists[artist['id']]['genres']) for artist in track['artists']))
+        ]
+        return sorted(candidates, key=score)[:limit]
+
+
+class FakeSpotifyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, catalog=None, latency=0.0, jitter=0.5, rate_limit=0.0, retry_after=1, seed=0):
+        super().__init__(address, FakeSpotifyHandler)
+        self.catalog = catalog or Catalog(seed=seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.playlists = {}
+        self.requests = 0
+        self.throttled = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def roll(self):
+        with self.lock:
+            self.requests += 1
+            delay = self.random.uniform(self.latency * (1 - self.jitter), self.latency * (1 + self.jitter))
+            throttled = self.random.random() < self.rate_limit
+            if throttled:
+                self.throttled += 1
+        return delay, throttled
+
+
+class FakeSpotifyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    ROUTES = [
+        ('GET', r'/authorize', 'authorize'),
+        ('POST', r'/api/token', 'token'),
+        ('GET', r'/images/(?P<item_id>\w+)\.svg', 'image'),
+        ('GET', r'/v1/me', 'me'),
+        ('GET', r'/v1/me/playlists', 'my_playlists'),
+        ('GET', r'/v1/me/tracks', 'saved_tracks'),
+        ('POST', r'/v1/users/(?P<user_id>[\w-]+)/playlists', 'create_playlist'),
+        ('POST', r'/v1/playlists/(?P<playlist_id>[\w-]+)/tracks', 'add_tracks'),
+        ('GET', r'/v1/tracks', 'several_tracks'),
+        ('GET', r'/v1/tracks/(?P<track_id>\w+)', 'track'),
+        ('GET', r'/v1/artists', 'several_artists'),
+        ('GET', r'/v1/artists/(?P<artist_id>\w+)/top-tracks', 'top_tracks'),
+        ('GET', r'/v1/audio-features', 'audio_features'),
+        ('GET', r'/v1/recommendations', 'recommendations'),
+        ('GET', r'/v1/search', 'search'),
+    ]
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        self.params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = self.rfile.read(length) if length else b''
+
+        for route_method, pattern, name in self.ROUTES:
+            match = re.fullmatch(pattern, url.path)
+            if route_method == method and match:
+                break
+        else:
+            return self.send_json(404, {'error': {'status': 404, 'message': 'Service not found'}})
+
+        if url.path.startswith('/v1/'):
+            delay, throttled = self.server.roll()
+            time.sleep(delay)
+            if throttled:
+                return self.send_json(429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}},
+                                      {'Retry-After': str(self.server.retry_after)})
+            if not self.headers.get('Authorization', '').startswith('Bearer '):
+                return self.send_json(401, {'error': {'status': 401, 'message': 'No token provided'}})
+
+        getattr(self, f'handle_{name}')(**match.groupdict())
+
+    def send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode('utf-8')
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if status == 200 and self.command == 'GET' and self.headers.get('If-None-Match') == etag:
+            status, body = 304, b''
+
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status in (200, 304):
+            self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+    def page(self, items, path, default_limit=20):
+        limit = int(self.params.get('limit', default_limit))
+        offset = int(self.params.get('offset', 0))
+        next_url = None
+        if offset + limit < len(items):
+            next_url = f"{self.server.base_url}{path}?{urlencode(dict(self.params, limit=limit, offset=offset + limit))}"
+        return {'items': items[offset:offset + limit], 'total': len(items), 'limit': limit, 'offset': offset,
+                'next': next_url}
+
+    def ids(self):
+        return [item_id for item_id in self.params.get('ids', '').split(',') if item_id]
+
+    @property
+    def catalog(self):
+        return self.server.catalog
+
+    def handle_authorize(self):
+        location = f"{self.params['redirect_uri']}?{urlencode({'code': uuid.uuid4().hex})}"
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def handle_token(self):
+        self.send_json(200, {'access_token': f"fake-{uuid.uuid4().hex}", 'token_type': 'Bearer',
+                             'expires_in': 3600, 'refresh_token': f"fake-refresh-{uuid.uuid4().hex}"})
+
+    def handle_image(self, item_id):
+        color = hashlib.md5(item_id.encode('utf-8')).hexdigest()[:6]
+        body = (f'<svg xmlns="http://www.w3.org/2000/svg" width="300" height="300">'
+                f'<rect width="300" height="300" fill="#{color}"/></svg>').encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/svg+xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_me(self):
+        self.send_json(200, {'id': FAKE_USER_ID, 'display_name': 'Fake User', 'type': 'user'})
+
+    def handle_my_playlists(self):
+        with self.server.lock:
+            playlists = [dict(playlist, tracks={'total': len(playlist['track_uris'])})
+                         for playlist in reversed(list(self.server.playlists.values()))]
+        for playlist in playlists:
+            del playlist['track_uris']
+        self.send_json(200, self.page(playlists, '/v1/me/playlists'))
+
+    def handle_saved_tracks(self):
+        items = [{'added_at': '2024-01-01T00:00:00Z', 'track': self.catalog.track(track_id, self.server.base_url)}
+                 for track_id in self.catalog.saved_tracks]
+        self.send_json(200, self.page(items, '/v1/me/tracks'))
+
+    def handle_create_playlist(self, user_id):
+        data = json.loads(self.body or b'{}')
+        playlist_id = f"fakeplaylist{uuid.uuid4().hex[:12]}"
+        playlist = {
+            'id': playlist_id,
+            'name': data.get('name', ''),
+            'description': data.get('description', ''),
+            'public': data.get('public', False),
+            'snapshot_id': uuid.uuid4().hex,
+            'images': [{'url': f"{self.server.base_url}/images/{playlist_id}.svg"}],
+            'owner': {'id': user_id},
+            'track_uris': [],
+        }
+        with self.server.lock:
+            self.server.playlists[playlist_id] = playlist
+        self.send_json(201, {key: value for key, value in playlist.items() if key != 'track_uris'})
+
+    def handle_add_tracks(self, playlist_id):
+        data = json.loads(self.body or b'{}')
+        uris = data.get('uris', [])
+        with self.server.lock:
+            playlist = self.server.playlists.get(playlist_id)
+            if playlist is not None:
+                position = data.get('position', len(playlist['track_uris']))
+                if len(uris) > 100 or position > len(playlist['track_uris']):
+                    playlist = None
+                else:
+                    playlist['track_uris'][position:position] = uris
+                    playlist['snapshot_id'] = uuid.uuid4().hex
+                    snapshot_id = playlist['snapshot_id']
+        if playlist is None:
+            return self.send_json(400, {'error': {'status': 400, 'message': 'Invalid playlist or too many uris'}})
+        self.send_json(201, {'snapshot_id': snapshot_id})
+
+    def handle_several_tracks(self):
+        ids = self.ids()
+        if len(ids) > 50:
+            return self.send_json(400, {'error': {'status': 400, 'message': 'Too many ids requested'}})
+        self.send_json(200, {'tracks': [self.catalog.track(track_id, self.server.base_url) for track_id in ids]})
+
+    def handle_track(self, track_id):
+        track = self.catalog.track(track_id, self.server.base_url)
+        if track is None:
+            return self.send_json(404, {'error': {'status': 404, 'message': 'Non existing id'}})
+        self.send_json(200, track)
+
+    def handle_several_artists(self):
+        ids = self.ids()
+        if len(ids) > 50:
+            return self.send_json(400, {'error': {'status': 400, 'message': 'Too many ids requested'}})
+        self.send_json(200, {'artists': [self.catalog.artist(artist_id, self.server.base_url) for artist_id in ids]})
+
+    def handle_top_tracks(self, artist_id):
+        track_ids = sorted(self.catalog.tracks_by_artist.get(artist_id, []),
+                           key=lambda track_id: -self.catalog.tracks[track_id]['popularity'])[:10]
+        self.send_json(200, {'tracks': [self.catalog.track(track_id, self.server.base_url) for track_id in track_ids]})
+
+    def handle_audio_features(self):
+        ids = self.ids()
+        if len(ids) > 100:
+            return self.send_json(400, {'error': {'status': 400, 'message': 'Too many ids requested'}})
+        self.send_json(200, {'audio_features': [self.catalog.features.get(track_id) for track_id in ids]})
+
+    def handle_recommendations(self):
+        with self.server.lock:
+            rng = random.Random(self.server.random.random())
+        track_ids = self.catalog.recommend(self.params, rng)
+        self.send_json(200, {'tracks': [self.catalog.track(track_id, self.server.base_url) for track_id in track_ids],
+                             'seeds': []})
+
+    def handle_search(self):
+        query = self.params.get('q', '').strip().casefold()
+        search_type = self.params.get('type', 'track').split(',')[0]
+        artist_only = query.startswith('artist:')
+        query = query.split(':', 1)[1].strip() if artist_only else query
+
+        if search_type == 'artist':
+            items = [self.catalog.artist(artist_id, self.server.base_url)
+                     for artist_id, artist in self.catalog.artists.items() if query in artist['name'].casefold()]
+        else:
+            items = [self.catalog.track(track_id, self.server.base_url)
+                     for track_id, track in self.catalog.tracks.items()
+                     if any(query in artist['name'].casefold() for artist in track['artists'])
+                     or (not artist_only and query in track['name'].casefold())]
+
+        self.send_json(200, {f'{search_type}s': self.page(items, '/v1/search')})
@@ -0,0 +1,144 @@
+import threading
+from itertools import combinations
+
+import numpy as np
+
+from .FuzzyRules import INPUTS, OUTPUTS, get_rule_base, universe_from_spec
+
+
+def trapezoid(term):
+    if term['type'] == 'trimf':
+        a, b, c = term['params']
+        return float(a), float(b), float(b), float(c)
+    if term['type'] == 'trapmf':
+        return tuple(float(p) for p in term['params'])
+    raise ValueError(f"Silnik analityczny obsługuje tylko trimf i trapmf, a nie {term['type']}")
+
+
+def trapezoid_value(params, x):
+    a, b, c, d = params
+    if b <= x <= c:
+        return 1.0
+    if a < x < b:
+        return (x - a) / (b - a)
+    if c < x < d:
+        return (d - x) / (d - c)
+    return 0.0
+
+
+class AnalyticRuleBase:
+    """
+    Dokładny wariant wnioskowania Mamdaniego dla funkcji trimf/trapmf.
+
+    Funkcje przynależności liczone są ze swoich parametrów, bez próbkowania uniwersów.
+    Zagregowany zbiór wyjściowy (maksimum przyciętych trapezów) jest kawałkami liniowy,
+    więc po wyznaczeniu wszystkich punktów załamania jego środek ciężkości liczony jest
+    w postaci zamkniętej.
+    """
+    def __init__(self, rule_base):
+        spec = rule_base.spec
+        self.digest = rule_base.digest
+
+        self.inputs = []
+        for name, variable in spec['inputs'].items():
+            universe = universe_from_spec(variable['universe'])
+            terms = [trapezoid(term) for term in variable['terms'].values()]
+            self.inputs.append((name, float(universe[0]), float(universe[-1]), terms))
+
+        self.outputs = []
+        for name, variable in spec['outputs'].items():
+            terms = [trapezoid(term) for term in variable['terms'].values()]
+            self.outputs.append((name, terms))
+
+        self.rule_antecedents = [tuple(row) for row in rule_base.rule_antecedents.tolist()]
+        self.rule_consequents = [tuple(row) for row in rule_base.rule_consequents.tolist()]
+
+    def compute_recommendation(self, mood_value, time_of_day):
+        values = dict(zip(INPUTS, (mood_value, time_of_day)))
+        memberships = []
+        for name, low, high, terms in self.inputs:
+            value = min(max(float(values[name]), low), high)
+            memberships.append([trapezoid_value(params, value) for params in terms])
+
+        activations = [min(memberships[k][term] for k, term in enumerate(antecedent))
+                       for antecedent in self.rule_antecedents]
+
+        results = {}
+        for k, (name, terms) in enumerate(self.outputs):
+            cuts = [0.0] * len(terms)
+            for activation, consequent in zip(activations, self.rule_consequents):
+                if activation > cuts[consequent[k]]:
+                    cuts[consequent[k]] = activation
+            results[name] = self.centroid(terms, cuts)
+
+        return {name: results[name] for name in OUTPUTS}
+
+    @staticmethod
+    def _segment(term, left, right):
+        # Wartości przyciętego trapezu na końcach przedziału, w którym jest on liniowy.
+        a, b, c, d, cut = term
+        middle = (left + right) / 2
+        if middle <= a or middle >= d:
+            return 0.0, 0.0
+        if middle < b:
+            y0, y1 = (left - a) / (b - a), (right - a) / (b - a)
+        elif middle <= c:
+            y0 = y1 = 1.0
+        else:
+            y0, y1 = (d - left) / (d - c), (d - right) / (d - c)
+
+        if (y0 + y1) / 2 > cut:
+            return cut, cut
+        return y0, y1
+
+    @classmethod
+    def centroid(cls, terms, cuts):
+        active = [(a, b, c, d, cut) for (a, b, c, d), cut in zip(terms, cuts) if cut > 0]
+        if not active:
+            raise ValueError("Żadna reguła nie została aktywowana")
+
+        points = set()
+        for a, b, c, d, cut in active:
+            points.update((a, b, c, d))
+            if b > a:
+                points.add(a + cut * (b - a))
+            if d > c:
+                points.add(d - cut * (d - c))
+        points = sorted(points)
+
+        area = moment = 0.0
+        for left, right in zip(points, points[1:]):
+            segments = [cls._segment(term, left, right) for term in active]
+
+            # Maksimum odcinków liniowych załamuje się w punktach ich przecięcia.
+            splits = []
+            for (p0, p1), (q0, q1) in combinations(segments, 2):
+                before, after = p0 - q0, p1 - q1
+                if before * after < 0:
+                    splits.append(left + (right - left) * before / (before - after))
+
+            xs = [left] + sorted(splits) + [right]
+            width = right - left
+            ys = [max(y0 + (y1 - y0) * (x - left) / width for y0, y1 in segments) for x in xs]
+
+            for x1, x2, y1, y2 in zip(xs, xs[1:], ys, ys[1:]):
+                dx = x2 - x1
+                area += 0.5 * dx * (y1 + y2)
+                moment += dx * (x1 * (y1 + y2) / 2 + dx * (y1 + 2 * y2) / 6)
+
+        return moment / max(area, np.finfo(float).eps)
+
+
+_analytic = None
+_analytic_lock = threading.Lock()
+
+
+def get_analytic_rule_base():
+    global _analytic
+
+    rule_base = get_rule_base()
+    if _analytic is None or _analytic.digest != rule_base.digest:
+        with _analytic_lock:
+            if _analytic is None or _analytic.digest != rule_base.digest:
+                _analytic = AnalyticRuleBase(rule_base)
+    return _analytic
@@ -0,0 +1,38 @@
+from .FuzzyRules import get_rule_base, setting
+
+ENGINES = ('surface', 'analytic', 'compiled', 'simulation')
+
+
+def get_engine(name=None):
+    """
+    Zwraca silnik wyznaczający parametry playlisty, wybrany ustawieniem FUZZY_ENGINE:
+
+    - ``surface`` - interpolacja w zbudowanej wcześniej tablicy (najszybszy),
+    - ``analytic`` - dokładne środki ciężkości bez próbkowania uniwersów,
+    - ``compiled`` - reguły skompilowane do macierzy NumPy,
+    - ``simulation`` - pula sterowników scikit-fuzzy.
+    """
+    name = name or setting('FUZZY_ENGINE', 'surface')
+
+    if name == 'surface':
+        from .FuzzySurface import get_surface
+        return get_surface()
+    if name == 'analytic':
+        from .FuzzyAnalytic import get_analytic_rule_base
+        return get_analytic_rule_base()
+    if name == 'compiled':
+        return get_rule_base()
+    if name == 'simulation':
+        from .Fuzzy import get_fuzzy_pool
+        return get_fuzzy_pool()
+
+    raise ValueError(f"Nieznany silnik logiki rozmytej: {name} (dostępne: {', '.join(ENGINES)})")
+
+
+def print_results(mood_value, time_of_the_day, results):
+    print(f"\nParametry dla nastroju (mood={mood_value}) i pory dnia {time_of_the_day}:")
+    print(f"Energy: {results['energy']}")
+    print(f"Valence: {results['valence']}")
+    print(f"Tempo: {results['tempo']} BPM")
+    print(f"Loudness: {results['loudness']} dB")
+    print(f"Danceability: {results['danceability']}")
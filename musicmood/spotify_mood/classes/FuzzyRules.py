@@ -0,0 +1,331 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+INPUTS = ('mood', 'time_of_day')
+OUTPUTS = ('energy', 'valence', 'tempo', 'loudness', 'danceability')
+MEMBERSHIP_PARAMS = {'trimf': 3, 'trapmf': 4}
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fuzzy_rules.json')
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fuzzy_cache')
+
+# Próbkowanie wyjść jest 20 razy gęstsze niż uniwersum z pliku reguł.
+OUTPUT_REFINE = 20
+
+
+def setting(name, default):
+    from django.conf import settings
+    from django.core.exceptions import ImproperlyConfigured
+
+    try:
+        return getattr(settings, name, default)
+    except ImproperlyConfigured:
+        return default
+
+
+def universe_from_spec(spec):
+    start, stop, step = spec
+    return np.arange(start, stop, step)
+
+
+def membership(kind, universe, params):
+    x = np.asarray(universe, dtype=np.float64)
+    if kind == 'trimf':
+        a, b, c = params
+        params = (a, b, b, c)
+    elif kind != 'trapmf':
+        raise ValueError(f"Nieobsługiwany typ funkcji przynależności: {kind}")
+
+    a, b, c, d = params
+    y = np.zeros_like(x)
+    rising = (x > a) & (x < b)
+    y[rising] = (x[rising] - a) / (b - a)
+    y[(x >= b) & (x <= c)] = 1.0
+    falling = (x > c) & (x < d)
+    y[falling] = (d - x[falling]) / (d - c)
+    return y
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_spec(spec):
+    """
+    Sprawdza strukturę pliku reguł, zanim zostanie on skompilowany. Każdy błąd zgłaszany jest
+    jako ValueError z opisem miejsca w pliku.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("Baza reguł musi być obiektem JSON")
+
+    for kind, names in (('inputs', INPUTS), ('outputs', OUTPUTS)):
+        variables = spec.get(kind)
+        if not isinstance(variables, dict):
+            raise ValueError(f"Pole '{kind}' musi być obiektem")
+        missing = [name for name in names if name not in variables]
+        if kind == 'inputs' and (missing or len(variables) != len(names)):
+            raise ValueError(f"Zmienne wejściowe bazy reguł muszą być dokładnie: {', '.join(names)}")
+        if missing:
+            raise ValueError(f"Brak zmiennych wyjściowych w bazie reguł: {', '.join(missing)}")
+
+        for name, variable in variables.items():
+            if not isinstance(variable, dict):
+                raise ValueError(f"Zmienna '{name}' musi być obiektem")
+            universe = variable.get('universe')
+            if not (isinstance(universe, list) and len(universe) == 3 and all(map(is_number, universe))
+                    and universe[2] > 0 and universe[1] > universe[0]):
+                raise ValueError(f"Niepoprawne uniwersum zmiennej '{name}': {universe!r}")
+            terms = variable.get('terms')
+            if not isinstance(terms, dict) or not terms:
+                raise ValueError(f"Zmienna '{name}' nie ma termów")
+            for label, term in terms.items():
+                param_count = MEMBERSHIP_PARAMS.get(term.get('type')) if isinstance(term, dict) else None
+                params = term.get('params') if param_count else None
+                if not (isinstance(params, list) and len(params) == param_count and all(map(is_number, params))
+                        and params == sorted(params)):
+                    raise ValueError(f"Niepoprawny term '{label}' zmiennej '{name}': {term!r}")
+
+    rules = spec.get('rules')
+    if not isinstance(rules, list) or not rules:
+        raise ValueError("Pole 'rules' musi być niepustą listą")
+    for i, rule in enumerate(rules):
+        if not (isinstance(rule, dict) and isinstance(rule.get('if'), dict) and isinstance(rule.get('then'), dict)):
+            raise ValueError(f"Niepoprawna reguła nr {i + 1}: oczekiwano pól 'if' i 'then'")
+
+
+class CompiledRuleBase:
+    """
+    Baza reguł Mamdaniego skompilowana do macierzy NumPy.
+
+    Dla każdej zmiennej wejściowej trzymane są funkcje przynależności spróbkowane
+    na jej uniwersum, a reguły zapisane są jako indeksy termów, dzięki czemu
+    ewaluacja całej paczki punktów to kilka operacji min/max na tablicach.
+    """
+    def __init__(self, spec, digest, input_universes, input_mfs, output_universes, output_mfs,
+                 rule_antecedents, rule_consequents):
+        self.spec = spec
+        self.digest = digest
+        self.inputs = list(spec['inputs'])
+        self.outputs = list(spec['outputs'])
+        self.input_universes = input_universes
+        self.input_mfs = input_mfs
+        self.output_universes = output_universes
+        self.output_mfs = output_mfs
+        self.rule_antecedents = rule_antecedents
+        self.rule_consequents = rule_consequents
+
+        self.rule_activation = []
+        for k, output_mfs_k in enumerate(output_mfs):
+            matrix = np.zeros((len(rule_consequents), len(output_mfs_k)))
+            matrix[np.arange(len(rule_consequents)), rule_consequents[:, k]] = 1.0
+            self.rule_activation.append(matrix)
+
+    @classmethod
+    def compile(cls, spec, digest):
+        validate_spec(spec)
+
+        input_universes, input_mfs = [], []
+        for name, variable in spec['inputs'].items():
+            universe = universe_from_spec(variable['universe'])
+            input_universes.append(universe)
+            input_mfs.append(np.array([membership(term['type'], universe, term['params'])
+                                       for term in variable['terms'].values()]))
+
+        output_universes, output_mfs = [], []
+        for name, variable in spec['outputs'].items():
+            universe = universe_from_spec(variable['universe'])
+            sampled = np.array([membership(term['type'], universe, term['params'])
+                                for term in variable['terms'].values()])
+            refined = np.linspace(universe[0], universe[-1], (len(universe) - 1) * OUTPUT_REFINE + 1)
+            output_universes.append(refined)
+            output_mfs.append(np.array([np.interp(refined, universe, mf) for mf in sampled]))
+
+        rule_antecedents, rule_consequents = [], []
+        for i, rule in enumerate(spec['rules']):
+            try:
+                rule_antecedents.append([list(variable['terms']).index(rule['if'][name])
+                                         for name, variable in spec['inputs'].items()])
+                rule_consequents.append([list(variable['terms']).index(rule['then'][name])
+                                         for name, variable in spec['outputs'].items()])
+            except (KeyError, ValueError) as e:
+                raise ValueError(f"Niepoprawna reguła nr {i + 1}: {e}") from e
+
+        return cls(spec, digest, input_universes, input_mfs, output_universes, output_mfs,
+                   np.array(rule_antecedents, dtype=np.intp), np.array(rule_consequents, dtype=np.intp))
+
+    def evaluate(self, *inputs):
+        outputs = {}
+        activation = None
+        for universe, mfs, values, terms in zip(self.input_universes, self.input_mfs, inputs, self.rule_antecedents.T):
+            memberships = np.array([np.interp(values, universe, mf) for mf in mfs])
+            rule_memberships = memberships[terms].T
+            activation = rule_memberships if activation is None else np.fmin(activation, rule_memberships)
+
+        for name, universe, mfs, rule_activation in zip(self.outputs, self.output_universes, self.output_mfs,
+                                                        self.rule_activation):
+            cuts = (activation[:, :, None] * rule_activation[None, :, :]).max(axis=1)
+            aggregated = np.fmin(cuts[:, :, None], mfs[None, :, :]).max(axis=1)
+            outputs[name] = centroid_batch(universe, aggregated)
+
+        return outputs
+
+    def compute_recommendations_batch(self, moods, times, chunk_size=4096):
+        moods, times = np.broadcast_arrays(np.asarray(moods, dtype=np.float64),
+                                           np.asarray(times, dtype=np.float64))
+        results = np.empty(moods.shape, dtype=[(name, np.float64) for name in OUTPUTS])
+
+        # Kolejność wejść w evaluate() wynika z pliku reguł, więc wartości przypisywane są po nazwie.
+        values = dict(zip(INPUTS, (moods.ravel(), times.ravel())))
+        flat_inputs = [np.clip(values[name], universe[0], universe[-1])
+                       for name, universe in zip(self.inputs, self.input_universes)]
+        flat_results = results.reshape(-1)
+
+        for start in range(0, flat_results.size, chunk_size):
+            chunk = slice(start, start + chunk_size)
+            outputs = self.evaluate(*(values[chunk] for values in flat_inputs))
+            for name in OUTPUTS:
+                flat_results[name][chunk] = outputs[name]
+
+        return results
+
+    def compute_recommendation(self, mood_value, time_of_day):
+        results = self.compute_recommendations_batch(mood_value, time_of_day)
+        return {name: float(results[name]) for name in OUTPUTS}
+
+    def save(self, path):
+        arrays = {
+            'spec': np.array(json.dumps(self.spec, ensure_ascii=False)),
+            'digest': np.array(self.digest),
+            'rule_antecedents': self.rule_antecedents,
+            'rule_consequents': self.rule_consequents,
+        }
+        for k, (universe, mfs) in enumerate(zip(self.input_universes, self.input_mfs)):
+            arrays[f'input_universe_{k}'] = universe
+            arrays[f'input_mfs_{k}'] = mfs
+        for k, (universe, mfs) in enumerate(zip(self.output_universes, self.output_mfs)):
+            arrays[f'output_universe_{k}'] = universe
+            arrays[f'output_mfs_{k}'] = mfs
+
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        atomic_write(path, buffer.getvalue())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            spec = json.loads(str(data['spec']))
+            return cls(
+                spec, str(data['digest']),
+                [data[f'input_universe_{k}'] for k in range(len(spec['inputs']))],
+                [data[f'input_mfs_{k}'] for k in range(len(spec['inputs']))],
+                [data[f'output_universe_{k}'] for k in range(len(spec['outputs']))],
+                [data[f'output_mfs_{k}'] for k in range(len(spec['outputs']))],
+                data['rule_antecedents'], data['rule_consequents'],
+            )
+
+
+def centroid_batch(universe, mfs):
+    x1, x2 = universe[:-1], universe[1:]
+    y1, y2 = mfs[:, :-1], mfs[:, 1:]
+    dx = x2 - x1
+
+    area = 0.5 * dx * (y1 + y2)
+    moment = dx * (x1 * (y1 + y2) / 2 + dx * (y1 + 2 * y2) / 6)
+
+    return moment.sum(axis=1) / np.fmax(area.sum(axis=1), np.finfo(float).eps)
+
+
+def atomic_write(path, content):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def compile_rule_file(path, cache_dir):
+    with open(path, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+
+    cache_path = os.path.join(cache_dir, f"rules-{digest[:16]}.npz")
+    try:
+        rule_base = CompiledRuleBase.load(cache_path)
+        if rule_base.digest == digest:
+            return rule_base
+    except (OSError, KeyError, ValueError):
+        pass
+
+    rule_base = CompiledRuleBase.compile(json.loads(content.decode('utf-8')), digest)
+    rule_base.save(cache_path)
+    return rule_base
+
+
+class RuleBaseRegistry:
+    """
+    Przechowuje aktualnie obowiązującą bazę reguł i podmienia ją po zmianie pliku.
+
+    Plik sprawdzany jest co najwyżej raz na ``check_interval`` sekund. Błędny plik
+    nie zatrzymuje aplikacji - dalej używana jest poprzednia wersja reguł.
+    """
+    def __init__(self, path, cache_dir, check_interval=2.0):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.check_interval = check_interval
+
+        self._rule_base = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        rule_base = self._rule_base
+        if rule_base is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return rule_base
+
+        with self._lock:
+            if self._rule_base is None or time.monotonic() - self._checked_at >= self.check_interval:
+                self._reload()
+            return self._rule_base
+
+    def _reload(self):
+        self._checked_at = time.monotonic()
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature == self._signature and self._rule_base is not None:
+                return
+            rule_base = compile_rule_file(self.path, self.cache_dir)
+        except Exception as e:
+            if self._rule_base is None:
+                raise
+            print(f"Nie udało się przeładować reguł logiki rozmytej z {self.path}: {e}")
+            return
+
+        if self._rule_base is None or rule_base.digest != self._rule_base.digest:
+            print(f"Załadowano reguły logiki rozmytej {rule_base.digest[:16]} z {self.path}")
+            self._rule_base = rule_base
+        self._signature = signature
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_rule_base():
+    global _registry
+
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = RuleBaseRegistry(
+                    str(setting('FUZZY_RULES_PATH', DEFAULT_RULES_PATH)),
+                    str(setting('FUZZY_CACHE_DIR', DEFAULT_CACHE_DIR)),
+                    setting('FUZZY_RULES_CHECK_INTERVAL', 2.0),
+                )
+    return _registry.get()
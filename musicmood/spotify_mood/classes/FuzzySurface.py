@@ -0,0 +1,193 @@
+import io
+import os
+import threading
+
+import numpy as np
+
+from .FuzzyRules import DEFAULT_CACHE_DIR, OUTPUTS, atomic_write, get_rule_base, setting
+
+_surface = None
+_surface_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+
+
+class FuzzySurface:
+    """
+    Tablica wyników systemu rozmytego na regularnej siatce (nastrój, pora dnia).
+
+    Zapytania obsługiwane są interpolacją dwuliniową, a ``error_bound`` przechowuje
+    ograniczenie błędu względem symulacji scikit-fuzzy wyznaczone przez ``measure_error``.
+    """
+    MOOD_RANGE = (0.0, 1.0)
+    TIME_RANGE = (0.0, 24.0)
+
+    def __init__(self, mood_step, time_step, table, error_bound=None, digest=''):
+        self.digest = digest
+        self.mood_step = float(mood_step)
+        self.time_step = float(time_step)
+        self.table = np.asarray(table, dtype=np.float64)
+        self.error_bound = error_bound or {}
+
+        self._mood_cells = self.table.shape[0] - 1
+        self._time_cells = self.table.shape[1] - 1
+
+    @staticmethod
+    def grid(start, stop, step):
+        count = int(round((stop - start) / step)) + 1
+        return np.linspace(start, stop, count)
+
+    @classmethod
+    def build(cls, fuzzy=None, mood_step=0.005, time_step=0.1, check_error=True, reference=None,
+              max_check_points=None):
+        fuzzy = fuzzy or get_rule_base()
+        moods, times = np.meshgrid(cls.grid(*cls.MOOD_RANGE, mood_step), cls.grid(*cls.TIME_RANGE, time_step),
+                                   indexing='ij')
+
+        results = fuzzy.compute_recommendations_batch(moods, times)
+        table = np.stack([results[name] for name in OUTPUTS], axis=-1)
+
+        rule_base = getattr(fuzzy, 'rule_base', fuzzy)
+        surface = cls(mood_step, time_step, table, digest=rule_base.digest)
+        if check_error:
+            if reference is None:
+                from .Fuzzy import Fuzzy
+                reference = Fuzzy(rule_base)
+            surface.error_bound = surface.measure_error(reference, max_points=max_check_points)
+        return surface
+
+    def measure_error(self, reference, refine=2, max_points=None):
+        """
+        Wyznacza ograniczenie błędu interpolacji względem ``reference`` - silnika z metodą
+        ``compute_recommendation``, zwykle dokładnej symulacji scikit-fuzzy.
+
+        W każdej sprawdzanej komórce błąd mierzony jest na siatce ``refine`` razy gęstszej niż
+        tablica, czyli w narożnikach, na krawędziach i w środku komórki. Ograniczeniem jest
+        największy zmierzony błąd powiększony o największą zmianę błędu między sąsiednimi
+        punktami kontrolnymi, co obejmuje również punkty leżące między nimi. Przy ``max_points``
+        sprawdzana jest co k-ta komórka w każdym kierunku, tak aby liczba wywołań ``reference``
+        nie przekroczyła tej wartości.
+        """
+        stride = 1
+        if max_points:
+            while (-(-self._mood_cells // stride)) * (-(-self._time_cells // stride)) * (refine + 1) ** 2 > max_points:
+                stride += 1
+
+        errors = {}
+
+        def error_at(i, j):
+            # (i, j) to indeksy punktu na gęstszej siatce - punkty wspólne sąsiednich komórek liczone są raz.
+            if (i, j) not in errors:
+                mood_value = self.MOOD_RANGE[0] + i * self.mood_step / refine
+                time_of_day = self.TIME_RANGE[0] + j * self.time_step / refine
+                exact = reference.compute_recommendation(mood_value, time_of_day)
+                approx = self.compute_recommendation(mood_value, time_of_day)
+                errors[i, j] = np.array([exact[name] - approx[name] for name in OUTPUTS])
+            return errors[i, j]
+
+        measured = np.zeros(len(OUTPUTS))
+        variation = np.zeros(len(OUTPUTS))
+        for cell_i in range(0, self._mood_cells, stride):
+            for cell_j in range(0, self._time_cells, stride):
+                cell = np.array([[error_at(cell_i * refine + a, cell_j * refine + b) for b in range(refine + 1)]
+                                 for a in range(refine + 1)])
+                measured = np.fmax(measured, np.abs(cell).max(axis=(0, 1)))
+                variation = np.fmax(variation, np.abs(np.diff(cell, axis=0)).max(axis=(0, 1)))
+                variation = np.fmax(variation, np.abs(np.diff(cell, axis=1)).max(axis=(0, 1)))
+
+        return {name: float(measured[k] + variation[k]) for k, name in enumerate(OUTPUTS)}
+
+    def compute_recommendation(self, mood_value, time_of_day):
+        mood_pos = (min(max(mood_value, self.MOOD_RANGE[0]), self.MOOD_RANGE[1]) - self.MOOD_RANGE[0]) / self.mood_step
+        time_pos = (min(max(time_of_day, self.TIME_RANGE[0]), self.TIME_RANGE[1]) - self.TIME_RANGE[0]) / self.time_step
+
+        i = min(int(mood_pos), self._mood_cells - 1)
+        j = min(int(time_pos), self._time_cells - 1)
+        u = mood_pos - i
+        v = time_pos - j
+
+        table = self.table
+        values = ((1 - u) * (1 - v) * table[i, j] + (1 - u) * v * table[i, j + 1] +
+                  u * (1 - v) * table[i + 1, j] + u * v * table[i + 1, j + 1])
+
+        return {name: float(value) for name, value in zip(OUTPUTS, values)}
+
+    def save(self, path):
+        buffer = io.BytesIO()
+        np.savez(buffer, mood_step=self.mood_step, time_step=self.time_step, table=self.table,
+                 error_bound=np.array([self.error_bound.get(name, np.nan) for name in OUTPUTS]),
+                 digest=np.array(self.digest))
+        atomic_write(path, buffer.getvalue())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            error_bound = {name: float(error) for name, error in zip(OUTPUTS, data['error_bound'])
+                           if not np.isnan(error)}
+            digest = str(data['digest']) if 'digest' in data else ''
+            return cls(float(data['mood_step']), float(data['time_step']), data['table'], error_bound, digest)
+
+
+def surface_path(digest):
+    return os.path.join(str(setting('FUZZY_CACHE_DIR', DEFAULT_CACHE_DIR)), f"surface-{digest[:16]}.npz")
+
+
+def load_surface(rule_base):
+    try:
+        surface = FuzzySurface.load(surface_path(rule_base.digest))
+    except (OSError, KeyError, ValueError):
+        return None
+    return surface if surface.digest == rule_base.digest else None
+
+
+def build_surface(rule_base):
+    # Pomiar ograniczenia błędu wymaga tysięcy symulacji scikit-fuzzy, więc wykonuje go tylko
+    # polecenie build_fuzzy_surface - tablica zbudowana w tle ma pusty error_bound.
+    path = surface_path(rule_base.digest)
+    print(f"Brak tablicy logiki rozmytej w {path}, trwa jej budowanie w tle "
+          f"(pełną tablicę z ograniczeniem błędu buduje polecenie build_fuzzy_surface).")
+    surface = FuzzySurface.build(rule_base, check_error=False)
+    surface.save(path)
+    return surface
+
+
+def _rebuild_in_background(rule_base):
+    if not _rebuild_lock.acquire(blocking=False):
+        return
+
+    def rebuild():
+        global _surface
+        try:
+            _surface = load_surface(rule_base) or build_surface(rule_base)
+        finally:
+            _rebuild_lock.release()
+
+    threading.Thread(target=rebuild, name='fuzzy-surface-rebuild', daemon=True).start()
+
+
+def get_surface():
+    """
+    Zwraca tablicę dla aktualnych reguł. Tablica wczytywana jest z pliku; gdy go brakuje, budowana
+    jest w tle, a do tego czasu zapytania obsługuje poprzednia tablica albo, przy pierwszym
+    uruchomieniu, dokładny silnik analityczny - zapytanie nigdy nie czeka na budowę.
+    """
+    global _surface
+
+    rule_base = get_rule_base()
+    surface = _surface
+    if surface is not None and surface.digest == rule_base.digest:
+        return surface
+
+    if surface is None:
+        with _surface_lock:
+            if _surface is None:
+                _surface = load_surface(rule_base)
+            surface = _surface
+        if surface is not None and surface.digest == rule_base.digest:
+            return surface
+
+    _rebuild_in_background(rule_base)
+    if surface is not None:
+        return surface
+
+    from .FuzzyAnalytic import get_analytic_rule_base
+    return get_analytic_rule_base()
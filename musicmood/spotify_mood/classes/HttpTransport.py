@@ -0,0 +1,216 @@
+import os
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .Cassette import get_cassette
+from .CircuitBreaker import circuit_open_response, endpoint_name, make_breaker
+from .RateLimiter import RateLimitExceeded, get_rate_limiter
+
+# Metody, które można bezpiecznie powtórzyć - POST tworzący playlistę nie może wykonać się dwa razy.
+# Odpowiedzi 429 nie są ponawiane przez urllib3 - obsługuje je wspólny RateLimiter.
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class HttpTransport:
+    """
+    Wspólna sesja HTTP z pulą połączeń keep-alive, domyślnym limitem czasu i ponawianiem
+    błędów serwera. Jedna instancja obsługuje wszystkie wątki procesu; sesja nie przechowuje
+    ciasteczek, więc jedynym współdzielonym stanem jest pula połączeń urllib3.
+
+    Każdy logiczny endpoint ma własny wyłącznik (CircuitBreaker) z histogramem czasów odpowiedzi;
+    zapytania do otwartego endpointu od razu dostają zastępczą odpowiedź 503.
+    """
+    def __init__(self, name, pool_size=10, timeout=(3.05, 10), retries=2, backoff_factor=0.3, limiter=None,
+                 cassette=None):
+        self.name = name
+        self.timeout = timeout
+        self.limiter = limiter
+        self.cassette = cassette
+        self.retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                           backoff_factor=backoff_factor, status_forcelist=RETRY_STATUSES,
+                           allowed_methods=IDEMPOTENT_METHODS, respect_retry_after_header=False,
+                           raise_on_status=False)
+
+        self.adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=self.retry)
+        self.session = requests.Session()
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+        self._lock = threading.Lock()
+        self._breakers = {}
+        self._requests = 0
+        self._retries = 0
+        self._errors = 0
+        self._seconds = 0.0
+
+    def breaker(self, endpoint):
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = make_breaker(f"{self.name}:{endpoint}")
+            return breaker
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint = endpoint_name(self.name, url)
+        breaker = self.breaker(endpoint)
+        if breaker.reject_if_open():
+            return circuit_open_response(method, url, endpoint, breaker.retry_after())
+        if self.limiter is None:
+            return self._send(method, url, endpoint, **kwargs)
+
+        attempt = 0
+        while True:
+            try:
+                self.limiter.acquire()
+            except RateLimitExceeded as e:
+                print(f"Limit zapytań {self.name}: rezygnuję z {method} {url}, czekanie {e.wait:.1f} s")
+                return throttled_response(method, url, e.wait)
+
+            response = self._send(method, url, endpoint, **kwargs)
+            if response.status_code != 429:
+                return response
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            self.limiter.backoff(retry_after)
+            attempt += 1
+            if attempt > self.limiter.max_retries:
+                return response
+            print(f"Za dużo zapytań do {self.name}. Ponawiam za {retry_after} s ({attempt}/{self.limiter.max_retries}).")
+
+    def _send(self, method, url, endpoint, **kwargs):
+        breaker = self.breaker(endpoint)
+        if not breaker.allow():
+            return circuit_open_response(method, url, endpoint, breaker.retry_after())
+
+        start = time.perf_counter()
+        try:
+            if self.cassette is not None and self.cassette.mode == 'replay':
+                response = self.cassette.play(self._prepare(method, url, **kwargs))
+            else:
+                response = self.session.request(method, url, **kwargs)
+                if self.cassette is not None:
+                    self.cassette.record(response.request, response, time.perf_counter() - start)
+        except requests.RequestException:
+            elapsed = time.perf_counter() - start
+            breaker.record(elapsed, True)
+            with self._lock:
+                self._requests += 1
+                self._errors += 1
+                self._seconds += elapsed
+            raise
+
+        elapsed = time.perf_counter() - start
+        breaker.record(elapsed, response.status_code >= 500)
+        retries = getattr(response.raw, 'retries', None)
+        with self._lock:
+            self._requests += 1
+            self._retries += len(retries.history) if retries is not None else 0
+            self._seconds += elapsed
+        return response
+
+    def _prepare(self, method, url, headers=None, params=None, data=None, json=None, **kwargs):
+        request = requests.Request(method, url, headers=headers, params=params, data=data, json=json)
+        return self.session.prepare_request(request)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def stats(self):
+        # Liczniki urllib3: ile połączeń otwarto i ile zapytań przez nie wysłano.
+        pools = self.adapter.poolmanager.pools
+        connections = sent = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                sent += pool.num_requests
+
+        with self._lock:
+            stats = {
+                'name': self.name,
+                'requests': self._requests,
+                'retries': self._retries,
+                'errors': self._errors,
+                'connections': connections,
+                'reuse_rate': 1 - connections / sent if sent else 0.0,
+                'mean_ms': self._seconds / self._requests * 1000 if self._requests else 0.0,
+            }
+            breakers = dict(self._breakers)
+        stats['endpoints'] = {endpoint: breaker.stats() for endpoint, breaker in sorted(breakers.items())}
+        if self.cassette is not None:
+            stats['cassette'] = self.cassette.stats()
+        return stats
+
+    def close(self):
+        self.session.close()
+
+
+def parse_retry_after(value, default=1.0):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def throttled_response(method, url, wait):
+    # Odpowiedź zastępcza, żeby wywołujący obsłużył ją tak samo jak 429 od serwera.
+    response = requests.Response()
+    response.status_code = 429
+    response.headers['Retry-After'] = str(int(wait) + 1)
+    response.url = url
+    response.request = requests.Request(method, url).prepare()
+    response._content = b'{"error": {"status": 429, "message": "rate limited locally"}}'
+    return response
+
+
+_transports = {}
+_transports_pid = None
+_transports_lock = threading.Lock()
+
+
+def get_transport(name='spotify'):
+    global _transports_pid
+
+    with _transports_lock:
+        # Połączenia nie mogą być dzielone między procesami po fork() serwera.
+        if _transports_pid != os.getpid():
+            _transports.clear()
+            _transports_pid = os.getpid()
+
+        transport = _transports.get(name)
+        if transport is None:
+            transport = HttpTransport(
+                name,
+                pool_size=getattr(settings, 'HTTP_POOL_SIZE', 10),
+                timeout=getattr(settings, 'HTTP_TIMEOUT', (3.05, 10)),
+                retries=getattr(settings, 'HTTP_RETRIES', 2),
+                backoff_factor=getattr(settings, 'HTTP_RETRY_BACKOFF', 0.3),
+                limiter=get_rate_limiter(name) if name == 'spotify' else None,
+                cassette=get_cassette(),
+            )
+            _transports[name] = transport
+        return transport
+
+
+def transport_stats():
+    with _transports_lock:
+        transports = list(_transports.values()) if _transports_pid == os.getpid() else []
+    return [transport.stats() for transport in transports]
@@ -0,0 +1,78 @@
+"""
+Kolejka zadań w tle bez zewnętrznego brokera.
+
+Zadania wykonuje lokalna pula wątków procesu, który je przyjął, a ich stan (queued, running,
+done, error) i wynik zapisywane są w tabeli ``job``. Odpytywanie o stan trafia więc do tego
+samego wiersza niezależnie od procesu serwera, który obsługuje zapytanie.
+"""
+import os
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from ..models import Job
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+ERROR = 'error'
+
+
+def get_job(job_id):
+    return Job.objects.filter(id=job_id).values().first()
+
+
+def _update_job(job_id, **fields):
+    Job.objects.filter(id=job_id).update(**fields)
+
+
+def _run_job(job_id, func, args, kwargs):
+    _update_job(job_id, status=RUNNING, started_at=timezone.now())
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        traceback.print_exc()
+        _update_job(job_id, status=ERROR, error=str(e), finished_at=timezone.now())
+    else:
+        _update_job(job_id, status=DONE, result=result, finished_at=timezone.now())
+    finally:
+        # Wątek puli ma własne połączenie z bazą - zamykane po każdym zadaniu.
+        connections.close_all()
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+
+    with _executor_lock:
+        # Wątki nie przechodzą przez fork() - każdy proces serwera tworzy własną pulę.
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'JOB_WORKERS', 2),
+                                           thread_name_prefix='musicmood-job')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def submit_job(kind, user_id, func, *args, **kwargs):
+    """
+    Zapisuje zadanie w bazie i przekazuje je do puli wątków. Zwraca id zadania od razu,
+    bez czekania na jego wykonanie. Zadania starsze niż JOB_TTL sekund są przy okazji usuwane.
+    """
+    now = timezone.now()
+    Job.objects.filter(created_at__lt=now - timedelta(seconds=getattr(settings, 'JOB_TTL', 3600))).delete()
+
+    job_id = uuid.uuid4().hex
+    Job.objects.create(id=job_id, kind=kind, user_id=user_id, status=QUEUED, created_at=now)
+    # Wątek puli korzysta z osobnego połączenia, więc zadanie startuje dopiero po zatwierdzeniu wiersza.
+    transaction.on_commit(lambda: _get_executor().submit(_run_job, job_id, func, args, kwargs))
+    return job_id
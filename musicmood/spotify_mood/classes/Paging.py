@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def iterate_pages(http, url, headers=None, params=None, key=None, max_items=None, prefetch=True):
+    """
+    Zwraca kolejne elementy obiektu stronicowania Spotify (``items`` + ``next``), pobierając
+    strony dopiero wtedy, gdy są potrzebne. Podczas przetwarzania bieżącej strony następna
+    pobierana jest w tle, a po osiągnięciu ``max_items`` elementów kolejne strony nie są już
+    pobierane - w pamięci są najwyżej dwie strony naraz.
+
+    ``key`` wskazuje obiekt stronicowania zagnieżdżony w odpowiedzi (np. ``tracks`` dla /search).
+    Błąd pobrania strony kończy iterację na elementach zwróconych do tej pory.
+    """
+    def fetch(page_url, page_params):
+        response = http.get(page_url, headers=headers, params=page_params)
+        if response.status_code != 200:
+            print(f"Nie udało się pobrać strony {page_url}: {response.status_code}")
+            return None
+        data = response.json()
+        return data.get(key) if key else data
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='musicmood-paging') if prefetch else None
+    yielded = 0
+    try:
+        page = fetch(url, params)
+        while page:
+            items = page.get('items') or []
+            next_url = page.get('next')
+            if max_items is not None and yielded + len(items) >= max_items:
+                next_url = None
+
+            pending = executor.submit(fetch, next_url, None) if executor and next_url else None
+            for item in items:
+                if max_items is not None and yielded >= max_items:
+                    return
+                yielded += 1
+                yield item
+
+            if not next_url:
+                return
+            page = pending.result() if pending else fetch(next_url, None)
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
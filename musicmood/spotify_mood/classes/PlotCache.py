@@ -0,0 +1,44 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+from django.conf import settings
+
+PLOT_FILENAME = re.compile(r'^[a-z_]+-[0-9a-f]{16}\.(svg|png)$')
+PLOT_CONTENT_TYPES = {'svg': 'image/svg+xml', 'png': 'image/png'}
+
+_digest_lock = threading.Lock()
+_digest_cache = {}
+
+
+def plots_dir():
+    return str(getattr(settings, 'FUZZY_PLOTS_DIR', os.path.join(settings.STATIC_ROOT, 'fuzzy_plots')))
+
+
+def manifest_path(digest, output_dir=None):
+    return os.path.join(output_dir or plots_dir(), f"manifest-{digest[:16]}.json")
+
+
+def rules_digest():
+    # Skrót liczony tak samo jak w FuzzyRules, ale bez ładowania NumPy w procesie serwera.
+    path = str(getattr(settings, 'FUZZY_RULES_PATH',
+                       os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fuzzy_rules.json')))
+    stat = os.stat(path)
+    signature = (path, stat.st_mtime_ns, stat.st_size)
+
+    with _digest_lock:
+        if _digest_cache.get('signature') != signature:
+            with open(path, 'rb') as f:
+                _digest_cache['digest'] = hashlib.sha256(f.read()).hexdigest()
+            _digest_cache['signature'] = signature
+        return _digest_cache['digest']
+
+
+def load_manifest(digest=None):
+    try:
+        with open(manifest_path(digest or rules_digest())) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
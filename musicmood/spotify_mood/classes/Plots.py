@@ -1,31 +1,148 @@
-import matplotlib.pyplot as plt
+import hashlib
+import io
+import json
+import os
+
+import matplotlib
 import numpy as np
+from matplotlib.figure import Figure
+
+from .FuzzyRules import atomic_write, membership, universe_from_spec
+from .PlotCache import manifest_path
+
+VARIABLE_LABELS = {
+    'mood': ("nastrój", "Wartość nastroju"),
+    'time_of_day': ("pora_dnia", "Godzina dnia"),
+    'energy': ("energia", "Energia"),
+    'valence': ("pozytywność", "Pozytywność"),
+    'tempo': ("tempo", "Tempo [BPM]"),
+    'loudness': ("głośność", "Głośność [dB]"),
+    'danceability': ("taneczność", "Taneczność"),
+}
+
+TERM_COLORS = ['blue', 'green', 'orange', 'purple', 'red', 'brown']
+
+
+def _plot_variable(ax, name, variable_spec):
+    label, xlabel = VARIABLE_LABELS.get(name, (name, name))
+    universe = universe_from_spec(variable_spec['universe'])
+
+    for color, (term, term_spec) in zip(TERM_COLORS * 2, variable_spec['terms'].items()):
+        ax.plot(universe, membership(term_spec['type'], universe, term_spec['params']), label=term, color=color)
+
+    ax.axhline(0, color='black', linewidth=1)
+    ax.axvline(0, color='black', linewidth=1)
+
+    ax.set_title(f"Funkcje przynależności zmiennej rozmytej '{label}'")
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel("Stopień przynależności")
+    ax.legend(loc="upper right")
+    ax.grid(True, which='both', linestyle='--', linewidth=0.5)
+
+
+def membership_functions_figure(fuzzy, kind='inputs', figure=None):
+    spec = getattr(fuzzy, 'rule_base', fuzzy).spec
+    variables = spec[kind]
+
+    figure = figure or Figure(figsize=(12, 5 * len(variables)))
+    for i, (name, variable_spec) in enumerate(variables.items()):
+        _plot_variable(figure.add_subplot(len(variables), 1, i + 1), name, variable_spec)
+
+    figure.tight_layout()
+    return figure
+
+
+def output_terms_figure(figure=None):
+    x = np.linspace(0, 1, 500)
+
+    y1 = np.maximum(0, 1 - (1 / 0.3) * x)
+    y2 = np.maximum(0, 1 - (1 / 0.2) * np.abs(x - 0.3))
+    y3 = np.maximum(0, 1 - (1 / 0.2) * np.abs(x - 0.5))
+    y4 = np.maximum(0, 1 - (1 / 0.2) * np.abs(x - 0.7))
+    y5 = np.maximum(0, (1 / 0.3) * (x - 0.7))
+
+    figure = figure or Figure(figsize=(8, 5))
+    ax = figure.add_subplot()
+
+    ax.plot(x, y1, color='red', linewidth=2, label="low")
+    ax.plot(x, y2, color='yellow', linewidth=2, label="low-medium")
+    ax.plot(x, y3, color='green', linewidth=2, label="medium")
+    ax.plot(x, y4, color='blue', linewidth=2, label="medium-high")
+    ax.plot(x, y5, color='brown', linewidth=2, label="high")
+
+    ax.axhline(0, color='black', linewidth=3)
+    ax.axvline(0, color='black', linewidth=3)
+
+    ax.set_xlim([0, 1])
+    ax.set_ylim([0, 1])
+
+    ax.set_xlabel("x")
+    ax.set_ylabel("y")
+
+    ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
+
+    figure.tight_layout()
+    return figure
+
+
+def plot_membership_functions(fuzzy):
+    import matplotlib.pyplot as plt
+
+    membership_functions_figure(fuzzy, figure=plt.figure(figsize=(12, 10)))
+    plt.show()
+
+
+def plot_output_terms():
+    import matplotlib.pyplot as plt
+
+    output_terms_figure(plt.figure())
+    plt.show()
+
 
-x = np.linspace(0, 1, 500)
+PLOTS = (
+    ('inputs', "Funkcje przynależności zmiennych wejściowych",
+     lambda rule_base: membership_functions_figure(rule_base, 'inputs')),
+    ('outputs', "Funkcje przynależności zmiennych wyjściowych",
+     lambda rule_base: membership_functions_figure(rule_base, 'outputs')),
+    ('output_terms', "Termy lingwistyczne zmiennej wyjściowej",
+     lambda rule_base: output_terms_figure()),
+)
 
-y1 = np.maximum(0, 1 - (1 / 0.3) * x)
-y2 = np.maximum(0, 1 - (1 / 0.2) * np.abs(x - 0.3))
-y3 = np.maximum(0, 1 - (1 / 0.2) * np.abs(x - 0.5))
-y4 = np.maximum(0, 1 - (1 / 0.2) * np.abs(x - 0.7))
-y5 = np.maximum(0, (1 / 0.3) * (x - 0.7))
 
+def render_figure(figure, fmt, salt):
+    buffer = io.BytesIO()
+    # Bez daty i z ustalonymi identyfikatorami ten sam wykres daje zawsze ten sam plik.
+    with matplotlib.rc_context({'svg.hashsalt': salt}):
+        figure.savefig(buffer, format=fmt, metadata={'Date': None} if fmt == 'svg' else None)
+    return buffer.getvalue()
 
-plt.plot(x, y1, color='red', linewidth=2, label="low")
-plt.plot(x, y2, color='yellow', linewidth=2, label="low-medium")
-plt.plot(x, y3, color='green', linewidth=2, label="medium")
-plt.plot(x, y4, color='blue', linewidth=2, label="medium-high")
-plt.plot(x, y5, color='brown', linewidth=2, label="high")
 
-plt.axhline(0, color='black', linewidth=3)
-plt.axvline(0, color='black', linewidth=3)
+def render_plots(rule_base, output_dir, formats=('svg',)):
+    """
+    Renderuje wykresy funkcji przynależności do plików nazwanych skrótem ich zawartości
+    i zapisuje manifest dla danej wersji bazy reguł.
+    """
+    plots = {}
+    for name, title, build in PLOTS:
+        figure = build(rule_base)
+        files = {}
+        for fmt in formats:
+            content = render_figure(figure, fmt, rule_base.digest)
+            filename = f"{name}-{hashlib.sha256(content).hexdigest()[:16]}.{fmt}"
+            path = os.path.join(output_dir, filename)
+            if not os.path.exists(path):
+                atomic_write(path, content)
+            files[fmt] = filename
+        plots[name] = {'title': title, 'files': files}
 
-plt.xlim([0, 1])
-plt.ylim([0, 1])
+    manifest = {'digest': rule_base.digest, 'plots': plots}
+    atomic_write(manifest_path(rule_base.digest, output_dir),
+                 json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+    return manifest
 
-plt.xlabel("x")
-plt.ylabel("y")
 
-plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
+if __name__ == "__main__":
+    from .Fuzzy import Fuzzy
 
-plt.tight_layout()
-plt.show()
+    plot_membership_functions(Fuzzy())
+    plot_output_terms()
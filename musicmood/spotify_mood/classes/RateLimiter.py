@@ -0,0 +1,139 @@
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+LOCK_TIMEOUT = 2
+# Blokada porzucona przez proces wygasa po LOCK_TIMEOUT, więc dłuższe czekanie oznacza ciągłą rywalizację o kubełek.
+LOCK_WAIT = 2 * LOCK_TIMEOUT
+LOCK_POLL = 0.005
+LOCK_MAX_POLL = 0.1
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, wait):
+        super().__init__(f"Limit zapytań wyczerpany, wymagane czekanie {wait:.1f} s")
+        self.wait = wait
+
+
+class RateLimiterBusy(RateLimitExceeded):
+    """Blokada kubełka nie została zdobyta w czasie LOCK_WAIT."""
+
+
+class RateLimiter:
+    """
+    Kubełek żetonów przechowywany w cache Django, dzięki czemu wszystkie procesy i serwery
+    korzystające z tego samego cache dzielą jeden limit zapytań.
+
+    Żeton można zarezerwować "na kredyt" - stan kubełka schodzi wtedy poniżej zera, a czekanie
+    wydłuża się o czas potrzebny na jego odnowienie, więc oczekujące zapytania tworzą kolejkę.
+    Retry-After z odpowiedzi 429 wstrzymuje wszystkie zapytania do podanej chwili.
+    """
+    def __init__(self, name, rate=10.0, burst=20, max_wait=30.0, max_retries=3):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_wait = float(max_wait)
+        self.max_retries = max_retries
+
+        self.bucket_key = f"ratelimit:{name}:bucket"
+        self.lock_key = f"ratelimit:{name}:lock"
+        self.backoff_key = f"ratelimit:{name}:backoff_until"
+        self.throttled_key = f"ratelimit:{name}:throttled"
+        self.lock_timeouts_key = f"ratelimit:{name}:lock_timeouts"
+
+    @contextmanager
+    def _locked(self):
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + LOCK_WAIT
+        delay = LOCK_POLL
+        while not cache.add(self.lock_key, token, LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                self._increment(self.lock_timeouts_key)
+                print(f"Limit zapytań {self.name}: blokada kubełka zajęta dłużej niż {LOCK_WAIT} s")
+                raise RateLimiterBusy(LOCK_WAIT)
+            time.sleep(delay)
+            delay = min(delay * 2, LOCK_MAX_POLL)
+        try:
+            yield
+        finally:
+            if cache.get(self.lock_key) == token:
+                cache.delete(self.lock_key)
+
+    @staticmethod
+    def _increment(key):
+        if not cache.add(key, 1, None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                pass
+
+    def _refill(self, now):
+        state = cache.get(self.bucket_key)
+        if state is None:
+            return self.burst
+        tokens, updated = state
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def reserve(self, max_wait=None):
+        max_wait = self.max_wait if max_wait is None else max_wait
+        with self._locked():
+            now = time.time()
+            tokens = self._refill(now)
+            wait = max(0.0, (1 - tokens) / self.rate, cache.get(self.backoff_key, 0) - now)
+            if wait > max_wait:
+                raise RateLimitExceeded(wait)
+
+            cache.set(self.bucket_key, (tokens - 1, now), None)
+        return wait
+
+    def acquire(self, max_wait=None):
+        wait = self.reserve(max_wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def backoff(self, retry_after):
+        until = time.time() + retry_after
+        try:
+            with self._locked():
+                self._extend_backoff(until, retry_after)
+        except RateLimiterBusy:
+            # Pominięcie pauzy po 429 jest gorsze niż zapis bez blokady, który najwyżej skróci ją
+            # do wartości zapisanej równolegle; przypadek jest liczony w lock_timeouts.
+            self._extend_backoff(until, retry_after)
+        self._increment(self.throttled_key)
+
+    def _extend_backoff(self, until, retry_after):
+        if until > cache.get(self.backoff_key, 0):
+            cache.set(self.backoff_key, until, int(retry_after) + 1)
+
+    def state(self):
+        now = time.time()
+        return {
+            'name': self.name,
+            'rate': self.rate,
+            'burst': self.burst,
+            'tokens': round(self._refill(now), 2),
+            'backoff_remaining': round(max(0.0, cache.get(self.backoff_key, 0) - now), 2),
+            'throttled': cache.get(self.throttled_key, 0),
+            'lock_timeouts': cache.get(self.lock_timeouts_key, 0),
+        }
+
+
+def get_rate_limiter(name='spotify'):
+    return RateLimiter(
+        name,
+        rate=getattr(settings, 'SPOTIFY_RATE_LIMIT', 10.0),
+        burst=getattr(settings, 'SPOTIFY_RATE_BURST', 20),
+        max_wait=getattr(settings, 'SPOTIFY_RATE_LIMIT_MAX_WAIT', 30.0),
+        max_retries=getattr(settings, 'SPOTIFY_RATE_LIMIT_RETRIES', 3),
+    )
+
@@ -3,15 +3,38 @@ import random
 import sys
 import base64
 import hashlib
+import json
 from django.utils import timezone
 import time
-import requests
 import datetime
 import urllib.parse
-from . import Fuzzy
+from .Concurrency import map_concurrently, map_with_deadline
 from .DatabaseConnector import DatabaseConnector
+from .HttpTransport import get_transport
+from .Paging import iterate_pages
+from .SpotifyAuth import token_key
+from .TTLCache import TTLCache
+from django.conf import settings
 from django.core.cache import cache
-from ..models import LikedSongs, Playlist, Genre
+from ..middleware import DEGRADED_MESSAGE
+from ..models import Playlist
+
+# Wyniki wyszukiwania nie zależą od użytkownika, więc są wspólne dla wszystkich zapytań procesu.
+search_cache = TTLCache(maxsize=getattr(settings, 'SPOTIFY_SEARCH_CACHE_SIZE', 2048),
+                        ttl=getattr(settings, 'SPOTIFY_SEARCH_CACHE_TTL', 600))
+
+# Najpopularniejsze utwory artysty (po jego id) zmieniają się rzadko i też nie zależą od użytkownika.
+top_tracks_cache = TTLCache(maxsize=getattr(settings, 'SPOTIFY_TOP_TRACKS_CACHE_SIZE', 1024),
+                            ttl=getattr(settings, 'SPOTIFY_TOP_TRACKS_TTL', 6 * 3600))
+
+
+def normalize_query(query):
+    return ' '.join(query.casefold().split())
+
+
+def query_cache_key(prefix, query):
+    # Zapytanie może zawierać spacje i znaki spoza ASCII, których nie przyjmują niektóre backendy cache.
+    return f"{prefix}:{hashlib.sha1(normalize_query(query).encode('utf-8')).hexdigest()}"
 
 
 class SpotifyAPI:
@@ -19,11 +42,25 @@ class SpotifyAPI:
     REDIRECT_URI = 'http://127.0.0.1:8000/callback'
     #REDIRECT_URI = 'http://192.168.0.80:8000/callback'
     SCOPE = 'user-read-private user-read-email user-library-read user-library-modify playlist-read-private playlist-modify-public playlist-modify-private streaming user-read-playback-state user-modify-playback-state'
-    AUTH_URL = 'https://accounts.spotify.com/authorize'
-    TOKEN_URL = 'https://accounts.spotify.com/api/token'
+    API_URL = 'https://api.spotify.com/v1'
+    ACCOUNTS_URL = 'https://accounts.spotify.com'
+    # Maksymalna liczba id w jednym zapytaniu do endpointów zbiorczych.
+    BATCH_LIMITS = {'tracks': 50, 'artists': 50, 'audio-features': 100}
+    # Najwięcej utworów zwracanych przez /recommendations i dodawanych jednym POST do playlisty.
+    RECOMMENDATIONS_LIMIT = 100
+    PLAYLIST_ADD_LIMIT = 100
+    # Spotify przyjmuje łącznie najwyżej 5 seedów (gatunki + utwory) w jednym zapytaniu.
+    MAX_SEEDS = 5
 
     def __init__(self):
         self.db_connector = DatabaseConnector()
+        self.http = get_transport('spotify')
+
+        # Adresy można przestawić na lokalny serwer zastępczy (manage.py fake_spotify).
+        self.api_url = getattr(settings, 'SPOTIFY_API_BASE_URL', self.API_URL).rstrip('/')
+        accounts_url = getattr(settings, 'SPOTIFY_ACCOUNTS_URL', self.ACCOUNTS_URL).rstrip('/')
+        self.auth_url = f"{accounts_url}/authorize"
+        self.token_url = f"{accounts_url}/api/token"
 
     @staticmethod
     def generate_code_verifier():
@@ -37,9 +74,9 @@ class SpotifyAPI:
         return code_challenge
 
     def is_user_logged_in(self, access_token):
-        url = 'https://api.spotify.com/v1/me'
+        url = f'{self.api_url}/me'
         headers = {'Authorization': f'Bearer {access_token}'}
-        response = requests.get(url, headers=headers)
+        response = self.http.get(url, headers=headers)
 
         if response.status_code == 200:
             return True
@@ -60,7 +97,7 @@ class SpotifyAPI:
             'redirect_uri': self.REDIRECT_URI
         }
         url_params = urllib.parse.urlencode(params)
-        return f"{self.AUTH_URL}?{url_params}"
+        return f"{self.auth_url}?{url_params}"
 
     def get_token(self, code, code_verifier):
         data = {
@@ -70,160 +107,349 @@ class SpotifyAPI:
             'client_id': self.CLIENT_ID,
             'code_verifier': code_verifier
         }
-        response = requests.post(self.TOKEN_URL, data=data)
+        response = self.http.post(self.token_url, data=data)
         return response.json()
 
+    def refresh_access_token(self, refresh_token):
+        data = {
+            'grant_type': 'refresh_token',
+            'refresh_token': refresh_token,
+            'client_id': self.CLIENT_ID
+        }
+        response = self.http.post(self.token_url, data=data)
+        try:
+            return response.json()
+        except ValueError:
+            return {"error": f"Błąd przy odświeżaniu tokenu: {response.status_code}"}
+
     def get_user_info(self, access_token):
+        # Tożsamość zapamiętywana jest dla danego tokenu, więc kolejne wywołania nie odpytują /v1/me.
+        cache_key = token_key('spotify_me', access_token)
+        user_info = cache.get(cache_key)
+        if user_info is not None:
+            return user_info
+
         headers = {'Authorization': f'Bearer {access_token}'}
-        response = requests.get('https://api.spotify.com/v1/me', headers=headers)
+        response = self.http.get(f'{self.api_url}/me', headers=headers)
 
         try:
             user_info = response.json()
-            return user_info
         except ValueError as e:
             return {"error": "Błąd przy dekodowaniu JSON", "response_text": response.text}
 
-    def get_user_playlists(self, access_token):
-        url = 'https://api.spotify.com/v1/me/playlists'
-        headers = {'Authorization': f'Bearer {access_token}'}
-        response = requests.get(url, headers=headers)
-
-        if response.status_code == 200:
-            return response.json()['items']
-        else:
-            print(f"Nie udało się uzyskać playlisty: {response.status_code}")
+        if response.status_code == 200 and 'id' in user_info:
+            cache.set(cache_key, user_info, getattr(settings, 'SPOTIFY_IDENTITY_TTL', 3600))
+        return user_info
+
+    def get_user_playlists(self, access_token, user_id):
+        """
+        Zwraca słownik spotify_id -> playlista użytkownika (nazwa, snapshot_id, okładka).
+
+        Wynik trzymany jest w cache pod kluczem ``user_playlists_{user_id}`` (home_view usuwa go
+        po utworzeniu playlisty). Po jego wygaśnięciu strony /me/playlists pobierane są warunkowo
+        z ETagiem, a playlisty z niezmienionym snapshot_id przepisywane są z poprzedniego stanu.
+        """
+        cache_key = f"user_playlists_{user_id}"
+        playlists = cache.get(cache_key)
+        if playlists is not None:
+            return playlists
+
+        state_key = f"user_playlists_state_{user_id}"
+        state = self.fetch_user_playlists(access_token, cache.get(state_key))
+        if state is None:
             return None
 
-    def get_audio_features(self, access_token, track_ids):
-        url = f'https://api.spotify.com/v1/audio-features'
+        cache.set(state_key, state, getattr(settings, 'SPOTIFY_PLAYLISTS_STATE_TTL', 86400))
+        cache.set(cache_key, state['playlists'], getattr(settings, 'SPOTIFY_PLAYLISTS_TTL', 60))
+        return state['playlists']
+
+    def fetch_user_playlists(self, access_token, previous=None):
+        previous_pages = {url: (etag, page) for url, etag, page in previous['pages']} if previous else {}
+        previous_playlists = previous['playlists'] if previous else {}
+
+        pages = []
+        playlists = {}
+        url = f'{self.api_url}/me/playlists?limit=50'
+        while url:
+            headers = {'Authorization': f'Bearer {access_token}'}
+            etag, page = previous_pages.get(url, (None, None))
+            if etag:
+                headers['If-None-Match'] = etag
+
+            response = self.http.get(url, headers=headers)
+            if response.status_code == 304 and page is not None:
+                pass
+            elif response.status_code == 200:
+                data = response.json()
+                etag = response.headers.get('ETag')
+                page = {'items': [], 'next': data.get('next')}
+                for item in data.get('items', []):
+                    if not item or 'id' not in item:
+                        continue
+                    known = previous_playlists.get(item['id'])
+                    if known and known['snapshot_id'] == item.get('snapshot_id'):
+                        page['items'].append(known)
+                    else:
+                        images = item.get('images') or []
+                        page['items'].append({
+                            'id': item['id'],
+                            'name': item.get('name'),
+                            'snapshot_id': item.get('snapshot_id'),
+                            'image_url': images[0]['url'] if images else None,
+                        })
+            else:
+                print(f"Nie udało się uzyskać playlisty: {response.status_code}")
+                return None
+
+            pages.append((url, etag, page))
+            for item in page['items']:
+                playlists[item['id']] = item
+            url = page['next']
+
+        return {'pages': pages, 'playlists': playlists}
+
+    def get_several(self, access_token, kind, ids):
+        """
+        Pobiera obiekty z endpointów /v1/tracks, /v1/artists lub /v1/audio-features w paczkach
+        o rozmiarze dopuszczalnym przez API. Paczki wysyłane są równolegle, a wynik to słownik
+        id -> obiekt (bez obiektów, których nie udało się pobrać).
+        """
+        limit = self.BATCH_LIMITS[kind]
+        ids = list(dict.fromkeys(item_id for item_id in ids if item_id))
+        chunks = [ids[i:i + limit] for i in range(0, len(ids), limit)]
         headers = {'Authorization': f'Bearer {access_token}'}
-        params = {'ids': ','.join(track_ids)}
-        response = requests.get(url, headers=headers, params=params)
 
-        if response.status_code == 200:
-            return response.json()['audio_features']
-        else:
-            print(f"Nie udało się otrzymać informacji o utworze: {response.status_code}")
+        def fetch(chunk):
+            response = self.http.get(f'{self.api_url}/{kind}', headers=headers,
+                                     params={'ids': ','.join(chunk)})
+            if response.status_code != 200:
+                print(f"Nie udało się pobrać {kind} ({len(chunk)} id): {response.status_code}")
+                return []
+            return response.json()[kind.replace('-', '_')]
+
+        results = {}
+        for items in map_concurrently(fetch, chunks):
+            for item in items:
+                if item:
+                    results[item['id']] = item
+        return results
+
+    def get_audio_features(self, access_token, track_ids):
+        features = self.get_several(access_token, 'audio-features', track_ids)
+        if track_ids and not features:
+            print("Nie udało się otrzymać informacji o utworach")
             return None
+        return [features.get(track_id) for track_id in track_ids]
 
     def get_track_info(self, access_token, track_id):
-        url = f'https://api.spotify.com/v1/tracks/{track_id}'
+        url = f'{self.api_url}/tracks/{track_id}'
         headers = {'Authorization': f'Bearer {access_token}'}
-        response = requests.get(url, headers=headers)
+        response = self.http.get(url, headers=headers)
 
         if response.status_code == 200:
             return response.json()
         else:
             print(f"Nie udało się pobrać informacji o utworze: {response.status_code}")
-            retry_after = int(response.headers.get("Retry-After", 1))
-            print(f"Zbyt wiele zapytań. Ponawianie za {retry_after} sekund.")
             return None
 
     def get_available_genres(self):
         return self.db_connector.get_available_genres()
 
+    def playlist_upload_key(self, user, generation_params):
+        # Wznawiane jest tylko ponowienie dokładnie tego samego generowania (wszystkie parametry formularza),
+        # a nie każda playlista o tej samej nazwie.
+        params = json.dumps(generation_params, sort_keys=True, default=str)
+        return f"playlist_upload_{user.id}_{hashlib.sha1(params.encode('utf-8')).hexdigest()}"
+
     def create_playlist(self, access_token, playlist_name, track_data, combined_seeds, playlist_description="",
-                        genres=[]):
+                        genres=[], playlist=None, upload_key=None):
+        """
+        Tworzy playlistę w bazie i na Spotify, dodaje do niej utwory i zwraca liczbę dodanych utworów.
+        Niedokończone dodawanie zapamiętywane jest w cache pod ``upload_key`` - ponowne wywołanie
+        z tą samą ``playlist`` dokańcza je na istniejącej playliście Spotify zamiast tworzyć nową.
+        """
         user_info = self.get_user_info(access_token)
+        if 'id' not in user_info:
+            print(f"Nie udało się pobrać użytkownika Spotify: {user_info}")
+            return 0
         user_id = user_info['id']
         user = self.db_connector.get_user_by_spotify_id(user_id)
-        playlist = self.db_connector.save_playlist_to_db(playlist_name, user, combined_seeds)
 
-        if not playlist:
-            print(f"Nie udało się zapisać playlisty {playlist_name}")
-            return
-
-        url = f'https://api.spotify.com/v1/users/{user_id}/playlists'
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
-        data = {
-            'name': playlist_name,
-            'description': playlist_description,
-            'public': False
-        }
-        response = requests.post(url, headers=headers, json=data)
+        if playlist is None:
+            playlist = self.db_connector.save_playlist_to_db(playlist_name, user, combined_seeds)
+            if not playlist:
+                print(f"Nie udało się zapisać playlisty {playlist_name}")
+                return 0
+
+        if not playlist.spotify_id:
+            url = f'{self.api_url}/users/{user_id}/playlists'
+            headers = {
+                'Authorization': f'Bearer {access_token}',
+                'Content-Type': 'application/json'
+            }
+            data = {
+                'name': playlist_name,
+                'description': playlist_description,
+                'public': False
+            }
+            response = self.http.post(url, headers=headers, json=data)
 
-        if response.status_code == 201:
-            spotify_playlist_id = response.json()['id']
+            if response.status_code != 201:
+                print(f"Nie udało się stworzyć playlisty na Spotify: {response.status_code} - {response.text}")
+                playlist.delete()
+                return 0
 
-            playlist.spotify_id = spotify_playlist_id
+            playlist.spotify_id = response.json()['id']
             playlist.save()
 
-            track_uris = [f'spotify:track:{track_id}' for track_id, _ in track_data]
-            add_tracks_url = f'https://api.spotify.com/v1/playlists/{spotify_playlist_id}/tracks'
-            data = {'uris': track_uris}
-            add_tracks_response = requests.post(add_tracks_url, headers=headers, json=data)
+        track_ids = [track_id for track_id, _ in track_data]
+        track_uris = [f'spotify:track:{track_id}' for track_id in track_ids]
 
-            if add_tracks_response.status_code == 201:
-                print(f"Utwory zostały pomyślnie dodane do playlisty '{playlist_name}' na Spotify.")
+        # Dane utworów potrzebne do zapisu w bazie pobierane są w trakcie dodawania paczek do playlisty.
+        added, tracks_info = map_concurrently(lambda task: task(), [
+            lambda: self.add_tracks_to_playlist(access_token, playlist.spotify_id, track_uris),
+            lambda: self.get_several(access_token, 'tracks', track_ids),
+        ], max_workers=2)
 
-                for track_id, genre in track_data:
-                    track_info = self.get_track_info(access_token, track_id)
-                    if not track_info:
-                        continue
-
-                    song = self.db_connector.save_song_to_db(track_info, genre)
-
-                    for artist_data in track_info['artists']:
-                        artist = self.db_connector.save_artist_to_db(artist_data)
-                        self.db_connector.save_song_artist_relation(song, artist)
+        # W bazie zapisywane są tylko utwory, które faktycznie trafiły na playlistę Spotify.
+        for track_id, genre in track_data[:added]:
+            track_info = tracks_info.get(track_id)
+            if not track_info:
+                continue
 
-                    self.db_connector.save_song_playlist_relation(playlist, song)
+            song = self.db_connector.save_song_to_db(track_info, genre)
 
-                for genre_name in genres:
-                    self.db_connector.save_playlist_genre_relation(playlist, genre_name)
+            for artist_data in track_info['artists']:
+                artist = self.db_connector.save_artist_to_db(artist_data)
+                self.db_connector.save_song_artist_relation(song, artist)
+
+            self.db_connector.save_song_playlist_relation(playlist, song)
+
+        if added < len(track_uris):
+            print(f"Nie udało się dodać utworów do playlisty na Spotify: dodano {added} z {len(track_uris)}")
+            if upload_key:
+                cache.set(upload_key, {'playlist_id': playlist.id, 'track_data': list(track_data),
+                                       'seeds': combined_seeds, 'genres': list(genres)},
+                          getattr(settings, 'PLAYLIST_PROGRESS_TTL', 3600))
+            return added
+
+        print(f"Utwory zostały pomyślnie dodane do playlisty '{playlist_name}' na Spotify.")
+        if upload_key:
+            cache.delete(upload_key)
+        for genre_name in genres:
+            self.db_connector.save_playlist_genre_relation(playlist, genre_name)
+        self.db_connector.add_playlist_to_seed_index(user, playlist, genres)
+        return added
+
+    def finish_playlist(self, access_token, playlist_name, track_data, combined_seeds, playlist_description, genres,
+                        track_count, playlist=None, upload_key=None):
+        added = self.create_playlist(access_token, playlist_name, track_data, combined_seeds, playlist_description,
+                                     genres, playlist=playlist, upload_key=upload_key)
+
+        if added < len(track_data):
+            if playlist is None and not added:
+                message = "Nie udało się stworzyć playlisty na Spotify. Spróbuj ponownie za chwilę."
             else:
-                print(
-                    f"Nie udało się dodać utworów do playlisty na Spotify: {add_tracks_response.status_code} - {add_tracks_response.text}")
-        else:
-            print(f"Nie udało się stworzyć playlisty na Spotify: {response.status_code} - {response.text}")
+                message = (f"Do playlisty na Spotify dodano {added} z {len(track_data)} utworów. Wyślij formularz "
+                           f"ponownie z tymi samymi ustawieniami, aby dokończyć dodawanie.")
+            return {"status": "error", "message": message, "track_count": added}
+        elif len(track_data) < track_count:
+            missing_tracks = track_count - len(track_data)
+            return {
+                "status": "warning",
+                "message": f"Playlista posiada mniej utworów niż zostało wpisane. Brakuje {missing_tracks} utworów, "
+                           f"w celu polepszenia algorytmu spróbuj ponownie wygenerować playlistę,"
+                           f"zmienić parametry systemu, bądź dodać kilka utworów do polubionych.",
+                "track_count": len(track_data)
+            }
+        return {
+            "status": "success",
+            "message": "Udało się stworzyć playlistę!",
+            "track_count": len(track_data)
+        }
 
-    def get_recently_added_tracks(self, access_token):
-        url = "https://api.spotify.com/v1/me/tracks"
+    def add_tracks_to_playlist(self, access_token, playlist_id, track_uris):
+        """
+        Dodaje utwory do playlisty w paczkach po 100 (limit Spotify), każdą na jej docelowej pozycji,
+        i zwraca liczbę dodanych utworów. Postęp zapisywany jest w cache pod kluczem
+        ``playlist_progress_{playlist_id}``, więc ponowne wywołanie z tą samą listą po błędzie
+        dodaje tylko brakujące paczki.
+        """
+        progress_key = f"playlist_progress_{playlist_id}"
+        progress_ttl = getattr(settings, 'PLAYLIST_PROGRESS_TTL', 3600)
+        digest = hashlib.sha1('\n'.join(track_uris).encode('utf-8')).hexdigest()
+        progress = cache.get(progress_key)
+        added = progress['added'] if progress and progress['digest'] == digest else 0
+
+        url = f'{self.api_url}/playlists/{playlist_id}/tracks'
         headers = {
-            'Authorization': f'Bearer {access_token}'
+            'Authorization': f'Bearer {access_token}',
+            'Content-Type': 'application/json'
         }
+        start_time = time.perf_counter()
+        for position in range(added, len(track_uris), self.PLAYLIST_ADD_LIMIT):
+            chunk = track_uris[position:position + self.PLAYLIST_ADD_LIMIT]
+            response = self.http.post(url, headers=headers, json={'uris': chunk, 'position': position})
+            if response.status_code != 201:
+                print(f"Nie udało się dodać utworów {position}-{position + len(chunk)} do playlisty {playlist_id}: "
+                      f"{response.status_code} - {response.text}")
+                cache.set(progress_key, {'digest': digest, 'added': position}, progress_ttl)
+                return position
+            cache.set(progress_key, {'digest': digest, 'added': position + len(chunk)}, progress_ttl)
+
+        cache.delete(progress_key)
+        if len(track_uris) > self.PLAYLIST_ADD_LIMIT:
+            print(f"Dodano {len(track_uris) - added} utworów do playlisty {playlist_id} "
+                  f"w {time.perf_counter() - start_time:.2f} s")
+        return len(track_uris)
+
+    def iter_pages(self, access_token, url, params=None, key=None, max_items=None):
+        headers = {'Authorization': f'Bearer {access_token}'}
+        return iterate_pages(self.http, url, headers=headers, params=params, key=key, max_items=max_items)
+
+    def get_recently_added_tracks(self, access_token, count=None):
+        count = count or getattr(settings, 'SPOTIFY_RECENT_TRACKS', 50)
+        url = f"{self.api_url}/me/tracks"
         params = {
-            'limit': 10
+            'limit': min(count, 50)
         }
 
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code != 200:
-            print(f"Nie udało się pobrać ostatnich utworów: {response.status_code}")
-            return []
-
-        recent_tracks = [item['track']['id'] for item in response.json()['items']]
+        items = self.iter_pages(access_token, url, params=params, max_items=count)
+        recent_tracks = [item['track'] for item in items if item.get('track')]
+        if not recent_tracks:
+            print("Nie udało się pobrać ostatnich utworów")
 
         return recent_tracks
 
-    def get_recently_added_tracks_that_match_genre(self, access_token, target_genre, track_ids):
-        headers = {'Authorization': f'Bearer {access_token}'}
-        url = 'https://api.spotify.com/v1/tracks'
-        params = {'ids': ','.join(track_ids)}
-        response = requests.get(url, headers=headers, params=params)
-
-        if response.status_code != 200:
-            print(f"Nie udało się pobrać informacji o utworach: {response.status_code}")
-            return []
-
-        tracks_info = response.json()['tracks']
-        artist_ids = {artist['id'] for track in tracks_info for artist in track['artists']}
-
-        artists_url = 'https://api.spotify.com/v1/artists'
-        artist_response = requests.get(artists_url, headers=headers, params={'ids': ','.join(artist_ids)})
-
-        if artist_response.status_code != 200:
-            print(f"Nie udało się pobrać informacji o artystach: {artist_response.status_code}")
-            return []
-
-        artists_info = artist_response.json()['artists']
-        artist_genres = {artist['id']: artist['genres'] for artist in artists_info}
+    def get_artist_genres(self, access_token, artist_ids):
+        """
+        Zwraca słownik id artysty -> gatunki. Najpierw sprawdzana jest tabela artist_genres,
+        a ze Spotify pobierani są tylko artyści nieznani lub starsi niż ARTIST_GENRES_TTL.
+        """
+        artist_ids = set(artist_ids)
+        max_age = datetime.timedelta(seconds=getattr(settings, 'ARTIST_GENRES_TTL', 7 * 24 * 3600))
+        artist_genres = self.db_connector.get_artist_genres(artist_ids, max_age)
+
+        missing = artist_ids - artist_genres.keys()
+        if missing:
+            fetched = {artist_id: artist['genres']
+                       for artist_id, artist in self.get_several(access_token, 'artists', missing).items()}
+            if fetched:
+                self.db_connector.save_artist_genres(fetched)
+            artist_genres.update(fetched)
+
+        return artist_genres
+
+    def get_recently_added_tracks_that_match_genre(self, access_token, target_genre, tracks, artist_genres=None):
+        if artist_genres is None:
+            artist_genres = self.get_artist_genres(
+                access_token, [artist['id'] for track in tracks for artist in track['artists']])
+
+        target_genre = target_genre.lower()
         matching_tracks = []
-        for track in tracks_info:
+        for track in tracks:
             for artist in track['artists']:
-                if target_genre.lower() in [genre.lower() for genre in artist_genres.get(artist['id'], [])]:
+                if target_genre in [genre.lower() for genre in artist_genres.get(artist['id'], [])]:
                     matching_tracks.append(track['id'])
                     break
 
@@ -231,14 +457,11 @@ class SpotifyAPI:
 
     def search_tracks_by_features_v3(self, access_token, energy, valence, tempo, loudness, danceability, length_min,
                                      length_max, track_seeds, track_count, seed_genre, min_popularity=40):
-        headers = {'Authorization': f'Bearer {access_token}'}
-        url = 'https://api.spotify.com/v1/recommendations'
-
         length_min_ms = int(length_min * 60 * 1000) if length_min is not None else 0
         length_max_ms = int(length_max * 60 * 1000) if length_max is not None else 9999999
 
         params = {
-            'limit': track_count,
+            'limit': min(track_count, self.RECOMMENDATIONS_LIMIT),
             'seed_genres': seed_genre,
             'seed_tracks': ','.join(track_seeds),
             'target_energy': energy,
@@ -250,30 +473,104 @@ class SpotifyAPI:
             'max_duration_ms': length_max_ms,
             'min_popularity': min_popularity
         }
-        response = requests.get(url, headers=headers, params=params)
+        if track_count <= self.RECOMMENDATIONS_LIMIT:
+            return self.get_recommendations(access_token, params)
+
+        # /recommendations zwraca najwyżej 100 utworów i nie ma stronicowania, więc dla dużych playlist
+        # kolejne rundy pytają równolegle o rekomendacje dla innych utworów startowych, wybranych
+        # spośród znalezionych do tej pory. Każde zapytanie w rundzie ma własne seedy, a pobieranie
+        # kończy się, gdy uzbiera się track_count utworów albo runda nie wniesie nic nowego.
+        seed_slots = self.MAX_SEEDS - (1 if seed_genre else 0)
+        used_seeds = set(track_seeds)
+        found = dict()
+        round_params = [params]
+        for _ in range(getattr(settings, 'SPOTIFY_RECOMMENDATION_ROUNDS', 5)):
+            new_tracks = 0
+            for track_ids in map_concurrently(lambda page_params: self.get_recommendations(access_token, page_params),
+                                              round_params):
+                for track_id in track_ids:
+                    if track_id not in found:
+                        found[track_id] = None
+                        new_tracks += 1
+            if len(found) >= track_count or not new_tracks:
+                break
+
+            candidates = [track_id for track_id in found if track_id not in used_seeds]
+            random.shuffle(candidates)
+            pages = min(-(-(track_count - len(found)) // self.RECOMMENDATIONS_LIMIT), -(-len(candidates) // seed_slots))
+            round_params = []
+            for page in range(pages):
+                seeds = candidates[page * seed_slots:(page + 1) * seed_slots]
+                used_seeds.update(seeds)
+                round_params.append(dict(params, seed_tracks=','.join(seeds)))
+            if not round_params:
+                break
+
+        return list(found)[:track_count]
+
+    def get_recommendations(self, access_token, params):
+        headers = {'Authorization': f'Bearer {access_token}'}
+        response = self.http.get(f'{self.api_url}/recommendations', headers=headers, params=params)
 
         if response.status_code == 200:
             tracks = response.json().get('tracks', [])
             track_ids = [track['id'] for track in tracks]
             return track_ids
         elif response.status_code == 429:
-            retry_after = int(response.headers.get("Retry-After", 1))
-            print(f"Za dużo prób. Ponawiam za {retry_after} sekund.")
-            time.sleep(retry_after)
+            print(f"Limit zapytań do Spotify wyczerpany, Retry-After: {response.headers.get('Retry-After')} s.")
             return []
         else:
             print(f"Nie udało się znaleźć utworów: {response.status_code} - {response.text}")
             return []
 
+    def collect_genre_tracks(self, access_token, user, genre, genre_track_count, target_energy, target_valence,
+                             target_tempo, target_loudness, target_danceability, length_min, length_max,
+                             recent_tracks, artist_genres):
+        seed_index = self.db_connector.get_seed_index(user, genre)
+        used_seeds = [playlist['seed'] for playlist in seed_index.recent_playlists]
+        genre_track_ids = list(dict.fromkeys(
+            track_id for playlist in seed_index.recent_playlists for track_id in playlist['genre_tracks']))
+
+        def unused(track_ids):
+            return [track_id for track_id in track_ids if not any(track_id in seed for seed in used_seeds)]
+
+        if genre_track_ids:
+            # Kolejność jak wcześniej: polubione, potem ostatnio dodane pasujące do gatunku (wymaga zapytań
+            # do Spotify, więc tylko gdy polubione się wyczerpały), na końcu utwory z ostatnich playlist.
+            candidates = unused(seed_index.liked)
+            if not candidates:
+                candidates = unused(self.get_recently_added_tracks_that_match_genre(access_token, genre, recent_tracks,
+                                                                                    artist_genres))
+            if not candidates:
+                candidates = genre_track_ids
+
+            track_seeds = [random.choice(candidates)]
+            seed_genre = None
+        else:
+            track_seeds = []
+            seed_genre = genre
+
+        current_seed = f"{','.join(track_seeds)}" if track_seeds else seed_genre
+
+        genre_track_ids = self.search_tracks_by_features_v3(
+            access_token, target_energy, target_valence, target_tempo, target_loudness, target_danceability,
+            length_min, length_max, track_seeds, genre_track_count, seed_genre
+        )
+        return current_seed, genre_track_ids
+
     def generate_playlist_v3(self, access_token, mood_value, length_min, length_max, genres, genre_percentages,
                              playlist_name, playlist_description, track_count=10, custom_params=None, selected_song_ids=None):
+        generation_params = [mood_value, length_min, length_max, genres, genre_percentages, playlist_name,
+                             playlist_description, track_count, custom_params, list(selected_song_ids or [])]
         local_time = datetime.datetime.now().hour + datetime.datetime.now().minute / 60
         time_of_the_day = round(local_time, 2)
+        track_count = min(track_count, getattr(settings, 'MAX_PLAYLIST_TRACKS', 1000))
 
         if mood_value is not None:
-            fuzzy = Fuzzy.Fuzzy()
-            params = fuzzy.compute_recommendation(mood_value, time_of_the_day)
-            fuzzy.print_results(mood_value, time_of_the_day)
+            from .FuzzyEngine import get_engine, print_results
+
+            params = get_engine().compute_recommendation(mood_value, time_of_the_day)
+            print_results(mood_value, time_of_the_day, params)
 
             target_energy = params['energy']
             target_valence = params['valence']
@@ -290,13 +587,28 @@ class SpotifyAPI:
         track_data = []
 
         user_info = self.get_user_info(access_token)
+        if 'id' not in user_info:
+            # Otwarty wyłącznik /me albo błąd Spotify zwraca słownik błędu zamiast profilu użytkownika.
+            print(f"Nie udało się pobrać użytkownika Spotify: {user_info}")
+            return {"status": "error", "message": DEGRADED_MESSAGE, "track_count": 0}
         user = self.db_connector.get_user_by_spotify_id(user_info['id'])
         all_seeds = []
 
+        # Ponowne wysłanie tego samego formularza dokańcza wcześniej przerwane dodawanie utworów.
+        upload_key = self.playlist_upload_key(user, generation_params)
+        pending = cache.get(upload_key)
+        pending_playlist = Playlist.objects.filter(id=pending['playlist_id']).first() if pending else None
+        if pending_playlist is not None:
+            print(f"Wznawiam dodawanie utworów do playlisty '{playlist_name}' na Spotify.")
+            return self.finish_playlist(access_token, playlist_name, pending['track_data'], pending['seeds'],
+                                        playlist_description, pending['genres'], len(pending['track_data']),
+                                        playlist=pending_playlist, upload_key=upload_key)
+
         if selected_song_ids:
             genre = genres[0]
-            recent_songs_from_playlist_with_genre = self.db_connector.get_recent_tracks_by_genre(user, genre, limit=5)
-            recent_songs = [song.spotify_id for song in recent_songs_from_playlist_with_genre]
+            seed_index = self.db_connector.get_seed_index(user, genre)
+            recent_songs = list(dict.fromkeys(
+                track_id for playlist in seed_index.recent_playlists for track_id in playlist['tracks']))
             if recent_songs:
                 choice = random.choice(recent_songs)
                 selected_song_ids.append(choice)
@@ -319,104 +631,36 @@ class SpotifyAPI:
                     "message": "No tracks found matching the given criteria. Playlist generation failed."
                 }
             elif len(track_data) < track_count:
-                missing_tracks = track_count - len(track_data)
                 random.shuffle(track_data)
-                combined_seeds = ";".join(all_seeds)
-                self.create_playlist(access_token, playlist_name, track_data, combined_seeds, playlist_description, genres)
-                return {
-                    "status": "warning",
-                    "message": f"Playlista posiada mniej utworów niż zostało wpisane. Brakuje {missing_tracks} utworów, "
-                               f"w celu polepszenia algorytmu spróbuj ponownie wygenerować playlistę,"
-                               f"zmienić parametry systemu, bądź dodać kilka utworów do polubionych.",
-                    "track_count": len(track_data)
-                }
-            else:
-                combined_seeds = ";".join(all_seeds)
-                self.create_playlist(access_token, playlist_name, track_data, combined_seeds, playlist_description, genres)
-                return {
-                    "status": "success",
-                    "message": "Udało się stworzyć playlistę!",
-                    "track_count": len(track_data)
-                }
+
+            combined_seeds = ";".join(all_seeds)
+            return self.finish_playlist(access_token, playlist_name, track_data, combined_seeds, playlist_description,
+                                        genres, track_count, upload_key=upload_key)
 
         else:
-            for genre, percentage in zip(genres, genre_percentages):
-                genre_track_count = max(1, round(track_count * (percentage / 100)))
+            # Ostatnio dodane utwory i gatunki ich artystów są wspólne dla wszystkich gatunków playlisty.
+            recent_tracks = self.get_recently_added_tracks(access_token)
+            artist_genres = self.get_artist_genres(
+                access_token, [artist['id'] for track in recent_tracks for artist in track['artists']])
 
-                recent_songs_from_playlist_with_genre = self.db_connector.get_recent_tracks_by_genre(user, genre, limit=5)
-                recent_songs = [song.spotify_id for song in recent_songs_from_playlist_with_genre]
-
-                genre_id = Genre.objects.get(genre=genre).genre_id
-                songs_filtered_by_genre = [song for song in recent_songs_from_playlist_with_genre if
-                                           song.genre_id == genre_id]
-
-                recent_playlists = self.db_connector.get_recent_playlists_by_genre(user, genre, limit=5)
-
-                recently_added_tracks = self.get_recently_added_tracks(access_token)
-                track_seeds = []
-
-                if songs_filtered_by_genre:
-                    liked_songs = list(
-                        LikedSongs.objects.filter(user=user, song__genre__genre=genre).values_list('song__spotify_id',
-                                                                                                   flat=True))
-                    recently_added_tracks = self.get_recently_added_tracks_that_match_genre(access_token, genre,
-                                                                                            recently_added_tracks)
-                    if liked_songs:
-                        for playlist in recent_playlists:
-                            playlist_seed = playlist.seed
-                            for song in liked_songs[:]:
-                                if song in playlist_seed:
-                                    liked_songs.remove(song)
-
-                        if len(liked_songs) > 0:
-                            seed_track = random.choice(liked_songs)
-                            track_seeds = [seed_track]
-
-                        else:
-                            for playlist in recent_playlists:
-                                playlist_seed = playlist.seed
-                                recently_added_tracks = [song for song in recently_added_tracks if
-                                                         song not in playlist_seed]
-                            if len(recently_added_tracks) > 0:
-                                seed_track = random.choice(recently_added_tracks)
-                                track_seeds = [seed_track]
-                            else:
-                                seed_track = random.choice([song.spotify_id for song in songs_filtered_by_genre])
-                                track_seeds = [seed_track]
-
-                    elif recently_added_tracks:
-                        for playlist in recent_playlists:
-                            playlist_seed = playlist.seed
-                            for song in recently_added_tracks[:]:
-                                if song in playlist_seed:
-                                    recently_added_tracks.remove(song)
-
-                        if len(recently_added_tracks) > 0:
-                            seed_track = random.choice(recently_added_tracks)
-                            track_seeds = [seed_track]
-
-                        else:
-                            seed_track = random.choice([song.spotify_id for song in songs_filtered_by_genre])
-                            track_seeds = [seed_track]
-                    elif len(songs_filtered_by_genre) > 0:
-                        seed_track = random.choice([song.spotify_id for song in songs_filtered_by_genre])
-                        track_seeds = [seed_track]
-
-
-                    seed_genre = None
-                else:
-                    track_seeds = []
-                    seed_genre = genre
-
-                current_seed = f"{','.join(track_seeds)}" if track_seeds else seed_genre
+            def collect(genre_and_percentage):
+                genre, percentage = genre_and_percentage
+                genre_track_count = max(1, round(track_count * (percentage / 100)))
+                return self.collect_genre_tracks(access_token, user, genre, genre_track_count, target_energy,
+                                                 target_valence, target_tempo, target_loudness, target_danceability,
+                                                 length_min, length_max, recent_tracks, artist_genres)
+
+            # Gatunki przetwarzane są równolegle, a wyniki łączone w kolejności gatunków.
+            genre_shares = list(zip(genres, genre_percentages))
+            collected_ids = set()
+            for (genre, _), (current_seed, genre_track_ids) in zip(genre_shares,
+                                                                   map_concurrently(collect, genre_shares)):
                 all_seeds.append(current_seed)
-
-                genre_track_ids = self.search_tracks_by_features_v3(
-                    access_token, target_energy, target_valence, target_tempo, target_loudness, target_danceability,
-                    length_min, length_max, track_seeds, genre_track_count, seed_genre
-                )
-
-                track_data.extend((track_id, genre) for track_id in genre_track_ids)
+                # Ten sam utwór może zostać polecony dla kilku gatunków - na playliście zostaje raz.
+                for track_id in genre_track_ids:
+                    if track_id not in collected_ids:
+                        collected_ids.add(track_id)
+                        track_data.append((track_id, genre))
 
             if not track_data:
                 return {
@@ -427,46 +671,34 @@ class SpotifyAPI:
             if len(track_data) > track_count:
                 track_data = random.sample(track_data, track_count)
 
-            elif len(track_data) < track_count:
-                missing_tracks = track_count - len(track_data)
-                random.shuffle(track_data)
-                combined_seeds = ";".join(all_seeds)
-                self.create_playlist(access_token, playlist_name, track_data, combined_seeds, playlist_description, genres)
-                return {
-                    "status": "warning",
-                    "message": f"Playlista posiada mniej utworów niż zostało wpisane. Brakuje {missing_tracks} utworów, "
-                               f"w celu polepszenia algorytmu spróbuj ponownie wygenerować playlistę,"
-                               f"zmienić parametry systemu, bądź dodać kilka utworów do polubionych.",
-                    "track_count": len(track_data)
-                }
-
             random.shuffle(track_data)
             combined_seeds = ";".join(all_seeds)
-
-            self.create_playlist(access_token, playlist_name, track_data, combined_seeds, playlist_description, genres)
-            return {
-                "status": "success",
-                "message": "Udało się stworzyć playlistę!",
-                "track_count": len(track_data)
+            return self.finish_playlist(access_token, playlist_name, track_data, combined_seeds, playlist_description,
+                                        genres, track_count, upload_key=upload_key)
+
+    def search(self, access_token, query, search_type, limit, offset=0):
+        key = (search_type, normalize_query(query), limit, offset)
+
+        def fetch():
+            params = {
+                'q': query,
+                'type': search_type,
+                'limit': limit,
+                'offset': offset
             }
+            response = self.http.get(f"{self.api_url}/search",
+                                     headers={'Authorization': f'Bearer {access_token}'}, params=params)
+            if response.status_code != 200:
+                return None
+            return response.json().get(f'{search_type}s', {}).get('items', [])
 
-    def get_search_results(self, access_token, query):
-        url = "https://api.spotify.com/v1/search"
-        headers = {
-            'Authorization': f'Bearer {access_token}'
-        }
-        params = {
-            'q': query,
-            'limit': 15,
-            'type': 'track'
-        }
+        return search_cache.get_or_set(key, fetch)
 
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code != 200:
+    def get_search_results(self, access_token, query):
+        search_results = self.search(access_token, query, 'track', 15)
+        if search_results is None:
             return []
 
-        search_results = response.json().get('tracks', {}).get('items', [])
-
         tracks_data = []
         for item in search_results:
             track_info = {
@@ -480,61 +712,71 @@ class SpotifyAPI:
         return tracks_data
 
     def search_artists(self, access_token, artist_name, limit=10, offset=0):
-        url = "https://api.spotify.com/v1/search"
-        headers = {'Authorization': f'Bearer {access_token}'}
-        params = {
-            'q': f'artist:{artist_name}',
-            'type': 'artist',
-            'limit': limit,
-            'offset': offset
-        }
-
-        response = requests.get(url, headers=headers, params=params)
-
-        if response.status_code == 200:
-            artists = response.json().get('artists', {}).get('items', [])
-            return [
-                {
-                    'name': artist['name'],
-                    'id': artist['id'],
-                    'image_url': artist['images'][0]['url'] if artist.get('images') else None
-                }
-                for artist in artists
-            ]
-        else:
-            return []
-
-    def get_top_tracks_by_artist(self, access_token, artist_name, track_count):
-        search_url = "https://api.spotify.com/v1/search"
-        headers = {'Authorization': f'Bearer {access_token}'}
-        params = {
-            'q': f'artist:{artist_name}',
-            'type': 'artist',
-            'limit': 1
-        }
-
-        artist_response = requests.get(search_url, headers=headers, params=params)
-        if artist_response.status_code != 200 or not artist_response.json().get('artists', {}).get('items'):
+        artists = self.search(access_token, f'artist:{artist_name.strip()}', 'artist', limit, offset)
+        if artists is None:
             return []
 
-        artist_id = artist_response.json()['artists']['items'][0]['id']
+        return [
+            {
+                'name': artist['name'],
+                'id': artist['id'],
+                'image_url': artist['images'][0]['url'] if artist.get('images') else None
+            }
+            for artist in artists
+        ]
+
+    def resolve_artist_id(self, access_token, artist_name):
+        """
+        Zamienia nazwę artysty na jego id w Spotify: najpierw z cache, potem z tabeli artist,
+        a dopiero na końcu przez wyszukiwanie. Nazwy, których Spotify nie zna, również są
+        zapamiętywane (jako pusty napis), żeby nie wyszukiwać ich ponownie.
+        """
+        artist_name = artist_name.strip()
+        cache_key = query_cache_key('artist_id', artist_name)
+        artist_id = cache.get(cache_key)
+        if artist_id is not None:
+            return artist_id or None
+
+        artist_id = self.db_connector.get_artist_id_by_name(artist_name)
+        if artist_id is None:
+            artists = self.search(access_token, f'artist:{artist_name}', 'artist', 1)
+            if artists is None:
+                return None
+            if not artists:
+                cache.set(cache_key, '', getattr(settings, 'SPOTIFY_ARTIST_MISS_TTL', 24 * 3600))
+                return None
+
+            artist_id = artists[0]['id']
+            if artists[0]['name'].casefold() == artist_name.casefold():
+                self.db_connector.save_artist_to_db(artists[0])
+
+        cache.set(cache_key, artist_id, getattr(settings, 'SPOTIFY_ARTIST_ID_TTL', 30 * 24 * 3600))
+        return artist_id
+
+    def get_artist_top_tracks(self, access_token, artist_id):
+        def fetch():
+            headers = {'Authorization': f'Bearer {access_token}'}
+            params = {
+                'market': 'EN',
+                'limit': 50
+            }
+            response = self.http.get(f"{self.api_url}/artists/{artist_id}/top-tracks", headers=headers, params=params)
+            if response.status_code != 200:
+                return None
+            return response.json().get('tracks', [])
 
-        top_tracks_url = f"https://api.spotify.com/v1/artists/{artist_id}/top-tracks"
-        params = {
-            'market': 'EN',
-            'limit': 50
-        }
-        top_tracks_response = requests.get(top_tracks_url, headers=headers, params=params)
+        return top_tracks_cache.get_or_set(artist_id, fetch)
 
-        if top_tracks_response.status_code != 200:
+    def get_top_tracks_by_artist(self, access_token, artist_name, track_count):
+        artist_id = self.resolve_artist_id(access_token, artist_name)
+        if not artist_id:
             return []
 
-        top_tracks = top_tracks_response.json().get('tracks', [])
+        top_tracks = self.get_artist_top_tracks(access_token, artist_id)
         if not top_tracks:
             return []
 
-        random.shuffle(top_tracks)
-        selected_tracks = top_tracks[:track_count]
+        selected_tracks = random.sample(top_tracks, min(track_count, len(top_tracks)))
 
         track_list = [{
             'name': track['name'],
@@ -544,8 +786,23 @@ class SpotifyAPI:
 
         return track_list
 
+    def get_top_tracks_by_artists(self, access_token, artist_names, track_count):
+        """
+        Pobiera najpopularniejsze utwory wielu artystów równolegle (wyszukanie artysty i jego
+        top-tracks to jedno zadanie). Czas oczekiwania na cały etap ograniczony jest przez
+        TASTEDIVE_ARTISTS_TIMEOUT. Zwraca słownik nazwa artysty -> lista utworów, bez artystów,
+        dla których zapytania się nie powiodły lub nie zdążyły.
+        """
+        results = map_with_deadline(
+            lambda artist_name: self.get_top_tracks_by_artist(access_token, artist_name, track_count),
+            artist_names,
+            timeout=getattr(settings, 'TASTEDIVE_ARTISTS_TIMEOUT', 8),
+            max_workers=getattr(settings, 'TASTEDIVE_MAX_CONCURRENCY', 10),
+        )
+        return {artist_name: tracks for artist_name, tracks in zip(artist_names, results) if tracks is not None}
+
     def create_playlist_from_tracks(self, access_token, user_id, playlist_name, track_ids):
-        create_playlist_url = f"https://api.spotify.com/v1/users/{user_id}/playlists"
+        create_playlist_url = f"{self.api_url}/users/{user_id}/playlists"
         headers = {
             'Authorization': f'Bearer {access_token}',
             'Content-Type': 'application/json'
@@ -555,17 +812,14 @@ class SpotifyAPI:
             'public': False
         }
 
-        response = requests.post(create_playlist_url, headers=headers, json=playlist_data)
+        response = self.http.post(create_playlist_url, headers=headers, json=playlist_data)
         if response.status_code != 201:
             return None
 
         playlist_id = response.json()['id']
 
-        add_tracks_url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
         track_uris = [f"spotify:track:{track_id}" for track_id in track_ids]
-        add_tracks_response = requests.post(add_tracks_url, headers=headers, json={'uris': track_uris})
-
-        if add_tracks_response.status_code != 201:
+        if self.add_tracks_to_playlist(access_token, playlist_id, track_uris) != len(track_uris):
             return None
 
         db_connector = DatabaseConnector()
@@ -577,8 +831,9 @@ class SpotifyAPI:
         playlist.spotify_id = playlist_id
         playlist.save()
 
+        tracks_info = self.get_several(access_token, 'tracks', track_ids)
         for track_id in track_ids:
-            track_info = self.get_track_info(access_token, track_id)
+            track_info = tracks_info.get(track_id)
             if not track_info:
                 continue
 
@@ -0,0 +1,82 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def token_key(prefix, token):
+    return f"{prefix}:{hashlib.sha256(token.encode('utf-8')).hexdigest()[:32]}"
+
+
+def store_token(session, token_info):
+    """
+    Zapisuje w sesji token dostępu, czas jego wygaśnięcia i token odświeżania
+    (Spotify nie zawsze zwraca nowy token odświeżania - wtedy zostaje poprzedni).
+    """
+    session['access_token'] = token_info['access_token']
+    session['expires_at'] = time.time() + int(token_info.get('expires_in', 3600))
+    if token_info.get('refresh_token'):
+        session['refresh_token'] = token_info['refresh_token']
+
+
+def refresh_token_info(spotify_api, refresh_token):
+    # Równoległe zapytania tej samej sesji odświeżają token tylko raz i dzielą się wynikiem.
+    result_key = token_key('spotify_refreshed', refresh_token)
+    lock_key = token_key('spotify_refreshing', refresh_token)
+
+    deadline = time.monotonic() + 10
+    while not cache.add(lock_key, 1, 10):
+        token_info = cache.get(result_key)
+        if token_info or time.monotonic() > deadline:
+            return token_info
+        time.sleep(0.05)
+
+    try:
+        token_info = cache.get(result_key)
+        if not token_info:
+            token_info = spotify_api.refresh_access_token(refresh_token)
+            if 'access_token' not in token_info:
+                print(f"Nie udało się odświeżyć tokenu Spotify: {token_info.get('error')}")
+                return None
+            cache.set(result_key, token_info, 60)
+        return token_info
+    finally:
+        cache.delete(lock_key)
+
+
+def get_valid_access_token(request, spotify_api=None):
+    """
+    Zwraca ważny token dostępu z sesji, w razie potrzeby odświeżając go tokenem odświeżania.
+    Ważność oceniana jest lokalnie na podstawie ``expires_at``; None oznacza, że użytkownik
+    musi zalogować się ponownie.
+    """
+    session = request.session
+    access_token = session.get('access_token')
+    if not access_token:
+        return None
+
+    expires_at = session.get('expires_at')
+    margin = getattr(settings, 'SPOTIFY_TOKEN_REFRESH_MARGIN', 60)
+    if expires_at is not None and expires_at - time.time() > margin:
+        return access_token
+
+    from .SpotifyAPI import SpotifyAPI
+    spotify_api = spotify_api or SpotifyAPI()
+
+    refresh_token = session.get('refresh_token')
+    if not refresh_token:
+        # Sesje sprzed zapisywania czasu wygaśnięcia sprawdzane są po staremu, przez /v1/me.
+        if expires_at is None and spotify_api.is_user_logged_in(access_token):
+            return access_token
+        return None
+
+    token_info = refresh_token_info(spotify_api, refresh_token)
+    if not token_info:
+        return None
+
+    store_token(session, token_info)
+    if session.get('user_id'):
+        from ..models import User
+        User.objects.filter(id=session['user_id']).update(token=token_info['access_token'])
+    return token_info['access_token']
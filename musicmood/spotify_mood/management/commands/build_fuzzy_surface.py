@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from spotify_mood.classes.FuzzyRules import get_rule_base
+from spotify_mood.classes.FuzzySurface import FuzzySurface, surface_path
+
+
+class Command(BaseCommand):
+    help = "Buduje tablicę wyników logiki rozmytej używaną do interpolacji parametrów playlisty."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mood-step', type=float, default=0.005)
+        parser.add_argument('--time-step', type=float, default=0.1)
+        parser.add_argument('--output', default=None)
+        parser.add_argument('--check-points', type=int, default=4000,
+                            help="Najwięcej symulacji scikit-fuzzy użytych do wyznaczenia ograniczenia błędu.")
+
+    def handle(self, *args, **options):
+        rule_base = get_rule_base()
+        path = options['output'] or surface_path(rule_base.digest)
+
+        surface = FuzzySurface.build(rule_base, mood_step=options['mood_step'], time_step=options['time_step'],
+                                     max_check_points=options['check_points'])
+        surface.save(path)
+
+        self.stdout.write(f"Zapisano tablicę {surface.table.shape[0]}x{surface.table.shape[1]} do {path}")
+        for name, error in surface.error_bound.items():
+            self.stdout.write(f"  {name}: ograniczenie błędu względem symulacji {error:.4f}")
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from spotify_mood.classes.FakeSpotify import Catalog, FakeSpotifyServer
+
+
+class Command(BaseCommand):
+    help = "Uruchamia lokalny serwer udający Spotify Web API do testów obciążeniowych i integracyjnych."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.0, help="średnie opóźnienie odpowiedzi w ms")
+        parser.add_argument('--jitter', type=float, default=0.5, help="rozrzut opóźnienia jako ułamek średniej")
+        parser.add_argument('--rate-limit', type=float, default=0.0,
+                            help="prawdopodobieństwo odpowiedzi 429 na zapytanie do /v1")
+        parser.add_argument('--retry-after', type=int, default=1, help="wartość nagłówka Retry-After w sekundach")
+        parser.add_argument('--artists', type=int, default=300)
+        parser.add_argument('--tracks', type=int, default=3000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        catalog = Catalog(artists=options['artists'], tracks=options['tracks'], seed=options['seed'])
+        server = FakeSpotifyServer(
+            (options['host'], options['port']),
+            catalog=catalog,
+            latency=options['latency'] / 1000,
+            jitter=options['jitter'],
+            rate_limit=options['rate_limit'],
+            retry_after=options['retry_after'],
+            seed=options['seed'],
+        )
+
+        self.stdout.write(f"Fałszywe Spotify działa na {server.base_url} "
+                          f"({len(catalog.artists)} artystów, {len(catalog.tracks)} utworów)")
+        self.stdout.write(f"  SPOTIFY_API_BASE_URL={server.base_url}/v1")
+        self.stdout.write(f"  SPOTIFY_ACCOUNTS_URL={server.base_url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Obsłużono {server.requests} zapytań, w tym {server.throttled} odpowiedzi 429")
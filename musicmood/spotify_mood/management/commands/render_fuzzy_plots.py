@@ -0,0 +1,34 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from spotify_mood.classes.FuzzyRules import get_rule_base
+from spotify_mood.classes.PlotCache import load_manifest, plots_dir
+
+
+class Command(BaseCommand):
+    help = "Renderuje wykresy funkcji przynależności dla aktualnej wersji reguł logiki rozmytej."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='formats', action='append', choices=['svg', 'png'])
+        parser.add_argument('--output-dir', default=None)
+        parser.add_argument('--force', action='store_true', help="renderuje wykresy nawet gdy manifest już istnieje")
+
+    def handle(self, *args, **options):
+        rule_base = get_rule_base()
+        output_dir = options['output_dir'] or plots_dir()
+        formats = tuple(options['formats'] or ['svg'])
+
+        manifest = None if options['force'] or options['output_dir'] else load_manifest(rule_base.digest)
+        if manifest and all(fmt in plot['files'] and os.path.exists(os.path.join(output_dir, plot['files'][fmt]))
+                            for plot in manifest['plots'].values() for fmt in formats):
+            self.stdout.write(f"Wykresy dla reguł {rule_base.digest[:16]} są już wyrenderowane w {output_dir}")
+            return
+
+        # Plots importuje matplotlib, ale rysuje na obiektach Figure, więc nie potrzebuje ekranu.
+        from spotify_mood.classes.Plots import render_plots
+
+        manifest = render_plots(rule_base, output_dir, formats)
+        for name, plot in manifest['plots'].items():
+            self.stdout.write(f"  {name}: {', '.join(plot['files'].values())}")
+        self.stdout.write(f"Zapisano wykresy dla reguł {rule_base.digest[:16]} do {output_dir}")
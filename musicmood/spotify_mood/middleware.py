@@ -0,0 +1,31 @@
+import requests
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+DEGRADED_MESSAGE = "Spotify chwilowo nie odpowiada. Spróbuj ponownie za chwilę."
+
+
+class DegradedServiceMiddleware:
+    """
+    Zamienia błędy połączenia z zewnętrznymi API (przekroczony czas, zerwane połączenie,
+    brak odpowiedzi w kasecie) w szybką odpowiedź 503 zamiast błędu 500 workera.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, requests.RequestException):
+            return None
+
+        print(f"Zewnętrzne API niedostępne przy {request.path}: {exception}")
+        retry_after = str(int(getattr(settings, 'CIRCUIT_BREAKER_RESET_TIMEOUT', 30)))
+        if (request.headers.get('x-requested-with') == 'XMLHttpRequest'
+                or 'application/json' in request.headers.get('accept', '')):
+            response = JsonResponse({'error': DEGRADED_MESSAGE, 'degraded': True}, status=503)
+        else:
+            response = HttpResponse(DEGRADED_MESSAGE, status=503)
+        response['Retry-After'] = retry_after
+        return response
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotify_mood', '0004_likedsongs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArtistGenres',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spotify_artist_id', models.CharField(max_length=45, unique=True)),
+                ('genres', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'artist_genres',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotify_mood', '0005_artistgenres'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeedIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('genre', models.CharField(max_length=45)),
+                ('liked', models.JSONField(default=list)),
+                ('recent_playlists', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'seed_index',
+                'unique_together': {('user_id', 'genre')},
+            },
+        ),
+    ]
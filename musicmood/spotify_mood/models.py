@@ -17,6 +17,15 @@ class Artist(models.Model):
         db_table = 'artist'
 
 
+class ArtistGenres(models.Model):
+    spotify_artist_id = models.CharField(unique=True, max_length=45)
+    genres = models.JSONField(default=list)
+    updated_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'artist_genres'
+
+
 class AuthGroup(models.Model):
     name = models.CharField(unique=True, max_length=150)
 
@@ -140,6 +149,21 @@ class Genre(models.Model):
         db_table = 'genre'
 
 
+class Job(models.Model):
+    id = models.CharField(primary_key=True, max_length=32)
+    kind = models.CharField(max_length=45)
+    user_id = models.IntegerField()
+    status = models.CharField(max_length=16)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(db_index=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'job'
+
+
 class Language(models.Model):
     language = models.CharField(max_length=45)
 
@@ -197,6 +221,18 @@ class PreferredGenre(models.Model):
         db_table = 'preferred genre'
 
 
+class SeedIndex(models.Model):
+    user_id = models.IntegerField()
+    genre = models.CharField(max_length=45)
+    liked = models.JSONField(default=list)
+    recent_playlists = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'seed_index'
+        unique_together = (('user_id', 'genre'),)
+
+
 class Settings(models.Model):
     user = models.OneToOneField('User', models.DO_NOTHING)
     song_time = models.CharField(max_length=45, blank=True, null=True)
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from .classes.Concurrency import map_concurrently, map_with_deadline
+
+
+class MapConcurrentlyTest(SimpleTestCase):
+    def test_results_keep_input_order(self):
+        delays = [0.05, 0.01, 0.03, 0.0]
+        results = map_concurrently(lambda delay: time.sleep(delay) or delay, delays, max_workers=4)
+        self.assertEqual(results, delays)
+
+    def test_latency_is_the_slowest_item(self):
+        start = time.perf_counter()
+        map_concurrently(lambda _: time.sleep(0.2), range(4), max_workers=4)
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_concurrency_is_bounded(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def work(_):
+            with lock:
+                running[0] += 1
+                running[1] = max(running[1], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+        map_concurrently(work, range(10), max_workers=3)
+        self.assertEqual(running[1], 3)
+
+    def test_errors_are_propagated(self):
+        def work(item):
+            if item == 2:
+                raise ValueError(item)
+            return item
+
+        with self.assertRaises(ValueError):
+            map_concurrently(work, range(4), max_workers=2)
+
+
+class MapWithDeadlineTest(SimpleTestCase):
+    def test_failed_and_late_items_are_skipped(self):
+        def work(item):
+            if item == 'error':
+                raise ValueError(item)
+            if item == 'slow':
+                time.sleep(1)
+            return item.upper()
+
+        start = time.perf_counter()
+        results = map_with_deadline(work, ['a', 'error', 'slow', 'b'], timeout=0.2, max_workers=4)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(results, ['A', None, None, 'B'])
+
+    def test_latency_is_the_slowest_item(self):
+        start = time.perf_counter()
+        results = map_with_deadline(lambda delay: time.sleep(delay) or delay, [0.2] * 5, timeout=2, max_workers=5)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(results, [0.2] * 5)
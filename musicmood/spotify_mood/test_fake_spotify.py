@@ -0,0 +1,258 @@
+import threading
+import time
+from unittest import mock
+
+import requests
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .classes.FakeSpotify import FAKE_USER_ID, Catalog, FakeSpotifyServer
+from .classes.SpotifyAPI import SpotifyAPI, search_cache, top_tracks_cache
+from .models import Artist, Genre, LikedSongs, Playlist, PlaylistGenre, Song, SongArtists, SongsPlaylist, User
+
+
+class FakeSpotifyTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeSpotifyServer(('127.0.0.1', 0), catalog=Catalog(artists=40, tracks=400, seed=1))
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+        cls.settings_override = override_settings(SPOTIFY_API_BASE_URL=f"{cls.server.base_url}/v1",
+                                                  SPOTIFY_ACCOUNTS_URL=cls.server.base_url)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        search_cache.clear()
+        top_tracks_cache.clear()
+        self.server.rate_limit = 0.0
+        self.api = SpotifyAPI()
+        # Testy sprawdzają tylko ruch HTTP - lokalna tabela artystów jest pusta.
+        self.api.db_connector = mock.Mock(**{'get_artist_id_by_name.return_value': None})
+        self.token = self.api.get_token('code', 'verifier')['access_token']
+
+    def test_api_uses_configured_base_url(self):
+        self.assertTrue(self.api.api_url.startswith(self.server.base_url))
+        self.assertTrue(self.api.get_authorization_url('challenge').startswith(f"{self.server.base_url}/authorize?"))
+        self.assertEqual(self.api.get_user_info(self.token)['id'], 'fake-user')
+
+    def test_refresh_grant(self):
+        token_info = self.api.refresh_access_token('refresh')
+        self.assertIn('access_token', token_info)
+        self.assertEqual(token_info['expires_in'], 3600)
+
+    def test_requests_without_token_are_rejected(self):
+        response = requests.get(f"{self.server.base_url}/v1/me")
+        self.assertEqual(response.status_code, 401)
+
+    def test_several_items_are_fetched_in_batches(self):
+        track_ids = list(self.server.catalog.tracks)[:120]
+        tracks = self.api.get_several(self.token, 'tracks', track_ids)
+        self.assertEqual(set(tracks), set(track_ids))
+        self.assertTrue(tracks[track_ids[0]]['album']['images'][0]['url'].startswith(self.server.base_url))
+
+        features = self.api.get_audio_features(self.token, track_ids)
+        self.assertEqual([feature['id'] for feature in features], track_ids)
+
+    def test_search_and_top_tracks(self):
+        artist = next(iter(self.server.catalog.artists.values()))
+        found = self.api.search_artists(self.token, artist['name'])
+        self.assertEqual(found[0]['id'], artist['id'])
+
+        top_tracks = self.api.get_top_tracks_by_artist(self.token, artist['name'], 3)
+        self.assertTrue(top_tracks)
+        self.assertTrue(all(track['id'] in self.server.catalog.tracks_by_artist[artist['id']] for track in top_tracks))
+
+    def test_top_tracks_of_many_artists_are_fetched_concurrently(self):
+        names = [artist['name'] for artist in list(self.server.catalog.artists.values())[:5]]
+        self.server.latency = 0.1
+        self.addCleanup(setattr, self.server, 'latency', 0.0)
+
+        start = time.perf_counter()
+        with override_settings(TASTEDIVE_ARTISTS_TIMEOUT=5):
+            tracks_by_artist = self.api.get_top_tracks_by_artists(self.token, names + ['Nobody At All'], 2)
+        self.assertLess(time.perf_counter() - start, 0.8)
+        self.assertEqual(set(tracks_by_artist), set(names + ['Nobody At All']))
+        self.assertEqual(tracks_by_artist['Nobody At All'], [])
+        self.assertTrue(all(len(tracks) == 2 for name, tracks in tracks_by_artist.items() if name in names))
+
+    def test_recommendations_respect_filters(self):
+        track_ids = self.api.search_tracks_by_features_v3(self.token, 0.5, 0.5, 120, -10, 0.5, 2, 5, [], 10, 'rock',
+                                                          min_popularity=20)
+        self.assertEqual(len(track_ids), 10)
+        for track_id in track_ids:
+            track = self.server.catalog.tracks[track_id]
+            self.assertTrue(120000 <= track['duration_ms'] <= 300000)
+            self.assertGreaterEqual(track['popularity'], 20)
+            self.assertTrue(any('rock' in self.server.catalog.artists[artist['id']]['genres']
+                                for artist in track['artists']))
+
+    def test_large_recommendations_are_paged_and_deduplicated(self):
+        track_ids = self.api.search_tracks_by_features_v3(self.token, 0.5, 0.5, 120, -10, 0.5, None, None, [], 150,
+                                                          None, min_popularity=0)
+        self.assertEqual(len(track_ids), 150)
+        self.assertEqual(len(set(track_ids)), 150)
+
+    def test_tracks_are_added_in_ordered_resumable_chunks(self):
+        headers = {'Authorization': f'Bearer {self.token}'}
+        playlist_id = requests.post(f"{self.server.base_url}/v1/users/fake-user/playlists", headers=headers,
+                                    json={'name': 'Large'}).json()['id']
+        track_uris = [f"spotify:track:{track_id}" for track_id in list(self.server.catalog.tracks)[:250]]
+
+        post = self.api.http.post
+
+        def fail_second_chunk(url, **kwargs):
+            if kwargs['json']['position'] == 100:
+                return requests.post(url.replace(playlist_id, 'missing'), **kwargs)
+            return post(url, **kwargs)
+
+        with mock.patch.object(self.api.http, 'post', side_effect=fail_second_chunk):
+            self.assertEqual(self.api.add_tracks_to_playlist(self.token, playlist_id, track_uris), 100)
+        self.assertEqual(cache.get(f"playlist_progress_{playlist_id}")['added'], 100)
+
+        self.assertEqual(self.api.add_tracks_to_playlist(self.token, playlist_id, track_uris), 250)
+        self.assertEqual(self.server.playlists[playlist_id]['track_uris'], track_uris)
+        self.assertIsNone(cache.get(f"playlist_progress_{playlist_id}"))
+
+    def test_interrupted_upload_resumes_on_the_same_playlist(self):
+        playlist = mock.Mock(id=7, spotify_id='')
+        self.api.db_connector.get_user_by_spotify_id.return_value = mock.Mock(id=1)
+        self.api.db_connector.save_playlist_to_db.return_value = playlist
+        track_data = [(track_id, 'rock') for track_id in list(self.server.catalog.tracks)[:250]]
+        playlists_before = len(self.server.playlists)
+
+        post = self.api.http.post
+
+        def fail_second_chunk(url, **kwargs):
+            if kwargs['json'].get('position') == 100:
+                return requests.post(url.replace(playlist.spotify_id, 'missing'), **kwargs)
+            return post(url, **kwargs)
+
+        with mock.patch.object(self.api.http, 'post', side_effect=fail_second_chunk):
+            result = self.api.finish_playlist(self.token, 'Large', track_data, 'rock', '', ['rock'], 250,
+                                              upload_key='upload')
+        self.assertEqual((result['status'], result['track_count']), ('error', 100))
+        self.assertEqual(self.api.db_connector.save_song_playlist_relation.call_count, 100)
+        self.api.db_connector.add_playlist_to_seed_index.assert_not_called()
+        pending = cache.get('upload')
+        self.assertEqual(pending['playlist_id'], 7)
+
+        result = self.api.finish_playlist(self.token, 'Large', pending['track_data'], pending['seeds'], '',
+                                          pending['genres'], 250, playlist=playlist, upload_key='upload')
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(len(self.server.playlists), playlists_before + 1)
+        self.assertEqual(self.server.playlists[playlist.spotify_id]['track_uris'],
+                         [f"spotify:track:{track_id}" for track_id, _ in track_data])
+        self.assertIsNone(cache.get('upload'))
+        self.api.db_connector.add_playlist_to_seed_index.assert_called_once()
+
+    def test_created_playlists_are_listed_and_revalidated(self):
+        headers = {'Authorization': f'Bearer {self.token}'}
+        created = requests.post(f"{self.server.base_url}/v1/users/fake-user/playlists", headers=headers,
+                                json={'name': 'Fake'}).json()
+        added = requests.post(f"{self.server.base_url}/v1/playlists/{created['id']}/tracks", headers=headers,
+                              json={'uris': ['spotify:track:faketrack00000001']})
+        self.assertEqual(added.status_code, 201)
+
+        state = self.api.fetch_user_playlists(self.token)
+        self.assertEqual(state['playlists'][created['id']]['name'], 'Fake')
+
+        url, etag, _ = state['pages'][0]
+        response = requests.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 304)
+
+    def test_rate_limit_injection(self):
+        self.server.rate_limit = 1.0
+        self.server.retry_after = 7
+        response = requests.get(f"{self.server.base_url}/v1/me", headers={'Authorization': f'Bearer {self.token}'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '7')
+        self.assertGreater(self.server.throttled, 0)
+
+
+# Wątki generowania playlisty korzystają z własnych połączeń z bazą, więc test nie może działać
+# w otwartej transakcji.
+@override_settings(FUZZY_ENGINE='analytic')
+class GeneratePlaylistTest(TransactionTestCase):
+    models = [User, Genre, Artist, Song, SongArtists, Playlist, PlaylistGenre, SongsPlaylist, LikedSongs]
+
+    @classmethod
+    def setUpClass(cls):
+        with connection.schema_editor() as editor:
+            for model in cls.models:
+                editor.create_model(model)
+        super().setUpClass()
+        cls.server = FakeSpotifyServer(('127.0.0.1', 0), catalog=Catalog(artists=60, tracks=1500, seed=2))
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+        cls.settings_override = override_settings(SPOTIFY_API_BASE_URL=f"{cls.server.base_url}/v1",
+                                                  SPOTIFY_ACCOUNTS_URL=cls.server.base_url)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            for model in reversed(cls.models):
+                editor.delete_model(model)
+
+    def setUp(self):
+        cache.clear()
+        search_cache.clear()
+        top_tracks_cache.clear()
+        now = timezone.now()
+        User.objects.create(spotify_id=FAKE_USER_ID, name='Fake User', token='', created_at=now, last_login=now)
+        for genre in ('rock', 'pop'):
+            Genre.objects.create(genre=genre)
+        self.api = SpotifyAPI()
+        self.token = self.api.get_token('code', 'verifier')['access_token']
+
+    def generate(self, mood_value, genre, track_count, description):
+        return self.api.generate_playlist_v3(self.token, mood_value, None, None, [genre], [100], 'Moja playlista',
+                                             description, track_count)
+
+    def playlist_tracks(self, playlist):
+        return self.server.playlists[playlist.spotify_id]['track_uris']
+
+    def test_interrupted_upload_does_not_capture_other_playlists_with_the_same_name(self):
+        post = self.api.http.post
+
+        def fail_second_chunk(url, **kwargs):
+            if (kwargs.get('json') or {}).get('position') == 100:
+                return requests.post(url.replace('/playlists/', '/playlists/missing'), **kwargs)
+            return post(url, **kwargs)
+
+        with mock.patch.object(self.api.http, 'post', side_effect=fail_second_chunk):
+            result = self.generate(0.1, 'rock', 110, '')
+        self.assertEqual((result['status'], result['track_count']), ('error', 100))
+        interrupted = Playlist.objects.get()
+        self.assertEqual(len(self.playlist_tracks(interrupted)), 100)
+
+        result = self.generate(0.9, 'pop', 20, 'nowa')
+        self.assertEqual((result['status'], result['track_count']), ('success', 20))
+        created = Playlist.objects.exclude(id=interrupted.id).get()
+        self.assertEqual(self.server.playlists[created.spotify_id]['description'], 'nowa')
+        self.assertEqual(len(self.playlist_tracks(created)), 20)
+        self.assertEqual(list(PlaylistGenre.objects.filter(playlist=created).values_list('genre__genre', flat=True)),
+                         ['pop'])
+        self.assertEqual(len(self.playlist_tracks(interrupted)), 100)
+
+        # Ponowne wysłanie tego samego formularza dokańcza przerwaną playlistę.
+        result = self.generate(0.1, 'rock', 110, '')
+        self.assertEqual((result['status'], result['track_count']), ('success', 110))
+        self.assertEqual(Playlist.objects.count(), 2)
+        self.assertEqual(len(self.playlist_tracks(interrupted)), 110)
+        self.assertEqual(SongsPlaylist.objects.filter(playlist=interrupted).count(), 110)
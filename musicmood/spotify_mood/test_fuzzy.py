@@ -0,0 +1,253 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+import skfuzzy as fuzz
+from django.test import SimpleTestCase
+
+from .classes.Fuzzy import Fuzzy, FuzzyPool, OUTPUTS
+from .classes.FuzzyAnalytic import AnalyticRuleBase
+from .classes.FuzzyEngine import get_engine
+from .classes.FuzzyRules import DEFAULT_RULES_PATH, CompiledRuleBase, RuleBaseRegistry, membership
+from .classes import FuzzySurface as surface_module
+from .classes.FuzzySurface import FuzzySurface
+
+# Próbkowanie uniwersów w scikit-fuzzy pomija przecięcia sąsiednich zbiorów,
+# dlatego porównania z symulacją dopuszczają 1% zakresu zmiennej wyjściowej.
+SIMULATION_TOLERANCE = {'energy': 0.01, 'valence': 0.01, 'tempo': 1.4, 'loudness': 0.6, 'danceability': 0.01}
+
+
+class FuzzyBatchTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fuzzy = Fuzzy()
+
+    def test_batch_matches_simulation(self):
+        rng = np.random.default_rng(0)
+        moods = np.concatenate([[0, 0.2, 0.5, 0.8, 1], rng.uniform(0, 1, 40)])
+        times = np.concatenate([[0, 10, 12, 18, 24], rng.uniform(0, 24, 40)])
+
+        results = self.fuzzy.compute_recommendations_batch(moods, times)
+        for i, (mood_value, time_of_day) in enumerate(zip(moods, times)):
+            exact = self.fuzzy.compute_recommendation(mood_value, time_of_day)
+            for name in OUTPUTS:
+                self.assertAlmostEqual(exact[name], results[name][i], delta=SIMULATION_TOLERANCE[name])
+
+    def test_batch_broadcasts_inputs(self):
+        results = self.fuzzy.compute_recommendations_batch(np.linspace(0, 1, 5)[:, None], np.arange(0, 24, 0.25))
+
+        self.assertEqual(results.shape, (5, 96))
+        self.assertEqual(results.dtype.names, OUTPUTS)
+
+
+class RuleBaseTest(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.rules_path = os.path.join(self.tmp_dir, 'rules.json')
+        shutil.copy(DEFAULT_RULES_PATH, self.rules_path)
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def edit_rules(self, edit):
+        with open(self.rules_path, encoding='utf-8') as f:
+            spec = json.load(f)
+        edit(spec)
+        with open(self.rules_path, 'w', encoding='utf-8') as f:
+            json.dump(spec, f, ensure_ascii=False)
+
+    def test_membership_matches_skfuzzy(self):
+        universe = np.arange(0, 1.01, 0.1)
+        for kind, params in [('trimf', [0, 0, 0.3]), ('trimf', [0.1, 0.3, 0.5]), ('trimf', [0.7, 1, 1]),
+                             ('trapmf', [0, 0, 0.2, 0.4]), ('trapmf', [0.15, 0.35, 0.65, 0.85])]:
+            np.testing.assert_allclose(membership(kind, universe, params),
+                                       getattr(fuzz, kind)(universe, params))
+
+    def test_compiled_artifact_is_reused(self):
+        digest = RuleBaseRegistry(self.rules_path, self.cache_dir).get().digest
+
+        with mock.patch.object(CompiledRuleBase, 'compile', side_effect=AssertionError):
+            self.assertEqual(RuleBaseRegistry(self.rules_path, self.cache_dir).get().digest, digest)
+
+    def test_edited_file_is_hot_reloaded(self):
+        registry = RuleBaseRegistry(self.rules_path, self.cache_dir, check_interval=0)
+        before = registry.get()
+
+        def faster_afternoon(spec):
+            spec['rules'][4]['then']['tempo'] = 'fast'
+        self.edit_rules(faster_afternoon)
+        after = registry.get()
+
+        self.assertNotEqual(before.digest, after.digest)
+        self.assertGreater(after.compute_recommendation(0.5, 14)['tempo'],
+                           before.compute_recommendation(0.5, 14)['tempo'])
+
+        with open(self.rules_path, 'w') as f:
+            f.write('{')
+        self.assertIs(registry.get(), after)
+
+    def test_unknown_term_is_rejected(self):
+        def typo(spec):
+            spec['rules'][0]['then']['energy'] = 'loww'
+        self.edit_rules(typo)
+
+        with self.assertRaises(ValueError):
+            RuleBaseRegistry(self.rules_path, self.cache_dir).get()
+
+    def test_malformed_edits_keep_previous_rules(self):
+        registry = RuleBaseRegistry(self.rules_path, self.cache_dir, check_interval=0)
+        before = registry.get()
+
+        def no_universe(spec):
+            del spec['inputs']['mood']['universe']
+
+        def null_params(spec):
+            spec['outputs']['energy']['terms']['low']['params'] = None
+
+        def rules_as_dict(spec):
+            spec['rules'] = {'first': spec['rules'][0]}
+
+        for edit in (no_universe, null_params, rules_as_dict):
+            shutil.copy(DEFAULT_RULES_PATH, self.rules_path)
+            self.edit_rules(edit)
+            self.assertIs(registry.get(), before, edit.__name__)
+
+        os.remove(self.rules_path)
+        self.assertIs(registry.get(), before)
+
+    def test_inputs_are_matched_by_name(self):
+        with open(DEFAULT_RULES_PATH, encoding='utf-8') as f:
+            spec = json.load(f)
+        reordered = dict(spec, inputs=dict(reversed(list(spec['inputs'].items()))))
+
+        original = CompiledRuleBase.compile(spec, 'original')
+        swapped = CompiledRuleBase.compile(reordered, 'swapped')
+        for point in [(0.1, 8), (0.5, 14), (0.9, 21)]:
+            expected = original.compute_recommendation(*point)
+            for result in (swapped.compute_recommendation(*point),
+                           AnalyticRuleBase(swapped).compute_recommendation(*point)):
+                for name in OUTPUTS:
+                    self.assertAlmostEqual(result[name], expected[name], delta=SIMULATION_TOLERANCE[name])
+
+
+class FuzzyPoolTest(SimpleTestCase):
+    def test_concurrent_recommendations_match_sequential(self):
+        pool = FuzzyPool()
+        points = [(i / 20, (i * 1.7) % 24) for i in range(21)]
+        expected = [Fuzzy().compute_recommendation(*point) for point in points]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda point: pool.compute_recommendation(*point), points * 4))
+
+        self.assertEqual(results, expected * 4)
+
+
+class AnalyticRuleBaseTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(DEFAULT_RULES_PATH, encoding='utf-8') as f:
+            cls.rule_base = CompiledRuleBase.compile(json.load(f), 'default')
+        cls.analytic = AnalyticRuleBase(cls.rule_base)
+
+    def test_matches_skfuzzy_on_refined_universes(self):
+        # Przy 100 razy gęstszych uniwersach scikit-fuzzy zbiega do wyniku dokładnego.
+        spec = json.loads(json.dumps(self.rule_base.spec))
+        for kind in ('inputs', 'outputs'):
+            for variable in spec[kind].values():
+                start, stop, step = variable['universe']
+                variable['universe'] = [start, stop, step / 100]
+        fuzzy = Fuzzy(CompiledRuleBase.compile(spec, 'refined'))
+
+        rng = random.Random(0)
+        points = [(0.61, 10.125), (0.0, 0.0), (1.0, 23.9)] + [(rng.uniform(0, 1), rng.uniform(0, 23.9)) for _ in range(7)]
+        for mood_value, time_of_day in points:
+            exact = self.analytic.compute_recommendation(mood_value, time_of_day)
+            sampled = fuzzy.compute_recommendation(mood_value, time_of_day)
+            for name in OUTPUTS:
+                self.assertAlmostEqual(exact[name], sampled[name], delta=SIMULATION_TOLERANCE[name] / 10)
+
+    def test_centroid_of_single_clipped_triangle(self):
+        self.assertAlmostEqual(AnalyticRuleBase.centroid([(0.0, 1.0, 1.0, 4.0)], [0.5]), 16 / 9)
+
+    def test_centroid_of_overlapping_terms(self):
+        x = np.linspace(0, 10, 200001)
+        terms = [(0.0, 2.0, 2.0, 6.0), (3.0, 5.0, 6.0, 10.0)]
+        cuts = [0.9, 0.4]
+        aggregated = np.fmax(np.fmin(membership('trapmf', x, terms[0]), cuts[0]),
+                             np.fmin(membership('trapmf', x, terms[1]), cuts[1]))
+        expected = (x * aggregated).sum() / aggregated.sum()
+        self.assertAlmostEqual(AnalyticRuleBase.centroid(terms, cuts), expected, places=5)
+
+    def test_engine_is_selected_by_setting(self):
+        with self.settings(FUZZY_ENGINE='analytic'):
+            self.assertIsInstance(get_engine(), AnalyticRuleBase)
+        with self.settings(FUZZY_ENGINE='compiled'):
+            self.assertIsInstance(get_engine(), CompiledRuleBase)
+        with self.assertRaises(ValueError):
+            get_engine('sampled')
+
+
+class FuzzySurfaceTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fuzzy = Fuzzy()
+        cls.surface = FuzzySurface.build(cls.fuzzy, mood_step=0.1, time_step=2.0)
+
+    def test_grid_nodes_match_simulation(self):
+        for mood_value, time_of_day in [(0.0, 0.0), (0.2, 8.0), (0.5, 12.0), (0.8, 18.0), (1.0, 24.0)]:
+            exact = self.fuzzy.compute_recommendation(mood_value, time_of_day)
+            approx = self.surface.compute_recommendation(mood_value, time_of_day)
+            for name in OUTPUTS:
+                self.assertAlmostEqual(exact[name], approx[name], delta=SIMULATION_TOLERANCE[name])
+
+    def test_interpolation_within_error_bound(self):
+        rng = random.Random(0)
+        for _ in range(30):
+            mood_value = rng.uniform(0, 1)
+            time_of_day = rng.uniform(0, 24)
+            exact = self.fuzzy.compute_recommendation(mood_value, time_of_day)
+            approx = self.surface.compute_recommendation(mood_value, time_of_day)
+            for name in OUTPUTS:
+                self.assertLessEqual(abs(exact[name] - approx[name]), self.surface.error_bound[name])
+
+    def test_inputs_outside_domain_are_clipped(self):
+        self.assertEqual(self.surface.compute_recommendation(-0.5, 30), self.surface.compute_recommendation(0, 24))
+
+    def test_save_and_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'surface.npz')
+            self.surface.save(path)
+            loaded = FuzzySurface.load(path)
+
+        self.assertEqual(loaded.error_bound, self.surface.error_bound)
+        self.assertEqual(loaded.compute_recommendation(0.33, 13.3), self.surface.compute_recommendation(0.33, 13.3))
+
+    def test_missing_surface_is_built_in_background(self):
+        release = threading.Event()
+        built = threading.Event()
+
+        def build_surface(rule_base):
+            release.wait(10)
+            built.set()
+            return self.surface
+
+        with tempfile.TemporaryDirectory() as tmp_dir, self.settings(FUZZY_CACHE_DIR=tmp_dir), \
+                mock.patch.object(surface_module, '_surface', None), \
+                mock.patch.object(surface_module, 'build_surface', side_effect=build_surface):
+            self.assertIsInstance(surface_module.get_surface(), AnalyticRuleBase)
+            self.assertFalse(built.is_set())
+
+            release.set()
+            self.assertTrue(built.wait(10))
+            with surface_module._rebuild_lock:
+                self.assertIs(surface_module._surface, self.surface)
@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+IMPORT_TIME_BUDGET = 0.5
+
+HEAVY_MODULES = ('matplotlib', 'numpy', 'scipy', 'skfuzzy')
+
+MEASURE_IMPORT = """
+import json, sys, time
+import django
+django.setup()
+start = time.perf_counter()
+import spotify_mood.views
+elapsed = time.perf_counter() - start
+print(json.dumps({'elapsed': elapsed, 'modules': [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+MEASURE_ENGINE = """
+import sys
+import django
+django.setup()
+from spotify_mood.classes.FuzzyEngine import get_engine, print_results
+print_results(0.5, 12.0, get_engine('analytic').compute_recommendation(0.5, 12.0))
+print('skfuzzy' in sys.modules)
+"""
+
+
+class ViewsImportTimeTest(SimpleTestCase):
+    def run_script(self, script):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'musicmood.settings'),
+                   PYTHONPATH=os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])))
+        output = subprocess.run([sys.executable, '-c', script], env=env, cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        return output.strip().splitlines()[-1]
+
+    def measure(self):
+        return json.loads(self.run_script(MEASURE_IMPORT))
+
+    def test_views_do_not_import_fuzzy_or_plotting_stack(self):
+        self.assertEqual(self.measure()['modules'], [])
+
+    def test_views_import_within_budget(self):
+        elapsed = min(self.measure()['elapsed'] for _ in range(3))
+        self.assertLess(elapsed, IMPORT_TIME_BUDGET)
+
+    def test_fast_engines_do_not_import_skfuzzy(self):
+        self.assertEqual(self.run_script(MEASURE_ENGINE), 'False')
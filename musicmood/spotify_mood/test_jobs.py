@@ -0,0 +1,74 @@
+import json
+import threading
+import time
+
+from django.test import RequestFactory, TransactionTestCase
+from django.utils import timezone
+
+from .classes.JobQueue import get_job, submit_job
+from .models import Job
+from .views import job_status_view
+
+
+def wait_for(job_id, timeout=2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = get_job(job_id)
+        if job['status'] in ('done', 'error'):
+            return job
+        time.sleep(0.01)
+    return get_job(job_id)
+
+
+# Wątki puli korzystają z własnych połączeń z bazą, więc testy nie mogą działać w otwartej transakcji.
+class JobQueueTest(TransactionTestCase):
+    def test_submit_returns_before_the_job_finishes(self):
+        release = threading.Event()
+
+        start = time.perf_counter()
+        job_id = submit_job('test', 1, lambda: release.wait(2) and {'status': 'success'})
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertIn(get_job(job_id)['status'], ('queued', 'running'))
+
+        release.set()
+        job = wait_for(job_id)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result'], {'status': 'success'})
+
+    def test_errors_are_recorded(self):
+        def fail():
+            raise ValueError("boom")
+
+        job = wait_for(submit_job('test', 1, fail))
+        self.assertEqual((job['status'], job['error']), ('error', 'boom'))
+
+
+class JobStatusViewTest(TransactionTestCase):
+    def get(self, job_id, user_id=1):
+        request = RequestFactory().get(f'/jobs/{job_id}/')
+        request.session = {'user_id': user_id}
+        response = job_status_view(request, job_id)
+        return response, json.loads(response.content), request.session
+
+    def test_finished_job_redirects_with_its_message(self):
+        job_id = submit_job('generate_playlist', 1, lambda: {'status': 'success', 'message': 'Gotowe'})
+        wait_for(job_id)
+
+        response, data, session = self.get(job_id)
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(data['redirect'], '/play/')
+        self.assertEqual((session['status'], session['message']), ('success', 'Gotowe'))
+
+    def test_jobs_of_other_users_are_hidden(self):
+        job_id = submit_job('generate_playlist', 1, lambda: {'status': 'success', 'message': 'Gotowe'})
+        response, data, _ = self.get(job_id, user_id=2)
+        self.assertEqual(response.status_code, 404)
+
+    def test_status_is_read_from_the_job_table(self):
+        # Zadanie przyjęte przez inny proces serwera widoczne jest tylko przez bazę.
+        Job.objects.create(id='other-process', kind='generate_playlist', user_id=1, status='done',
+                           result={'status': 'warning', 'message': 'Mniej utworów'}, created_at=timezone.now())
+
+        response, data, session = self.get('other-process')
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual((session['status'], session['message']), ('warning', 'Mniej utworów'))
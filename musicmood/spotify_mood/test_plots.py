@@ -0,0 +1,58 @@
+import io
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from . import views
+from .classes.FuzzyRules import get_rule_base
+from .classes.PlotCache import PLOT_FILENAME, load_manifest, rules_digest
+
+
+class FuzzyPlotsTest(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        override = override_settings(FUZZY_PLOTS_DIR=self.tmp_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def render(self, *args):
+        stdout = io.StringIO()
+        call_command('render_fuzzy_plots', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_manifest_matches_rule_base_version(self):
+        self.render()
+        self.assertEqual(rules_digest(), get_rule_base().digest)
+
+        manifest = load_manifest()
+        self.assertEqual(set(manifest['plots']), {'inputs', 'outputs', 'output_terms'})
+        for plot in manifest['plots'].values():
+            filename = plot['files']['svg']
+            self.assertRegex(filename, PLOT_FILENAME)
+            self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, filename)))
+
+    def test_rendering_is_deterministic_and_skipped_when_cached(self):
+        self.render()
+        first = load_manifest()
+        self.assertIn("już wyrenderowane", self.render())
+
+        self.render('--force')
+        self.assertEqual(load_manifest(), first)
+        self.assertEqual(len(os.listdir(self.tmp_dir.name)), len(first['plots']) + 1)
+
+    def test_plot_is_served_with_far_future_cache_headers(self):
+        self.render()
+        filename = load_manifest()['plots']['inputs']['files']['svg']
+
+        response = views.fuzzy_plot(RequestFactory().get('/'), filename)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(b'<svg', response.content)
+
+    def test_unknown_plot_names_are_rejected(self):
+        for filename in ['../settings.py', 'inputs-0123456789abcdef.svg', 'manifest.json']:
+            self.assertEqual(views.fuzzy_plot(RequestFactory().get('/'), filename).status_code, 404)
@@ -0,0 +1,77 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.checks import run_checks
+from django.test import SimpleTestCase, override_settings
+
+from .checks import check_shared_cache
+from .classes import RateLimiter as rate_limiter_module
+from .classes.RateLimiter import RateLimiter, RateLimiterBusy, RateLimitExceeded
+
+
+class RateLimiterTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.limiter = RateLimiter('test', rate=20, burst=2, max_wait=1.0)
+
+    def test_burst_then_queue_at_refill_rate(self):
+        waits = [self.limiter.reserve() for _ in range(4)]
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.05, delta=0.01)
+        self.assertAlmostEqual(waits[3], 0.10, delta=0.01)
+
+    def test_budget_is_shared_by_limiters_with_the_same_name(self):
+        other = RateLimiter('test', rate=20, burst=2, max_wait=1.0)
+        self.limiter.reserve()
+        other.reserve()
+        self.assertGreater(self.limiter.reserve(), 0)
+
+    def test_retry_after_pauses_every_request(self):
+        self.limiter.backoff(0.3)
+
+        start = time.monotonic()
+        self.limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+
+        state = self.limiter.state()
+        self.assertEqual(state['throttled'], 1)
+        self.assertEqual(state['backoff_remaining'], 0)
+
+    def test_requests_over_max_wait_are_not_queued(self):
+        self.limiter.backoff(5)
+        with self.assertRaises(RateLimitExceeded):
+            self.limiter.reserve()
+        self.assertEqual(self.limiter.state()['tokens'], 2)
+
+    def test_busy_lock_is_not_bypassed(self):
+        cache.add(self.limiter.lock_key, 'other', 60)
+        with mock.patch.object(rate_limiter_module, 'LOCK_WAIT', 0.05):
+            with self.assertRaises(RateLimiterBusy):
+                self.limiter.reserve()
+
+        state = self.limiter.state()
+        self.assertEqual(state['tokens'], 2)
+        self.assertEqual(state['lock_timeouts'], 1)
+
+
+class SharedCacheTest(SimpleTestCase):
+    LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    REDIS = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                         'LOCATION': 'redis://127.0.0.1:6379'}}
+
+    def test_process_local_cache_is_rejected_when_required(self):
+        with override_settings(CACHES=self.LOCAL, SHARED_CACHE_REQUIRED=True):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['spotify_mood.E001'])
+
+    def test_shared_or_optional_cache_is_accepted(self):
+        with override_settings(CACHES=self.REDIS, SHARED_CACHE_REQUIRED=True):
+            self.assertEqual(check_shared_cache(None), [])
+        with override_settings(CACHES=self.LOCAL, SHARED_CACHE_REQUIRED=False):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_only_deploy_checks_require_shared_cache(self):
+        with override_settings(CACHES=self.LOCAL, SHARED_CACHE_REQUIRED=True):
+            self.assertEqual(run_checks(include_deployment_checks=False, tags=['caches']), [])
+            self.assertIn('spotify_mood.E001',
+                          [error.id for error in run_checks(include_deployment_checks=True, tags=['caches'])])
@@ -0,0 +1,538 @@
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .classes.CircuitBreaker import circuit_open_response
+from .classes.Paging import iterate_pages
+from .classes.SpotifyAPI import SpotifyAPI, search_cache, top_tracks_cache
+from .classes.SpotifyAuth import get_valid_access_token, store_token
+from .classes.TTLCache import TTLCache
+from .classes.DatabaseConnector import DatabaseConnector
+from .models import Artist, ArtistGenres, Genre, LikedSongs, Playlist, PlaylistGenre, SeedIndex, Song, SongsPlaylist
+from .models import User
+from .middleware import DEGRADED_MESSAGE
+
+
+class FakeTransport:
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        kind = url.rsplit('/', 1)[1]
+        ids = params['ids'].split(',')
+        with self.lock:
+            self.calls.append((kind, ids))
+
+        response = mock.Mock()
+        if ids[0] in self.failing:
+            response.status_code = 503
+            return response
+
+        response.status_code = 200
+        items = [None if item_id.startswith('missing') else self.item(kind, item_id) for item_id in ids]
+        response.json.return_value = {kind.replace('-', '_'): items}
+        return response
+
+    @staticmethod
+    def item(kind, item_id):
+        if kind == 'tracks':
+            return {'id': item_id, 'artists': [{'id': f"artist-{int(item_id.split('-')[1]) % 3}"}]}
+        if kind == 'artists':
+            return {'id': item_id, 'genres': ['Rock'] if item_id == 'artist-0' else ['pop']}
+        return {'id': item_id, 'energy': 0.5}
+
+
+class BatchedFetchTest(SimpleTestCase):
+    def setUp(self):
+        self.api = SpotifyAPI()
+        self.api.http = FakeTransport()
+
+    def test_ids_are_chunked_to_endpoint_limits(self):
+        track_ids = [f"track-{i}" for i in range(120)]
+
+        tracks = self.api.get_several('token', 'tracks', track_ids + track_ids[:10])
+        features = self.api.get_audio_features('token', track_ids)
+
+        self.assertEqual(len(tracks), 120)
+        self.assertEqual([item['id'] for item in features], track_ids)
+        self.assertEqual(sorted(len(ids) for kind, ids in self.api.http.calls if kind == 'tracks'), [20, 50, 50])
+        self.assertEqual(sorted(len(ids) for kind, ids in self.api.http.calls if kind == 'audio-features'), [20, 100])
+
+    def test_failed_chunks_and_missing_items_are_skipped(self):
+        self.api.http = FakeTransport(failing={'track-50'})
+        tracks = self.api.get_several('token', 'tracks', [f"track-{i}" for i in range(60)] + ['missing-1'])
+        self.assertEqual(sorted(tracks, key=lambda item_id: int(item_id.split('-')[1])),
+                         [f"track-{i}" for i in range(50)])
+
+class LargeRecommendationsTest(SimpleTestCase):
+    def setUp(self):
+        self.api = SpotifyAPI()
+        self.requests = []
+
+    def search(self, respond, track_count):
+        def get_recommendations(access_token, params):
+            self.requests.append(params)
+            return respond(params)
+
+        self.api.get_recommendations = get_recommendations
+        return self.api.search_tracks_by_features_v3('token', 0.5, 0.5, 120, -10, 0.5, None, None, [], track_count,
+                                                     'rock', min_popularity=0)
+
+    def test_rounds_use_new_seeds_from_found_tracks(self):
+        def respond(params):
+            # Każdy zestaw seedów prowadzi do innych 100 utworów.
+            prefix = params['seed_tracks'] or 'genre'
+            return [f"{prefix}/{i}" for i in range(100)]
+
+        track_ids = self.search(respond, 350)
+        self.assertEqual(len(set(track_ids)), 350)
+
+        seeds = [params['seed_tracks'] for params in self.requests]
+        self.assertEqual(len(seeds), len(set(seeds)))
+        for params in self.requests[1:]:
+            self.assertEqual(params['seed_genres'], 'rock')
+            self.assertEqual(len(params['seed_tracks'].split(',')), 4)
+
+    def test_rounds_stop_when_nothing_new_is_found(self):
+        track_ids = self.search(lambda params: [f"track-{i}" for i in range(100)], 500)
+        self.assertEqual(len(track_ids), 100)
+        self.assertEqual(len(self.requests), 1 + 4)
+
+
+class ArtistGenresTest(TestCase):
+    def setUp(self):
+        self.api = SpotifyAPI()
+        self.api.http = FakeTransport()
+        self.tracks = [FakeTransport.item('tracks', f"track-{i}") for i in range(70)]
+
+    def artist_calls(self):
+        return [sorted(ids) for kind, ids in self.api.http.calls if kind == 'artists']
+
+    def test_recently_added_tracks_are_matched_by_artist_genre(self):
+        matching = self.api.get_recently_added_tracks_that_match_genre('token', 'rock', self.tracks)
+
+        self.assertEqual(matching, [track['id'] for i, track in enumerate(self.tracks) if i % 3 == 0])
+        self.assertEqual(self.artist_calls(), [['artist-0', 'artist-1', 'artist-2']])
+        self.assertEqual(ArtistGenres.objects.count(), 3)
+
+    def test_known_artists_are_read_locally(self):
+        self.api.get_recently_added_tracks_that_match_genre('token', 'rock', self.tracks)
+        self.api.get_recently_added_tracks_that_match_genre('token', 'pop', self.tracks)
+        self.assertEqual(len(self.artist_calls()), 1)
+
+    def test_stale_artists_are_refreshed(self):
+        self.api.get_artist_genres('token', ['artist-0', 'artist-1'])
+        ArtistGenres.objects.filter(spotify_artist_id='artist-1').update(
+            updated_at=timezone.now() - datetime.timedelta(days=30))
+
+        self.api.get_artist_genres('token', ['artist-0', 'artist-1', 'artist-2'])
+        self.assertEqual(self.artist_calls(), [['artist-0', 'artist-1'], ['artist-1', 'artist-2']])
+
+    def test_genres_are_saved_without_conflict_target(self):
+        # Backend MySQL nie obsługuje unique_fields w bulk_create(update_conflicts=True).
+        self.api.get_artist_genres('token', ['artist-0'])
+        ArtistGenres.objects.filter(spotify_artist_id='artist-0').update(
+            genres=['old'], updated_at=timezone.now() - datetime.timedelta(days=30))
+
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            self.api.db_connector.save_artist_genres({'artist-0': ['rock'], 'artist-1': ['pop']})
+
+        self.assertEqual(dict(ArtistGenres.objects.values_list('spotify_artist_id', 'genres')),
+                         {'artist-0': ['rock'], 'artist-1': ['pop']})
+        self.assertLess(timezone.now() - ArtistGenres.objects.get(spotify_artist_id='artist-0').updated_at,
+                        datetime.timedelta(minutes=1))
+
+
+class ArtistResolutionTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Tabela artist nie jest zarządzana przez migracje, więc w bazie testowej trzeba ją utworzyć.
+        with connection.schema_editor() as editor:
+            editor.create_model(Artist)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            editor.delete_model(Artist)
+
+    def setUp(self):
+        cache.clear()
+        search_cache.clear()
+        top_tracks_cache.clear()
+        self.api = SpotifyAPI()
+        self.api.http = mock.Mock()
+        self.api.http.get.side_effect = self.respond
+        self.artists = {'daft punk': {'name': 'Daft Punk', 'id': 'artist-dp', 'images': []}}
+
+    def respond(self, url, headers=None, params=None, **kwargs):
+        response = mock.Mock()
+        response.status_code = 200
+        if url.endswith('/search'):
+            artist = self.artists.get(params['q'].split(':', 1)[1].casefold())
+            response.json.return_value = {'artists': {'items': [artist] if artist else []}}
+        else:
+            response.json.return_value = {'tracks': [{'id': f'track-{i}', 'name': f'Track {i}'} for i in range(10)]}
+        return response
+
+    def urls(self):
+        return [call.args[0].rsplit('/', 1)[1] for call in self.api.http.get.call_args_list]
+
+    def test_names_known_locally_need_no_search(self):
+        Artist.objects.create(spotify_artist_id='artist-local', artist='Local Hero')
+        self.assertEqual(self.api.resolve_artist_id('token', ' local hero'), 'artist-local')
+        self.assertEqual(self.urls(), [])
+
+    def test_resolved_names_and_top_tracks_are_reused(self):
+        first = self.api.get_top_tracks_by_artist('token', 'Daft Punk', 3)
+        search_cache.clear()
+        cache.clear()
+        second = self.api.get_top_tracks_by_artist('token', 'daft punk', 5)
+
+        self.assertEqual((len(first), len(second)), (3, 5))
+        self.assertEqual(self.urls(), ['search', 'top-tracks'])
+        self.assertTrue(Artist.objects.filter(spotify_artist_id='artist-dp', artist='Daft Punk').exists())
+
+    def test_unknown_names_are_cached_negatively(self):
+        self.assertEqual(self.api.get_top_tracks_by_artist('token', 'Nobody', 3), [])
+        search_cache.clear()
+        self.assertEqual(self.api.get_top_tracks_by_artist('token', 'nobody', 3), [])
+        self.assertEqual(self.urls(), ['search'])
+
+    def test_failed_searches_are_not_cached_negatively(self):
+        self.api.http.get.side_effect = None
+        self.api.http.get.return_value.status_code = 503
+        self.assertIsNone(self.api.resolve_artist_id('token', 'Daft Punk'))
+        self.assertIsNone(self.api.resolve_artist_id('token', 'Daft Punk'))
+        self.assertEqual(self.api.http.get.call_count, 2)
+
+
+class SeedIndexTest(TestCase):
+    models = [User, Genre, Song, Playlist, PlaylistGenre, SongsPlaylist, LikedSongs]
+
+    @classmethod
+    def setUpClass(cls):
+        with connection.schema_editor() as editor:
+            for model in cls.models:
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            for model in reversed(cls.models):
+                editor.delete_model(model)
+
+    def setUp(self):
+        now = timezone.now()
+        self.db = DatabaseConnector()
+        self.user = User.objects.create(spotify_id='user', name='User', token='', created_at=now, last_login=now)
+        self.rock = Genre.objects.create(genre='rock')
+        self.jazz = Genre.objects.create(genre='jazz')
+        self.songs = {spotify_id: Song.objects.create(spotify_id=spotify_id, title=spotify_id, duration=1,
+                                                      genre=genre, photo_url='')
+                      for spotify_id, genre in [('r1', self.rock), ('r2', self.rock), ('r3', self.rock),
+                                                ('j1', self.jazz)]}
+
+    def make_playlist(self, seed, song_ids, minutes_ago=0):
+        playlist = Playlist.objects.create(user=self.user, name=seed, spotify_id='', seed=seed,
+                                           created_at=timezone.now() - datetime.timedelta(minutes=minutes_ago))
+        PlaylistGenre.objects.create(playlist=playlist, genre=self.rock)
+        for spotify_id in song_ids:
+            SongsPlaylist.objects.create(playlist=playlist, song=self.songs[spotify_id])
+        return playlist
+
+    def test_index_is_built_once_from_source_tables(self):
+        self.make_playlist('r1', ['r1', 'r2', 'j1'], minutes_ago=10)
+        self.make_playlist('rock', ['r3'])
+        LikedSongs.objects.create(user=self.user, song=self.songs['r2'])
+
+        index = self.db.get_seed_index(self.user, 'rock')
+        self.assertEqual(index.liked, ['r2'])
+        self.assertEqual([playlist['seed'] for playlist in index.recent_playlists], ['rock', 'r1'])
+        self.assertEqual(index.recent_playlists[1]['tracks'], ['r1', 'r2', 'j1'])
+        self.assertEqual(index.recent_playlists[1]['genre_tracks'], ['r1', 'r2'])
+
+        with self.assertNumQueries(1):
+            self.db.get_seed_index(self.user, 'rock')
+
+    def test_likes_update_the_index(self):
+        self.db.get_seed_index(self.user, 'rock')
+        self.db.add_liked_song_to_seed_index(self.user, self.songs['r1'])
+        self.db.add_liked_song_to_seed_index(self.user, self.songs['r1'])
+        self.db.add_liked_song_to_seed_index(self.user, self.songs['j1'])
+        self.assertEqual(SeedIndex.objects.get(user_id=self.user.id, genre='rock').liked, ['r1'])
+
+        self.db.remove_liked_song_from_seed_index(self.user, self.songs['r1'])
+        self.assertEqual(SeedIndex.objects.get(user_id=self.user.id, genre='rock').liked, [])
+
+    def test_updates_of_a_missing_index_build_it_first(self):
+        LikedSongs.objects.create(user=self.user, song=self.songs['r1'])
+        self.db.add_liked_song_to_seed_index(self.user, self.songs['r2'])
+        self.assertEqual(SeedIndex.objects.get(user_id=self.user.id, genre='rock').liked, ['r1', 'r2'])
+
+        playlist = self.make_playlist('r3', ['r3', 'j1'])
+        self.db.add_playlist_to_seed_index(self.user, playlist, ['jazz'])
+        jazz = SeedIndex.objects.get(user_id=self.user.id, genre='jazz')
+        self.assertEqual([(entry['id'], entry['genre_tracks']) for entry in jazz.recent_playlists],
+                         [(playlist.id, ['j1'])])
+
+        # Istniejący indeks nie jest przebudowywany przy odczycie ani aktualizacji.
+        LikedSongs.objects.create(user=self.user, song=self.songs['r3'])
+        self.assertEqual(self.db.get_seed_index(self.user, 'rock').liked, ['r1', 'r2'])
+
+    def test_new_playlists_are_pushed_and_trimmed(self):
+        self.db.get_seed_index(self.user, 'rock')
+        for i in range(7):
+            playlist = self.make_playlist(f'seed-{i}', ['r1', 'j1'])
+            self.db.add_playlist_to_seed_index(self.user, playlist, ['rock'])
+
+        recent = SeedIndex.objects.get(user_id=self.user.id, genre='rock').recent_playlists
+        self.assertEqual([playlist['seed'] for playlist in recent], [f'seed-{i}' for i in range(6, 1, -1)])
+        self.assertEqual(recent[0]['genre_tracks'], ['r1'])
+
+    def test_seed_choice_skips_used_seeds(self):
+        self.make_playlist('r1', ['r1', 'r2'])
+        LikedSongs.objects.create(user=self.user, song=self.songs['r1'])
+        LikedSongs.objects.create(user=self.user, song=self.songs['r3'])
+
+        api = SpotifyAPI()
+        api.search_tracks_by_features_v3 = mock.Mock(return_value=['found'])
+        api.get_recently_added_tracks_that_match_genre = mock.Mock(return_value=[])
+        seed, track_ids = api.collect_genre_tracks('token', self.user, 'rock', 5, 0.5, 0.5, 120, -10, 0.5, None,
+                                                   None, [], {})
+        self.assertEqual((seed, track_ids), ('r3', ['found']))
+        api.get_recently_added_tracks_that_match_genre.assert_not_called()
+
+        self.db.remove_liked_song_from_seed_index(self.user, self.songs['r3'])
+        seed, _ = api.collect_genre_tracks('token', self.user, 'rock', 5, 0.5, 0.5, 120, -10, 0.5, None, None, [], {})
+        self.assertIn(seed, ['r1', 'r2'])
+
+
+class TokenSessionTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.api = mock.Mock(spec=SpotifyAPI)
+        self.api.refresh_access_token.side_effect = lambda refresh_token: (
+            time.sleep(0.05) or {'access_token': 'new-token', 'expires_in': 3600})
+        self.request = RequestFactory().get('/')
+        self.request.session = {}
+
+    def test_unexpired_token_is_used_without_round_trips(self):
+        store_token(self.request.session, {'access_token': 'token', 'expires_in': 3600, 'refresh_token': 'refresh'})
+        self.assertEqual(get_valid_access_token(self.request, self.api), 'token')
+        self.assertEqual(self.api.mock_calls, [])
+
+    def test_expired_token_is_refreshed(self):
+        store_token(self.request.session, {'access_token': 'token', 'expires_in': 30, 'refresh_token': 'refresh'})
+
+        self.assertEqual(get_valid_access_token(self.request, self.api), 'new-token')
+        self.api.refresh_access_token.assert_called_once_with('refresh')
+        self.assertEqual(self.request.session['refresh_token'], 'refresh')
+        self.assertGreater(self.request.session['expires_at'], time.time() + 3000)
+
+    def test_concurrent_requests_refresh_once(self):
+        sessions = []
+        for _ in range(4):
+            request = RequestFactory().get('/')
+            request.session = {}
+            store_token(request.session, {'access_token': 'token', 'expires_in': 0, 'refresh_token': 'refresh'})
+            sessions.append(request)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            tokens = list(executor.map(lambda request: get_valid_access_token(request, self.api), sessions))
+
+        self.assertEqual(tokens, ['new-token'] * 4)
+        self.assertEqual(self.api.refresh_access_token.call_count, 1)
+
+    def test_failed_refresh_requires_login(self):
+        self.api.refresh_access_token.side_effect = None
+        self.api.refresh_access_token.return_value = {'error': 'invalid_grant'}
+        store_token(self.request.session, {'access_token': 'token', 'expires_in': 0, 'refresh_token': 'refresh'})
+        self.assertIsNone(get_valid_access_token(self.request, self.api))
+
+    def test_identity_is_cached_per_token(self):
+        api = SpotifyAPI()
+        api.http = mock.Mock()
+        api.http.get.return_value.status_code = 200
+        api.http.get.return_value.json.return_value = {'id': 'user', 'display_name': 'User'}
+
+        for _ in range(3):
+            self.assertEqual(api.get_user_info('token')['id'], 'user')
+        api.get_user_info('other-token')
+        self.assertEqual(api.http.get.call_count, 2)
+
+    def test_unavailable_identity_degrades_generation(self):
+        api = SpotifyAPI()
+        api.http = mock.Mock()
+        api.http.get.return_value = circuit_open_response('GET', f'{api.api_url}/me', 'me', 30)
+        custom_params = {'energy': 0.5, 'valence': 0.5, 'tempo': 120, 'loudness': -8, 'danceability': 0.5}
+
+        result = api.generate_playlist_v3('token', None, 2, 5, ['rock'], [100], 'lista', '', 10, custom_params)
+        self.assertEqual(result, {"status": "error", "message": DEGRADED_MESSAGE, "track_count": 0})
+        self.assertEqual(api.create_playlist('token', 'lista', [('track', 'rock')], []), 0)
+        api.http.post.assert_not_called()
+
+
+class SearchCacheTest(SimpleTestCase):
+    def setUp(self):
+        search_cache.clear()
+        self.api = SpotifyAPI()
+        self.api.http = mock.Mock()
+        self.api.http.get.return_value.status_code = 200
+        self.api.http.get.return_value.json.return_value = {
+            'artists': {'items': [{'name': 'Artist', 'id': 'artist-1', 'images': []}]}}
+
+    def test_identical_normalized_queries_hit_the_cache(self):
+        first = self.api.search_artists('token-a', 'Daft  Punk')
+        second = self.api.search_artists('token-b', ' daft punk ')
+        self.api.search_artists('token-a', 'daft punk', offset=10)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.api.http.get.call_count, 2)
+        self.assertEqual(search_cache.stats()['hits'], 1)
+
+    def test_failed_searches_are_not_cached(self):
+        self.api.http.get.return_value.status_code = 500
+        self.assertEqual(self.api.search_artists('token', 'daft punk'), [])
+        self.assertEqual(self.api.search_artists('token', 'daft punk'), [])
+        self.assertEqual(self.api.http.get.call_count, 2)
+
+
+class TTLCacheTest(SimpleTestCase):
+    def test_entries_expire(self):
+        ttl_cache = TTLCache(ttl=0.05)
+        ttl_cache.set('key', 'value')
+        self.assertEqual(ttl_cache.get('key'), 'value')
+        time.sleep(0.06)
+        self.assertIsNone(ttl_cache.get('key'))
+        self.assertEqual((ttl_cache.hits, ttl_cache.misses), (1, 1))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        ttl_cache = TTLCache(maxsize=2)
+        ttl_cache.set('a', 1)
+        ttl_cache.set('b', 2)
+        ttl_cache.get('a')
+        ttl_cache.set('c', 3)
+
+        self.assertEqual((ttl_cache.get('a'), ttl_cache.get('b'), ttl_cache.get('c')), (1, None, 3))
+        self.assertEqual(ttl_cache.stats()['evictions'], 1)
+
+
+class UserPlaylistsTest(SimpleTestCase):
+    PAGE_URL = 'https://api.spotify.com/v1/me/playlists?limit=50'
+
+    def setUp(self):
+        cache.clear()
+        self.api = SpotifyAPI()
+        self.api.http = mock.Mock(side_effect=None)
+        self.api.http.get.side_effect = self.respond
+        self.pages = {
+            self.PAGE_URL: [self.playlist(i) for i in range(50)],
+            f'{self.PAGE_URL}&offset=50': [self.playlist(i) for i in range(50, 60)],
+        }
+        self.statuses = []
+
+    @staticmethod
+    def playlist(i, snapshot='s1'):
+        return {'id': f'playlist-{i}', 'name': f'Playlist {i}', 'snapshot_id': snapshot,
+                'images': [{'url': f'https://img/{i}'}]}
+
+    def respond(self, url, headers=None, **kwargs):
+        urls = list(self.pages)
+        items = self.pages[url]
+        etag = f'"{hash(str(items))}"'
+
+        response = mock.Mock()
+        response.headers = {'ETag': etag}
+        if headers.get('If-None-Match') == etag:
+            response.status_code = 304
+            self.statuses.append(304)
+            return response
+
+        response.status_code = 200
+        self.statuses.append(200)
+        position = urls.index(url)
+        response.json.return_value = {'items': items,
+                                      'next': urls[position + 1] if position + 1 < len(urls) else None}
+        return response
+
+    def test_all_pages_are_fetched(self):
+        playlists = self.api.get_user_playlists('token', 1)
+        self.assertEqual(len(playlists), 60)
+        self.assertEqual(playlists['playlist-59']['image_url'], 'https://img/59')
+
+    def test_cached_list_is_reused_until_invalidated(self):
+        self.api.get_user_playlists('token', 1)
+        self.api.get_user_playlists('token', 1)
+        self.assertEqual(self.api.http.get.call_count, 2)
+
+    def test_revalidation_reuses_unchanged_pages_and_playlists(self):
+        first = self.api.get_user_playlists('token', 1)
+        self.pages[f'{self.PAGE_URL}&offset=50'][0] = self.playlist(50, snapshot='s2')
+        cache.delete('user_playlists_1')
+
+        second = self.api.get_user_playlists('token', 1)
+        self.assertEqual(self.statuses, [200, 200, 304, 200])
+        self.assertEqual(second['playlist-0'], first['playlist-0'])
+        self.assertEqual(second['playlist-50']['snapshot_id'], 's2')
+        self.assertEqual(len(second), 60)
+
+
+class PagingTest(SimpleTestCase):
+    def setUp(self):
+        self.http = mock.Mock()
+        self.http.get.side_effect = self.respond
+        self.requested = []
+
+    def respond(self, url, headers=None, params=None):
+        page = int(url.rsplit('=', 1)[1]) if '?page=' in url else 0
+        self.requested.append(page)
+        time.sleep(0.05)
+
+        response = mock.Mock()
+        response.status_code = 200
+        response.json.return_value = {'tracks': {
+            'items': [page * 10 + i for i in range(10)],
+            'next': f'https://api/items?page={page + 1}' if page < 4 else None,
+        }}
+        return response
+
+    def test_all_pages_are_followed(self):
+        items = list(iterate_pages(self.http, 'https://api/items', key='tracks'))
+        self.assertEqual(items, list(range(50)))
+        self.assertEqual(self.requested, [0, 1, 2, 3, 4])
+
+    def test_iteration_stops_at_max_items(self):
+        items = list(iterate_pages(self.http, 'https://api/items', key='tracks', max_items=15))
+        self.assertEqual(items, list(range(15)))
+        self.assertEqual(self.requested, [0, 1])
+
+    def test_next_page_is_fetched_while_current_one_is_processed(self):
+        start = time.perf_counter()
+        for _ in iterate_pages(self.http, 'https://api/items', key='tracks'):
+            time.sleep(0.005)
+        # Bez pobierania z wyprzedzeniem: 5 * 0.05 s pobierania + 50 * 0.005 s przetwarzania.
+        self.assertLess(time.perf_counter() - start, 0.45)
+
+    def test_recently_added_tracks_are_read_in_pages(self):
+        api = SpotifyAPI()
+        api.http = mock.Mock()
+        api.http.get.return_value.status_code = 200
+        api.http.get.return_value.json.return_value = {
+            'items': [{'track': {'id': f'track-{i}'}} for i in range(50)], 'next': 'https://api/me/tracks?offset=50'}
+
+        tracks = api.get_recently_added_tracks('token', count=70)
+        self.assertEqual(len(tracks), 70)
+        self.assertEqual(api.http.get.call_count, 2)
@@ -0,0 +1,285 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase
+
+from .classes.Cassette import Cassette, CassetteMiss
+from .classes.CircuitBreaker import CircuitBreaker, LatencyHistogram, endpoint_name
+from .classes.HttpTransport import HttpTransport
+from .classes.RateLimiter import RateLimiter
+from .middleware import DegradedServiceMiddleware
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            hits = server.hits[self.path]
+
+        if self.path == '/down' or (self.path == '/flaky' and hits < 3):
+            self.reply(503)
+        elif self.path == '/limited' or (self.path == '/limited_once' and hits < 2):
+            self.reply(429, {'Retry-After': '1'})
+        else:
+            self.reply(200)
+
+    do_POST = do_GET
+
+    def reply(self, status, headers=None):
+        body = b'{"ok": true}'
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.lock = threading.Lock()
+    server.hits = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class HttpTransportTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server, cls.url = start_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.hits.clear()
+        self.transport = HttpTransport('test', pool_size=4, backoff_factor=0)
+        self.addCleanup(self.transport.close)
+
+    def test_connections_are_reused(self):
+        for _ in range(10):
+            self.assertEqual(self.transport.get(f"{self.url}/ok").status_code, 200)
+
+        stats = self.transport.stats()
+        self.assertEqual(stats['requests'], 10)
+        self.assertEqual(stats['connections'], 1)
+        self.assertAlmostEqual(stats['reuse_rate'], 0.9)
+
+    def test_pool_is_shared_between_threads(self):
+        threads = [threading.Thread(target=lambda: [self.transport.get(f"{self.url}/ok") for _ in range(10)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = self.transport.stats()
+        self.assertEqual(stats['requests'], 40)
+        self.assertLessEqual(stats['connections'], 4)
+
+    def test_server_errors_are_retried_for_idempotent_requests(self):
+        response = self.transport.get(f"{self.url}/flaky")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.hits['/flaky'], 3)
+        self.assertEqual(self.transport.stats()['retries'], 2)
+
+    def test_post_and_rate_limits_are_not_retried(self):
+        self.assertEqual(self.transport.post(f"{self.url}/flaky").status_code, 503)
+        self.assertEqual(self.transport.get(f"{self.url}/limited").status_code, 429)
+        self.assertEqual(self.server.hits, {'/flaky': 1, '/limited': 1})
+
+    def test_requests_have_a_default_timeout(self):
+        transport = HttpTransport('test', timeout=0.2, retries=0)
+        self.addCleanup(transport.close)
+        with self.assertRaises(requests.ConnectionError):
+            transport.get('http://10.255.255.1/')
+        self.assertEqual(transport.stats()['errors'], 1)
+
+    def test_rate_limited_requests_wait_for_retry_after_and_are_retried(self):
+        cache.clear()
+        limiter = RateLimiter('test', rate=100, burst=10, max_wait=5, max_retries=2)
+        transport = HttpTransport('test', limiter=limiter)
+        self.addCleanup(transport.close)
+
+        start = time.monotonic()
+        response = transport.get(f"{self.url}/limited_once")
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(time.monotonic() - start, 0.9)
+        self.assertEqual(self.server.hits['/limited_once'], 2)
+        self.assertEqual(limiter.state()['throttled'], 1)
+
+    def test_requests_beyond_max_wait_get_a_local_429(self):
+        cache.clear()
+        limiter = RateLimiter('test', max_wait=0.5)
+        limiter.backoff(10)
+        transport = HttpTransport('test', limiter=limiter)
+        self.addCleanup(transport.close)
+
+        response = transport.get(f"{self.url}/ok")
+        self.assertEqual(response.status_code, 429)
+        self.assertNotIn('/ok', self.server.hits)
+
+
+class CassetteTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'trace.jsonl')
+
+        self.server, self.url = start_server()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def record(self):
+        transport = HttpTransport('test', backoff_factor=0, cassette=Cassette(self.path, 'record'))
+        self.addCleanup(transport.close)
+        transport.get(f"{self.url}/ok", params={'q': 'a'})
+        transport.post(f"{self.url}/ok", json={'name': 'x'})
+        transport.get(f"{self.url}/flaky")
+        return transport
+
+    def test_replay_returns_recorded_responses_without_network(self):
+        self.record()
+        hits = dict(self.server.hits)
+
+        cassette = Cassette(self.path, 'replay', latency_scale=0)
+        transport = HttpTransport('test', cassette=cassette)
+        self.addCleanup(transport.close)
+
+        response = transport.get(f"{self.url}/ok", params={'q': 'a'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'ok': True})
+        self.assertEqual(transport.post(f"{self.url}/ok", json={'name': 'x'}).status_code, 200)
+        self.assertEqual(transport.get(f"{self.url}/flaky").status_code, 200)
+        self.assertEqual(self.server.hits, hits)
+
+        stats = transport.stats()['cassette']
+        self.assertEqual((stats['interactions'], stats['played'], stats['misses']), (3, 3, 0))
+
+        with self.assertRaises(CassetteMiss):
+            transport.get(f"{self.url}/unknown")
+
+    def test_replay_falls_back_to_same_path_and_scales_latency(self):
+        self.record()
+        cassette = Cassette(self.path, 'replay', latency_scale=2)
+        transport = HttpTransport('test', cassette=cassette)
+        self.addCleanup(transport.close)
+
+        self.assertEqual(transport.get(f"{self.url}/ok", params={'q': 'b'}).status_code, 200)
+        stats = cassette.stats()
+        self.assertEqual(stats['approximate'], 1)
+        self.assertGreater(stats['replayed_seconds'], 0)
+        with self.assertRaises(CassetteMiss):
+            transport.get(f"{self.url}/ok", params={'q': 'a'})
+
+    def test_secrets_are_not_recorded(self):
+        cassette = Cassette(self.path, 'record')
+
+        def exchange(method, url, body, status, content, headers=None):
+            prepared = requests.Request(method, url, data=body).prepare()
+            response = requests.Response()
+            response.status_code = status
+            response.headers.update(headers or {'Content-Type': 'application/json'})
+            response._content = json.dumps(content).encode('utf-8')
+            cassette.record(prepared, response, 0.01)
+            return prepared
+
+        token_request = exchange('POST', 'https://accounts.spotify.com/api/token',
+                                 {'grant_type': 'authorization_code', 'code': 'secret-code',
+                                  'code_verifier': 'secret-verifier'}, 200,
+                                 {'access_token': 'secret-access', 'refresh_token': 'secret-refresh',
+                                  'expires_in': 3600})
+        exchange('GET', 'https://api.spotify.com/v1/me', None, 200,
+                 {'id': 'user', 'email': 'secret@example.com', 'display_name': 'Secret Name'})
+        exchange('GET', 'https://tastedive.com/api/similar?q=abba&k=secret-key', None, 302, {},
+                 {'Location': 'http://127.0.0.1/callback?code=secret-redirect&state=1'})
+
+        with open(self.path, encoding='utf-8') as f:
+            recorded = f.read()
+        self.assertNotIn('secret', recorded)
+
+        replay = Cassette(self.path, 'replay', latency_scale=0)
+        self.assertEqual(replay.play(token_request).json(), {'access_token': 'REDACTED',
+                                                             'refresh_token': 'REDACTED', 'expires_in': 3600})
+        self.assertEqual(replay.stats()['approximate'], 0)
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    def test_endpoint_names(self):
+        api = 'https://api.spotify.com/v1'
+        self.assertEqual(endpoint_name('spotify', f"{api}/recommendations?limit=5"), 'recommendations')
+        self.assertEqual(endpoint_name('spotify', f"{api}/me"), 'me')
+        self.assertEqual(endpoint_name('spotify', f"{api}/me/playlists?limit=50"), 'playlists')
+        self.assertEqual(endpoint_name('spotify', f"{api}/playlists/abc/tracks"), 'playlists')
+        self.assertEqual(endpoint_name('spotify', f"{api}/audio-features?ids=a"), 'tracks')
+        self.assertEqual(endpoint_name('spotify', f"{api}/artists/abc/top-tracks"), 'artists')
+        self.assertEqual(endpoint_name('tastedive', 'https://tastedive.com/api/similar?q=x'), 'tastedive')
+
+    def test_histogram_percentiles(self):
+        histogram = LatencyHistogram()
+        for ms in range(1, 101):
+            histogram.add(ms)
+        self.assertLessEqual(abs(histogram.percentile(0.5) - 50), 5)
+        self.assertLessEqual(abs(histogram.percentile(0.99) - 99), 2)
+        self.assertEqual(LatencyHistogram().percentile(0.5), None)
+
+    def test_breaker_opens_and_recovers_through_a_probe(self):
+        breaker = CircuitBreaker('test', failure_rate=0.5, min_calls=4, reset_timeout=0.2)
+        for failed in (False, True, True, False):
+            self.assertTrue(breaker.allow())
+            breaker.record(0.01, failed)
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.25)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record(0.01, False)
+        self.assertEqual(breaker.state, 'closed')
+        self.assertEqual(breaker.stats()['rejected'], 2)
+
+    def test_open_endpoint_fails_fast_without_network(self):
+        server, url = start_server()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        transport = HttpTransport('test', retries=0)
+        self.addCleanup(transport.close)
+
+        with self.settings(CIRCUIT_BREAKER_MIN_CALLS=3, CIRCUIT_BREAKER_RESET_TIMEOUT=60):
+            for _ in range(5):
+                response = transport.get(f"{url}/down")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['X-Circuit-Open'], 'test')
+        self.assertEqual(server.hits['/down'], 3)
+
+        stats = transport.stats()['endpoints']['test']
+        self.assertEqual((stats['state'], stats['calls'], stats['rejected']), ('open', 3, 2))
+        self.assertIsNotNone(stats['p95_ms'])
+
+    def test_connection_errors_become_a_degraded_response(self):
+        middleware = DegradedServiceMiddleware(lambda request: None)
+        request = RequestFactory().get('/search_artists/', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        response = middleware.process_exception(request, requests.ConnectTimeout())
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(json.loads(response.content)['degraded'])
+
+        self.assertIsNone(middleware.process_exception(request, ValueError()))
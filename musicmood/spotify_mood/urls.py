@@ -12,6 +12,7 @@ urlpatterns = [
     path('settings/', views.settings_view, name='settings'),
     path('play/', views.play_view, name='play'),
     path('info/', views.info_view, name='info'),
+    path('info/plots/<str:filename>', views.fuzzy_plot, name='fuzzy_plot'),
     path('search_genres/', views.search_genres, name='search_genres'),
     path('search_artists/', views.search_artists, name='search_artists'),
     path('like_song/<int:song_id>/', views.like_song, name='like_song'),
@@ -19,6 +20,8 @@ urlpatterns = [
     path('search_song/', views.search_song_view, name='search_song'),
     path('tastedive/', views.tastedive, name='tastedive'),
     path('search_artist/', views.search_artist_view, name='search_artist'),
+    path('http_stats/', views.http_stats_view, name='http_stats'),
+    path('jobs/<str:job_id>/', views.job_status_view, name='job_status'),
 
 ]
 
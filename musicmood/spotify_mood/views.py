@@ -13,9 +13,15 @@ from .models import Genre
 from django.http import JsonResponse
 from requests.exceptions import HTTPError
 import json
-import requests
+import os
 import urllib.parse
-from .classes.SpotifyAPI import SpotifyAPI
+from .classes.SpotifyAPI import SpotifyAPI, search_cache, top_tracks_cache
+from .classes.DatabaseConnector import DatabaseConnector
+from .classes.HttpTransport import get_transport, transport_stats
+from .classes.JobQueue import DONE, ERROR, get_job, submit_job
+from .classes.RateLimiter import get_rate_limiter
+from .classes.SpotifyAuth import get_valid_access_token, store_token
+from .classes.PlotCache import PLOT_CONTENT_TYPES, PLOT_FILENAME, load_manifest, plots_dir
 
 
 def log_in_view(request):
@@ -50,7 +56,7 @@ def callback_view(request):
         return HttpResponse("Failed to retrieve access token", status=400)
 
     access_token = token_info.get('access_token')
-    request.session['access_token'] = access_token
+    store_token(request.session, token_info)
 
     user_info = spotify_api.get_user_info(access_token)
 
@@ -174,12 +180,18 @@ def home_view(request):
             custom_params = None
 
         spotify_api = SpotifyAPI()
-        if not spotify_api.is_user_logged_in(access_token):
+        access_token = get_valid_access_token(request, spotify_api)
+        if not access_token:
             params = urlencode({'message': 'Token expired'})
             url = f"{reverse('spotify_mood:show_login_page')}?{params}"
             return redirect(url)
 
-        message = spotify_api.generate_playlist_v3(
+        # Generowanie trwa kilka sekund - wykonuje je pula wątków w tle, a strona odpytuje o stan zadania.
+        job_id = submit_job(
+            'generate_playlist',
+            user_id,
+            generate_playlist_job,
+            user_id,
             access_token,
             mood_value,
             length_min,
@@ -192,11 +204,12 @@ def home_view(request):
             custom_params,
             selected_song_ids
         )
-        request.session['status'] = message["status"]
-        request.session['message'] = message["message"]
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            return JsonResponse({'job_id': job_id,
+                                 'status_url': reverse('spotify_mood:job_status', args=[job_id])}, status=202)
 
-        cache_key = f"user_playlists_{user_id}"
-        cache.delete(cache_key)
+        request.session['status'] = "info"
+        request.session['message'] = "Playlista jest tworzona w tle i pojawi się na liście za chwilę."
         return redirect(reverse('spotify_mood:play'))
 
     return render(request, "spotify_mood/home.html", {
@@ -207,6 +220,32 @@ def home_view(request):
     })
 
 
+def generate_playlist_job(user_id, access_token, *args):
+    message = SpotifyAPI().generate_playlist_v3(access_token, *args)
+    cache.delete(f"user_playlists_{user_id}")
+    return message
+
+
+def job_status_view(request, job_id):
+    user_id = request.session.get('user_id')
+    if not user_id:
+        return JsonResponse({'error': 'User not authenticated'}, status=401)
+
+    job = get_job(job_id)
+    if not job or job.get('user_id') != user_id:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+
+    data = {'job_id': job_id, 'status': job['status']}
+    if job['status'] == DONE:
+        # Komunikat wyniku pokazywany jest na stronie odtwarzacza, tak jak przy zwykłym formularzu.
+        request.session['status'] = job['result']["status"]
+        request.session['message'] = job['result']["message"]
+        data['redirect'] = reverse('spotify_mood:play')
+    elif job['status'] == ERROR:
+        data['error'] = "Nie udało się wygenerować playlisty."
+    return JsonResponse(data)
+
+
 def settings_view(request):
     user_id = request.session.get('user_id')
     if not user_id:
@@ -250,9 +289,12 @@ def play_view(request):
     if not user_id:
         return redirect(reverse('spotify_mood:show_login_page'))
 
-    access_token = request.session.get('access_token')
+    spotify_api = SpotifyAPI()
+    access_token = get_valid_access_token(request, spotify_api)
     if not access_token:
-        return redirect(reverse('spotify_mood:show_login_page'))
+        params = urlencode({'message': 'Token expired'})
+        url = f"{reverse('spotify_mood:show_login_page')}?{params}"
+        return redirect(url)
 
     status = request.session.pop('status', None)
     message = request.session.pop('message', None)
@@ -262,10 +304,7 @@ def play_view(request):
     except User.DoesNotExist:
         return redirect(reverse('spotify_mood:show_login_page'))
 
-    playlists_in_db = Playlist.objects.filter(user=user).order_by('-created_at')
-
-    spotify_api = SpotifyAPI()
-    spotify_playlists = spotify_api.get_user_playlists(access_token)
+    spotify_playlists = spotify_api.get_user_playlists(access_token, user_id)
     if spotify_playlists is None:
         return render(request, 'spotify_mood/play.html', {
             'user': user,
@@ -274,10 +313,7 @@ def play_view(request):
             'message': "Nie udało się pobrać playlist ze Spotify. Upewnij się, że jesteś zalogowany."
         })
 
-    if not spotify_api.is_user_logged_in(access_token):
-        params = urlencode({'message': 'Token expired'})
-        url = f"{reverse('spotify_mood:show_login_page')}?{params}"
-        return redirect(url)
+    playlists_in_db = Playlist.objects.filter(user=user, spotify_id__in=list(spotify_playlists)).order_by('-created_at')
 
     liked_songs_set = set(LikedSongs.objects.filter(user=user).values_list('song_id', flat=True))
 
@@ -305,19 +341,7 @@ def play_view(request):
 
     valid_playlists = []
     for playlist in playlists_in_db:
-
-        matched_spotify_playlist = None
-        for spotify_playlist in spotify_playlists:
-            if spotify_playlist is None:
-                continue
-
-            if 'id' not in spotify_playlist:
-                continue
-
-            if playlist.spotify_id == spotify_playlist['id']:
-                matched_spotify_playlist = spotify_playlist
-                break
-
+        matched_spotify_playlist = spotify_playlists.get(playlist.spotify_id)
         if not matched_spotify_playlist:
             continue
 
@@ -337,13 +361,10 @@ def play_view(request):
                 'liked': is_liked
             })
 
-        image_url = matched_spotify_playlist['images'][0]['url'] if matched_spotify_playlist.get('images') and len(
-            matched_spotify_playlist['images']) > 0 else None
-
         valid_playlists.append({
             'playlist': playlist,
             'songs': songs,
-            'image_url': image_url
+            'image_url': matched_spotify_playlist['image_url']
         })
 
     print(f"[DEBUG] Liczba poprawnych playlist do wyświetlenia: {len(valid_playlists)}")
@@ -364,7 +385,32 @@ def info_view(request):
         return redirect(reverse('spotify_mood:show_login_page'))
 
     user = get_object_or_404(User, id=user_id)
-    return render(request, "spotify_mood/info.html", {'user': user})
+
+    fuzzy_plots = []
+    manifest = load_manifest()
+    if manifest:
+        for plot in manifest['plots'].values():
+            filename = plot['files'].get('svg') or plot['files'].get('png')
+            fuzzy_plots.append({'title': plot['title'],
+                                'url': reverse('spotify_mood:fuzzy_plot', args=[filename])})
+
+    return render(request, "spotify_mood/info.html", {'user': user, 'fuzzy_plots': fuzzy_plots})
+
+
+def fuzzy_plot(request, filename):
+    if not PLOT_FILENAME.match(filename):
+        return HttpResponse(status=404)
+
+    try:
+        with open(os.path.join(plots_dir(), filename), 'rb') as f:
+            content = f.read()
+    except OSError:
+        return HttpResponse(status=404)
+
+    # Nazwa pliku zawiera skrót zawartości, więc raz pobrany wykres nigdy się nie zmienia.
+    response = HttpResponse(content, content_type=PLOT_CONTENT_TYPES[filename.rsplit('.', 1)[1]])
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 
 def remove_preferred_genre(request):
@@ -400,6 +446,7 @@ def like_song(request, song_id):
         song = Song.objects.get(id=song_id)
 
         LikedSongs.objects.get_or_create(user=user, song=song)
+        DatabaseConnector().add_liked_song_to_seed_index(user, song)
 
         return JsonResponse({'status': 'liked'})
 
@@ -414,6 +461,7 @@ def unlike_song(request, song_id):
         song = Song.objects.get(id=song_id)
 
         LikedSongs.objects.filter(user=user, song=song).delete()
+        DatabaseConnector().remove_liked_song_from_seed_index(user, song)
 
         return JsonResponse({'status': 'unliked'})
 
@@ -424,12 +472,12 @@ def search_song_view(request):
     user_id = request.session.get('user_id')
     if not user_id:
         return redirect(reverse('spotify_mood:show_login_page'))
-    access_token = request.session.get('access_token')
 
     if request.method == "POST":
         spotify_api = SpotifyAPI()
 
-        if not spotify_api.is_user_logged_in(access_token):
+        access_token = get_valid_access_token(request, spotify_api)
+        if not access_token:
             params = urlencode({'message': 'Token expired'})
             url = f"{reverse('spotify_mood:show_login_page')}?{params}"
             print("Redirect URL:", url)
@@ -468,7 +516,7 @@ def tastedive(request):
         tastedive_api_key = "1039779-MusicMoo-346EAE01"
         encoded_artist_name = urllib.parse.quote_plus(artist_name_value)
         tastedive_url = f"https://tastedive.com/api/similar?q={encoded_artist_name}&type=music&k={tastedive_api_key}&info=0"
-        response = requests.get(tastedive_url)
+        response = get_transport('tastedive').get(tastedive_url)
         print(f"TasteDive URL: {tastedive_url}")
 
         if response.status_code != 200:
@@ -489,16 +537,30 @@ def tastedive(request):
             print(f"- {artist}")
 
         spotify_api = SpotifyAPI()
-        access_token = request.session.get('access_token')
+        access_token = get_valid_access_token(request, spotify_api)
+        if not access_token:
+            params = urlencode({'message': 'Token expired'})
+            return redirect(f"{reverse('spotify_mood:show_login_page')}?{params}")
 
         songs_per_artist = max(1, track_count // 10)
         all_track_ids = []
 
+        # Artyści przetwarzani są równolegle - czas strony wyznacza najwolniejszy z nich, nie suma.
+        tracks_by_artist = spotify_api.get_top_tracks_by_artists(access_token, similar_artists, songs_per_artist)
         for artist in similar_artists:
-            tracks = spotify_api.get_top_tracks_by_artist(access_token, artist, songs_per_artist)
-            for track in tracks:
+            for track in tracks_by_artist.get(artist, []):
                 all_track_ids.append(track['id'])
 
+        if not all_track_ids:
+            return render(request, "spotify_mood/tastedive.html",
+                          {'user': user, 'error': "Nie udało się pobrać utworów podobnych artystów."})
+
+        missing_artists = [artist for artist in similar_artists if artist not in tracks_by_artist]
+        if missing_artists:
+            request.session['status'] = "warning"
+            request.session['message'] = (f"Nie udało się pobrać utworów {len(missing_artists)} z "
+                                          f"{len(similar_artists)} artystów: {', '.join(missing_artists)}.")
+
         random.shuffle(all_track_ids)
         playlist_name = request.POST.get('playlist_name', f"Playlista na podstawie {artist_name_value}")
 
@@ -509,6 +571,7 @@ def tastedive(request):
             track_ids=all_track_ids
         )
 
+        cache.delete(f"user_playlists_{user_id}")
         return redirect(reverse('spotify_mood:play'))
 
     return render(request, "spotify_mood/tastedive.html", {'user': user})
@@ -519,7 +582,10 @@ def search_artist_view(request):
     if not user_id:
         return JsonResponse({'error': 'User not authenticated'}, status=401)
 
-    access_token = request.session.get('access_token')
+    access_token = get_valid_access_token(request)
+    if not access_token:
+        return JsonResponse({'error': 'Token expired'}, status=401)
+
     artist_name = request.GET.get('q', '').strip()
 
     if not artist_name:
@@ -529,3 +595,12 @@ def search_artist_view(request):
     results = spotify_api.search_artists(access_token, artist_name)
 
     return JsonResponse({'artists': results})
+
+
+def http_stats_view(request):
+    if not request.session.get('user_id'):
+        return JsonResponse({'error': 'User not authenticated'}, status=401)
+
+    return JsonResponse({'pid': os.getpid(), 'transports': transport_stats(),
+                         'rate_limit': get_rate_limiter('spotify').state(),
+                         'search_cache': search_cache.stats(), 'top_tracks_cache': top_tracks_cache.stats()})